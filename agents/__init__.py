@@ -1,6 +1,7 @@
 from .agent import Agent
 from .random_agent import RandomAgent
 from .human_agent import HumanAgent
-from .student_agent import StudentAgent
+from .student_agent import StudentAgent, ParallelStudentAgent, VoronoiStudentAgent
 from .approach_agent import ApproachAgent
-from .random_no_endgame import RandomNoEndgame
\ No newline at end of file
+from .random_no_endgame import RandomNoEndgame
+from .alphabeta_agent import AlphaBetaAgent
@@ -6,10 +6,28 @@ class Agent:
         self.name = "DummyAgent"
         # Flag to indicate whether the agent can be used to autoplay
         self.autoplay = False
+        # Flag to indicate whether the agent accepts a BitBoard as chess_board
+        # when the world uses the bitboard backend
+        self.supports_bitboard = False
 
     def __str__(self) -> str:
         return self.name
 
+    def configure(self, search_workers=None, move_time=None):
+        """
+        Apply the settings the world runs the agent with, after it is created.
+        Agents ignore the settings they have no use for.
+
+        Parameters
+        ----------
+        search_workers : int
+            If not None, the number of processes a parallel search may use.
+        move_time : float
+            If not None, the time budget in seconds of a single step, after which
+            the world replaces the step by a random walk.
+        """
+        pass
+
     def step(self, chess_board, my_pos, adv_pos, max_step):
         """
         Main decision logic of the agent, which is called by the simulator.
@@ -18,7 +36,9 @@ class Agent:
         Parameters
         ----------
         chess_board : numpy.ndarray of shape (board_size, board_size, 4)
-            The chess board.
+            The chess board. A BitBoard if the agent sets supports_bitboard
+            and the world uses the bitboard backend. It may be a read-only view
+            of the world's board, copy it before modifying or keeping it.
         my_pos : tuple of int
             The position of the agent.
         adv_pos : tuple of int
@@ -34,3 +54,10 @@ class Agent:
             The direction of the agent, as defined in world.py (DIRECTION_UP/DIRECTION_DOWN/DIRECTION_LEFT/DIRECTION_RIGHT).
         """
         pass
+
+    def close(self):
+        """
+        Release the resources of the agent, such as worker processes, when the
+        game is over. Called by the simulator.
+        """
+        pass
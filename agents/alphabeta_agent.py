@@ -0,0 +1,316 @@
+import time
+import numpy as np
+from agents.agent import Agent
+from bitboard import BitBoard, popcount
+from connectivity import reachable_positions
+from constants import *
+from evaluation import voronoi
+from store import register_agent
+from zobrist import (
+    AlphaBetaTable,
+    BOUND_EXACT,
+    BOUND_LOWER,
+    BOUND_UPPER,
+    ZobristKeys,
+)
+
+# Moves (Up, Right, Down, Left)
+MOVES = ((-1, 0), (0, 1), (1, 0), (0, -1))
+OPPOSITES = (2, 3, 0, 1)
+
+# Value of a won game, before adding the difference of the zones
+WIN_VALUE = 10000
+
+# Share of the world's time budget of a step that the search may use, leaving
+# the rest for setting up the search and answering the supervisor
+BUDGET_SHARE = 0.8
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time for the move is up.
+    """
+
+
+# Important: you should register your agent with a name
+@register_agent("alphabeta_agent")
+class AlphaBetaAgent(Agent):
+    """
+    An agent which searches the game tree with iterative deepening alpha-beta (negamax)
+    under a time limit. The moves of every position are ordered by the best move of
+    the transposition table, then by the killer moves of the depth, then by history
+    scores. Positions at the search horizon are scored by Voronoi territory.
+
+    Parameters
+    ----------
+    move_time : float
+        Time in seconds to search every move after the first one
+    first_move_time : float
+        Time in seconds to search the first move
+    """
+
+    def __init__(self, move_time=1.5, first_move_time=5.0):
+        super(AlphaBetaAgent, self).__init__()
+        self.name = "AlphaBetaAgent"
+        self.autoplay = True
+        self.first_move_time = first_move_time
+        self.move_time = move_time
+        self.first_move = True
+
+        self.keys = None
+        self.table = AlphaBetaTable()
+        # Depth reached by the last search and number of positions searched
+        self.depth = 0
+        self.nodes = 0
+
+    def configure(self, search_workers=None, move_time=None):
+        if move_time is not None:
+            # Search within the world's budget of a step, including the first one
+            self.move_time = min(self.move_time, BUDGET_SHARE * move_time)
+            self.first_move_time = min(self.first_move_time, BUDGET_SHARE * move_time)
+
+    def step(self, chess_board, my_pos, adv_pos, max_step):
+        """
+        Search the position for the given time and return the best move found by the
+        deepest search that finished.
+
+        Returns
+        -------
+        my_pos : tuple of int
+            The new position of the agent.
+        dir : int
+            The direction of the barrier.
+        """
+        move_time = self.first_move_time if self.first_move else self.move_time
+        self.first_move = False
+        self.deadline = time.perf_counter() + move_time
+
+        if isinstance(chess_board, BitBoard):
+            chess_board = chess_board.to_array()
+        self.board = np.array(chess_board, dtype=bool)
+        self.bits = BitBoard.from_array(self.board)
+        self.max_step = max_step
+        board_size = len(self.board)
+        if self.keys is None or self.keys.board_size != board_size:
+            self.keys = ZobristKeys(board_size)
+            self.table = AlphaBetaTable(len(self.table))
+        # Killer moves of every depth and history scores of every move
+        self.killers = {}
+        self.history = [0] * (board_size << 8)
+
+        my_pos, adv_pos = tuple(my_pos), tuple(adv_pos)
+        key = int(self.keys.hash(self.board, my_pos, adv_pos))
+        moves = self.ordered_moves(my_pos, adv_pos, None, 0)
+        if not moves:
+            # Enclosed in a single cell, the game is already over
+            return my_pos, DIRECTION_UP
+        best_move = moves[0]
+        self.nodes = 0
+        self.depth = 0
+        depth = 1
+        try:
+            while depth <= 2 * board_size * board_size:
+                value = self.negamax(depth, -np.inf, np.inf, 0, my_pos, adv_pos, key)
+                best_move = self.root_move
+                self.depth = depth
+                if abs(value) >= WIN_VALUE - board_size * board_size:
+                    # The game is decided
+                    break
+                depth += 1
+        except SearchTimeout:
+            pass
+
+        (r, c), dir = self.decode(best_move)
+        return (r, c), dir
+
+    @staticmethod
+    def encode(pos, dir):
+        # A move packed in one int, as in records.py
+        return (pos[0] << 8) | (pos[1] << 2) | dir
+
+    @staticmethod
+    def decode(move):
+        return (move >> 8, (move >> 2) & 0x3F), move & 0x3
+
+    def make(self, r, c, dir):
+        # Put a barrier on both boards
+        m_r, m_c = MOVES[dir]
+        self.board[r, c, dir] = True
+        self.board[r + m_r, c + m_c, OPPOSITES[dir]] = True
+        self.bits.set_barrier(r, c, dir)
+
+    def unmake(self, r, c, dir):
+        # Take a barrier back from both boards
+        m_r, m_c = MOVES[dir]
+        self.board[r, c, dir] = False
+        self.board[r + m_r, c + m_c, OPPOSITES[dir]] = False
+        self.bits[r, c, dir] = False
+
+    def end_value(self, my_pos, adv_pos):
+        """
+        Check whether the game is over and get its value for the player at my_pos.
+
+        Returns
+        -------
+        is_end : bool
+        value : int
+        """
+        my_zone = self.bits.region(my_pos)
+        if my_zone & self.bits.cell_mask(*adv_pos):
+            return False, 0
+        margin = popcount(my_zone) - popcount(self.bits.region(adv_pos))
+        if margin > 0:
+            return True, WIN_VALUE + margin
+        if margin < 0:
+            return True, -WIN_VALUE + margin
+        return True, 0
+
+    def evaluate(self, my_pos, adv_pos):
+        # Cells reached first by the player at my_pos minus those of the adversary
+        return int(voronoi(self.board, my_pos, adv_pos).score)
+
+    def evaluate_moves(self, my_pos, adv_pos, moves):
+        """
+        Get the value of every move for the player at my_pos, looking no further
+        than the move itself. The positions that go on are scored together, with
+        a single batched Voronoi evaluation.
+        """
+        values = [0] * len(moves)
+        going_on = []
+        for i, move in enumerate(moves):
+            (r, c), dir = self.decode(move)
+            self.make(r, c, dir)
+            is_end, value = self.end_value((r, c), adv_pos)
+            self.unmake(r, c, dir)
+            if is_end:
+                values[i] = value
+            else:
+                going_on.append(i)
+        if not going_on:
+            return values
+
+        encoded = np.array([moves[i] for i in going_on])
+        r, c, dir = encoded >> 8, (encoded >> 2) & 0x3F, encoded & 0x3
+        step = np.array(MOVES)[dir]
+        boards = np.repeat(self.board[None], len(going_on), axis=0)
+        games = np.arange(len(going_on))
+        boards[games, r, c, dir] = True
+        boards[games, r + step[:, 0], c + step[:, 1], np.array(OPPOSITES)[dir]] = True
+        scores = voronoi(
+            boards, np.column_stack([r, c]), np.array([adv_pos] * len(going_on))
+        ).score
+        for i, score in zip(going_on, scores):
+            values[i] = int(score)
+        return values
+
+    def ordered_moves(self, my_pos, adv_pos, tt_move, ply):
+        """
+        List the moves of the player at my_pos, with the rules of World: any position
+        within max_step steps not walking through the adversary, and a free side of it.
+        The best move of the transposition table comes first, then the killer moves
+        of the ply, then the others by history score.
+        """
+        moves = [
+            self.encode(pos, dir)
+            for pos in reachable_positions(self.board, my_pos, adv_pos, self.max_step)
+            for dir in range(4)
+            if not self.board[pos[0], pos[1], dir]
+        ]
+        killers = self.killers.get(ply, ())
+        history = self.history
+
+        def priority(move):
+            if move == tt_move:
+                return 3, 0
+            if move in killers:
+                return 2, -killers.index(move)
+            return 1, history[move]
+
+        moves.sort(key=priority, reverse=True)
+        return moves
+
+    def record_cutoff(self, move, depth, ply):
+        # Remember a move that refuted a position, as killer of the ply and in history
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[move] += depth * depth
+
+    def negamax(self, depth, alpha, beta, ply, my_pos, adv_pos, key):
+        """
+        Search the position with the player at my_pos to move, and return its value
+        for that player. At ply 0, the best move is kept in root_move.
+        """
+        self.nodes += 1
+        # Checked at every node, as a node at depth 1 scores all its children in
+        # one batch that can take milliseconds
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        is_end, value = self.end_value(my_pos, adv_pos)
+        if is_end:
+            return value
+        if depth == 0:
+            return self.evaluate(my_pos, adv_pos)
+
+        alpha_orig = alpha
+        tt_move = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            tt_depth, tt_value, bound, tt_move = entry
+            if tt_depth >= depth and ply > 0:
+                if bound == BOUND_EXACT:
+                    return tt_value
+                if bound == BOUND_LOWER:
+                    alpha = max(alpha, tt_value)
+                elif bound == BOUND_UPPER:
+                    beta = min(beta, tt_value)
+                if alpha >= beta:
+                    return tt_value
+
+        player = ply % 2
+        best_value = -np.inf
+        best_move = None
+        moves = self.ordered_moves(my_pos, adv_pos, tt_move, ply)
+        if depth == 1:
+            # The children are leaves, score them all at once
+            self.nodes += len(moves)
+            values = self.evaluate_moves(my_pos, adv_pos, moves)
+            best = int(np.argmax(values))
+            best_value, best_move = values[best], moves[best]
+            if ply == 0:
+                self.root_move = best_move
+            if best_value >= beta:
+                self.record_cutoff(best_move, depth, ply)
+            moves = []
+
+        for move in moves:
+            (r, c), dir = self.decode(move)
+            child_key = key ^ int(self.keys.move(player, my_pos, r, c, dir))
+            self.make(r, c, dir)
+            try:
+                value = -self.negamax(
+                    depth - 1, -beta, -alpha, ply + 1, adv_pos, (r, c), child_key
+                )
+            finally:
+                self.unmake(r, c, dir)
+
+            if value > best_value:
+                best_value = value
+                best_move = move
+                if ply == 0:
+                    self.root_move = move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.record_cutoff(move, depth, ply)
+                break
+
+        if best_value <= alpha_orig:
+            bound = BOUND_UPPER
+        elif best_value >= beta:
+            bound = BOUND_LOWER
+        else:
+            bound = BOUND_EXACT
+        self.table.store(key, depth, best_value, bound, best_move)
+        return best_value
@@ -14,6 +14,7 @@ class RandomAgent(Agent):
         super(RandomAgent, self).__init__()
         self.name = "RandomAgent"
         self.autoplay = True
+        self.supports_bitboard = True
 
     def step(self, chess_board, my_pos, adv_pos, max_step):
 
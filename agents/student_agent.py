@@ -1,15 +1,220 @@
 # Student agent: Add your own agent here
 import math
+import multiprocessing as mp
+import os
 import random
 import time
 from copy import deepcopy
-from collections import defaultdict
+
+import numpy as np
 
 from agents.agent import Agent
+from bitboard import BitBoard, popcount
+from connectivity import label_regions
+from evaluation import voronoi
 from store import register_agent
+from zobrist import TranspositionTable, ZobristKeys
 
 import sys
 
+# Moves (Up, Right, Down, Left)
+MOVES = ((-1, 0), (0, 1), (1, 0), (0, -1))
+OPPOSITES = {0: 2, 1: 3, 2: 0, 3: 1}
+
+
+def encode_move(pos, d):
+    # A move (position, barrier direction) packed in one int, as in records.py
+    return (pos[0] << 8) | (pos[1] << 2) | d
+
+
+def decode_move(move):
+    return (move >> 8, (move >> 2) & 0x3F), move & 0x3
+
+
+def set_barrier(board, r, c, d, value=True):
+    # Set the barrier and its opposite face
+    board[r, c, d] = value
+    move = MOVES[d]
+    board[r + move[0], c + move[1], OPPOSITES[d]] = value
+
+
+def find_moves(board, my_pos, adv_pos, max_step):
+    # The (position, barrier direction) moves of the player at my_pos: a breadth
+    # first search of the cells it can reach, and every free side of each
+    moves = []
+    visited = {my_pos}
+    frontier = [my_pos]
+    for step in range(max_step + 1):
+        next_frontier = []
+        for r, c in frontier:
+            for d in range(4):
+                if board[r, c, d]:
+                    continue
+                moves.append(((r, c), d))
+                m_r, m_c = MOVES[d]
+                next_pos = (r + m_r, c + m_c)
+                if step < max_step and next_pos != adv_pos and next_pos not in visited:
+                    visited.add(next_pos)
+                    next_frontier.append(next_pos)
+        frontier = next_frontier
+    return moves
+
+
+class ScratchBoard:
+    # A copy of a board that moves are made on and taken back from, so that
+    # searching and playing out positions needs no copies of the board.
+
+    def __init__(self, board):
+        self.board = board.copy()
+        self.board_size = len(board)
+        self.undo = []  # encoded moves made, most recent last
+        # The same walls as bits, to flood fill the zones quickly
+        self.bits = BitBoard.from_array(board)
+
+    def make(self, r, c, d):
+        set_barrier(self.board, r, c, d)
+        self.bits.set_barrier(r, c, d)
+        self.undo.append(encode_move((r, c), d))
+
+    def unmake(self):
+        (r, c), d = decode_move(self.undo.pop())
+        set_barrier(self.board, r, c, d, False)
+        self.bits[r, c, d] = False
+
+    def reset(self):
+        # Take back every move made
+        while self.undo:
+            self.unmake()
+
+    def end_game(self, my_pos, adv_pos):
+        # Returns whether the game is over and the reward of the player at my_pos,
+        # as Node.is_end_game does
+        my_zone = self.bits.region(my_pos)
+        if my_zone & self.bits.cell_mask(*adv_pos):
+            return False, 0.0
+        my_score = popcount(my_zone)
+        adv_score = popcount(self.bits.region(adv_pos))
+        if my_score > adv_score:
+            return True, 1.0
+        elif my_score < adv_score:
+            return True, 0.0
+        return True, 0.5
+
+    def random_move(self, my_pos, adv_pos, max_step):
+        # A random walk and barrier as Node.find_random_child, without making it
+        board = self.board
+        r, c = my_pos
+        for _ in range(random.randint(0, max_step)):
+            d = random.randint(0, 3)
+            k = 0
+            while board[r, c, d] or (r + MOVES[d][0], c + MOVES[d][1]) == adv_pos:
+                k += 1
+                if k > 50:
+                    break
+                d = random.randint(0, 3)
+            if k > 50:
+                # Special Case enclosed by Adversary
+                r, c = my_pos
+                break
+            r, c = r + MOVES[d][0], c + MOVES[d][1]
+
+        # Put Barrier
+        d = random.randint(0, 3)
+        while board[r, c, d]:
+            d = random.randint(0, 3)
+        return (r, c), d
+
+
+class TimeManager:
+    # Spreads a time budget for the game over the moves expected to remain.
+    #
+    # Every move gets a soft limit, its share of the time left but no more than the
+    # nominal move time, and a hard limit it may extend to when the runner-up move
+    # is rated as high as the most visited one. The search stops before the soft
+    # limit once the most visited move cannot be overtaken in time. Without a game
+    # time, the budget is the nominal move time for each of our moves expected at
+    # the first move, so it grows with the board.
+
+    def __init__(self, move_time=0.5, first_move_time=20.0, max_move_time=1.0, game_time=None,
+                 extend_factor=2.0, close_margin=0.0, overtake_share=0.5, wall_fraction=0.2,
+                 min_moves=4):
+        self.move_time = move_time  # nominal seconds of a move
+        self.first_move_time = first_move_time
+        self.max_move_time = max_move_time
+        self.game_time = game_time  # seconds for all the moves after the first
+        self.extend_factor = extend_factor  # hard limit over soft limit
+        # the runner-up rated within this margin of the most visited move is critical
+        self.close_margin = close_margin
+        # share of the rollouts left the runner-up can get, as the tree keeps
+        # exploring the other moves
+        self.overtake_share = overtake_share
+        # moves expected to remain for each free wall, and at least
+        self.wall_fraction = wall_fraction
+        self.min_moves = min_moves
+        self.time_used = 0.0
+
+    def expected_moves(self, board):
+        # Our moves expected to remain: a share of the walls that can still be put
+        free_walls = np.count_nonzero(~board) // 2
+        return max(self.min_moves, free_walls * self.wall_fraction)
+
+    def allot(self, board, first):
+        # Soft and hard limits in seconds of this move
+        if self.game_time is None:
+            self.game_time = self.move_time * self.expected_moves(board)
+        if first:
+            # The first move has its own budget
+            hard = self.first_move_time
+            return hard / self.extend_factor, hard
+        time_left = max(self.game_time - self.time_used, 0.0)
+        soft = min(self.move_time, time_left / self.expected_moves(board))
+        hard = min(self.max_move_time, soft * self.extend_factor, time_left)
+        return min(soft, hard), hard
+
+    def spend(self, elapsed, first):
+        # Charge the time of a move to the game budget
+        if not first:
+            self.time_used += elapsed
+
+    def should_stop(self, stats, elapsed, soft, hard, rate):
+        # Whether the search can stop, given the root statistics, the time spent
+        # on the move and the rollouts per second
+        if elapsed >= hard:
+            return True
+        _, n, q = stats
+        if len(n) < 2:
+            return len(n) == 1 or elapsed >= soft
+        first, second = np.argsort(n)[-1:-3:-1]
+        close = q[second] / max(n[second], 1) > q[first] / max(n[first], 1) - self.close_margin
+        limit = hard if close else soft
+        # The most visited move cannot be overtaken before the limit
+        if n[first] - n[second] > self.overtake_share * rate * (limit - elapsed):
+            return True
+        return elapsed >= limit
+
+
+# Sent to the search workers once the main search is over
+STOP_SEARCH = "stop"
+
+
+def run_search_worker(seed, conn, leaf_evaluation=False):
+    # Search the positions sent by a root parallel StudentAgent with a tree of our
+    # own, and send back the statistics of its root children at the deadline or
+    # when told to stop. Every position is followed by a stop message.
+    np.random.seed(seed)
+    random.seed(seed)
+    agent = StudentAgent(leaf_evaluation=leaf_evaluation)
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        if request == STOP_SEARCH:
+            # The search it stops is over already
+            continue
+        agent.search(*request, stop=conn.poll)
+        conn.send(agent.tree.root_stats())
+    conn.close()
+
 
 @register_agent("student_agent")
 class StudentAgent(Agent):
@@ -19,7 +224,7 @@ class StudentAgent(Agent):
     
     """
 
-    def __init__(self):
+    def __init__(self, n_workers=1, leaf_evaluation=False):
         super(StudentAgent, self).__init__()
         self.name = "StudentAgent"
         self.dir_map = {
@@ -28,12 +233,23 @@ class StudentAgent(Agent):
             "d": 2,
             "l": 3,
         }
-        self.tree = MCTree()
+        self.tree = None
         self.first_iteration = True
-        self.node = None
-
-        self.rollout_start_time = 20
-        self.rollout_iter_time = 0.5
+        # Zobrist keys and transposition table, shared by the trees of all turns
+        self.keys = None
+        self.table = TranspositionTable()
+
+        self.time_manager = TimeManager()
+        # rollouts between two checks of the time manager
+        self.check_interval = 16
+        # Score the leaves of the tree with the territory evaluation
+        # instead of random playouts
+        self.leaf_evaluation = leaf_evaluation
+
+        # Root parallel search: n_workers - 1 worker processes build their own
+        # trees of the same position and their root statistics are merged
+        self.n_workers = n_workers
+        self.workers = []
 
     def step(self, chess_board, my_pos, adv_pos, max_step):
         """
@@ -51,24 +267,128 @@ class StudentAgent(Agent):
         Please check the sample implementation in agents/random_agent.py or agents/human_agent.py for more details.
         """
 
-        if self.first_iteration:
-            new_set = set()
-            new_set.add(my_pos)
-            self.node = Node(chess_board, my_pos, adv_pos, max_step, new_set)
-            t_end = time.time() + self.rollout_start_time
-            while time.time() < t_end:
-                self.tree.do_rollout(self.node)
-            self.first_iteration = False
-        else:
-            self.node.board = chess_board
-            self.node.adv_pos = adv_pos
-            t_end = time.time() + self.rollout_iter_time
-            while time.time() < t_end:
-                self.tree.do_rollout(self.node)
+        # The tree keeps the board across turns, so it needs its own copy
+        if not chess_board.flags.writeable:
+            chess_board = chess_board.copy()
+
+        first = self.first_iteration
+        self.first_iteration = False
+        start_time = time.time()
+        soft, hard = self.time_manager.allot(chess_board, first)
+
+        stats = self.parallel_search(chess_board, my_pos, adv_pos, max_step,
+                                     start_time + soft, start_time + hard)
+
+        self.time_manager.spend(time.time() - start_time, first)
+        return self.tree.choose(stats)
+
+    def parallel_search(self, chess_board, my_pos, adv_pos, max_step, t_soft, t_hard=None):
+        # Search with this tree and the trees of the workers, and return the root
+        # statistics of the workers' trees. The workers search until this search
+        # stops, which the time manager may decide before t_soft.
+        if self.n_workers > 1 and not self.workers:
+            self.start_workers()
+        t_end = t_soft if t_hard is None else t_hard
+        for _, conn in self.workers:
+            conn.send((chess_board, my_pos, adv_pos, max_step, t_end))
+        self.search(chess_board, my_pos, adv_pos, max_step, t_soft, t_hard)
+        for _, conn in self.workers:
+            conn.send(STOP_SEARCH)
+        return [conn.recv() for _, conn in self.workers]
+
+    def search(self, chess_board, my_pos, adv_pos, max_step, t_soft, t_hard=None, stop=None):
+        # Do rollouts from the position until the time manager stops the search,
+        # or without a hard limit until the time t_soft or until stop() is true
+        if self.keys is None or self.keys.board_size != chess_board.shape[0]:
+            self.keys = ZobristKeys(chess_board.shape[0])
+            self.table = TranspositionTable(len(self.table))
+
+        # Keep the part of last turn's tree below the moves made since, if any
+        if self.tree is None or not self.tree.reroot(chess_board, my_pos, adv_pos):
+            self.tree = MCTree(chess_board, my_pos, adv_pos, max_step, self.keys, self.table,
+                               leaf_evaluation=self.leaf_evaluation)
+        if t_hard is None:
+            rollouts = 0
+            while time.time() < t_soft:
+                if stop is not None and rollouts % self.check_interval == 0 and stop():
+                    break
+                self.tree.do_rollout()
+                rollouts += 1
+            return
+
+        start_time = time.time()
+        soft, hard = t_soft - start_time, t_hard - start_time
+        rollouts = 0
+        while True:
+            now = time.time()
+            elapsed = now - start_time
+            if elapsed >= hard:
+                break
+            if rollouts % self.check_interval == 0 and rollouts and (
+                    self.tree.winning_move() is not None or self.time_manager.should_stop(
+                        self.tree.root_stats(), elapsed, soft, hard, rollouts / elapsed)):
+                break
+            self.tree.do_rollout()
+            rollouts += 1
+
+    def start_workers(self):
+        # Start the worker processes of the root parallel search. Daemon processes,
+        # such as supervised agents, cannot have children and search alone.
+        if mp.current_process().daemon:
+            return
+        for _ in range(self.n_workers - 1):
+            conn, child_conn = mp.Pipe()
+            process = mp.Process(
+                target=run_search_worker,
+                args=(random.randint(0, 2**31 - 1), child_conn, self.leaf_evaluation),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append((process, conn))
+
+    def close(self):
+        # Stop the worker processes
+        for process, conn in self.workers:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            process.join(timeout=1)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            conn.close()
+        self.workers = []
+
+
+@register_agent("student_agent_parallel")
+class ParallelStudentAgent(StudentAgent):
+    """
+    The student agent with a root parallel search, by default using every core of
+    the machine. The world sets the number of processes with configure, so games
+    played in parallel share the cores.
+    """
+
+    def __init__(self, n_workers=None):
+        super(ParallelStudentAgent, self).__init__(n_workers=n_workers or os.cpu_count() or 1)
+        self.name = "ParallelStudentAgent"
+
+    def configure(self, search_workers=None, move_time=None):
+        if search_workers is not None:
+            self.n_workers = max(1, search_workers)
+
+
+@register_agent("student_agent_voronoi")
+class VoronoiStudentAgent(StudentAgent):
+    """
+    The student agent scoring the leaves of its tree by Voronoi territory instead
+    of random playouts.
+    """
 
-        move = self.tree.choose(self.node)
-        self.node = move
-        return move.cur_pos, move.d
+    def __init__(self):
+        super(VoronoiStudentAgent, self).__init__(leaf_evaluation=True)
+        self.name = "VoronoiStudentAgent"
 
 # So there is tree creation and tree rollout.
 # Creation gets as many iterations of this game as we let it, finding this best ones for us.
@@ -76,126 +396,267 @@ class StudentAgent(Agent):
 
 class MCTree:
     # Monte Carlo tree searcher. First rollout the tree then choose a move.
-
-    def __init__(self, exploration_weight=1):
-        self.Q = defaultdict(int)  # total reward of each node
-        self.N = defaultdict(int)  # total visit count for each node
-        self.children = dict()  # children of each node
+    #
+    # Nodes are integer ids into preallocated arrays. A node stands for the position
+    # after its move, the root for the current position with us to move. The children
+    # of a node are stored next to each other from first_child[node] on, and boards
+    # are rebuilt from the root by applying the moves on the path to a node.
+    #
+    # Every node also has the Zobrist hash of its position. Positions reached by
+    # different move orders share their statistics through the transposition table,
+    # which UCT uses when it knows more about a child than the edge to it.
+
+    def __init__(self, board, my_pos, adv_pos, max_step, keys=None, table=None,
+                 exploration_weight=1, capacity=1 << 14, leaf_evaluation=False):
+        self.board = board
+        self.positions = (tuple(my_pos), tuple(adv_pos))
+        self.max_step = max_step
         self.exploration_weight = exploration_weight
-
-    def choose(self, node):
-        # Choose the best successor of node.
-
-        if node not in self.children:
-            if node.terminal:
-                return None
-
-            copy = deepcopy(node)
-            is_end, x = copy.is_end_game()
-            if is_end:
-                node.terminal = True
-                return None
-
-            return node.find_random_child()
-
-        def score(n):
-            if self.N[n] == 0:
-                return float("-inf")  # avoid unseen moves
-            return self.Q[n] / self.N[n]  # average reward
-
-        return max(self.children[node], key=score)
-
-    def do_rollout(self, node):
+        # Score the leaves with the territory evaluation instead of random playouts
+        self.leaf_evaluation = leaf_evaluation
+        self.keys = keys if keys is not None else ZobristKeys(len(board))
+        # Rollouts make their moves on the scratch board and take them back after
+        self.scratch = ScratchBoard(board)
+        self.table = table if table is not None else TranspositionTable()
+
+        self.size = 1  # number of nodes, the root is node 0
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)  # -1 until expanded
+        self.n_children = np.zeros(capacity, dtype=np.int32)
+        self.move = np.full(capacity, -1, dtype=np.int32)  # encoded move leading to the node
+        self.N = np.zeros(capacity, dtype=np.int64)  # total visit count of each node
+        # total reward of each node, for the player who made its move
+        self.Q = np.zeros(capacity, dtype=np.float64)
+        self.key = np.zeros(capacity, dtype=np.uint64)  # Zobrist hash of the position
+        self.key[0] = self.keys.hash(board, my_pos, adv_pos)
+
+    def reroot(self, board, my_pos, adv_pos):
+        # Make the position after one of our moves and one reply of the adversary the
+        # new root, keeping its subtree and dropping the rest of the tree. The moves
+        # are found by diffing the new board with the root board. Returns False if
+        # the position is not in the tree.
+        my_pos, adv_pos = tuple(my_pos), tuple(adv_pos)
+        if board.shape != self.board.shape:
+            return False
+        new_walls = board & ~self.board
+        for child in self.children(0):
+            pos, d = decode_move(int(self.move[child]))
+            if pos != my_pos or not new_walls[pos[0], pos[1], d]:
+                continue
+            for grandchild in self.children(child):
+                adv_move, adv_d = decode_move(int(self.move[grandchild]))
+                if adv_move != adv_pos or not new_walls[adv_move[0], adv_move[1], adv_d]:
+                    continue
+                expected = self.board.copy()
+                set_barrier(expected, pos[0], pos[1], d)
+                set_barrier(expected, adv_move[0], adv_move[1], adv_d)
+                if np.array_equal(expected, board):
+                    self._compact(grandchild)
+                    self.board = board
+                    self.positions = (my_pos, adv_pos)
+                    self.scratch = ScratchBoard(board)
+                    return True
+        return False
+
+    def _compact(self, root):
+        # Renumber the subtree of root from 0 in breadth first order, which keeps
+        # the children of every node next to each other, and drop the other nodes
+        order = [root]
+        for node in order:
+            if self.first_child[node] >= 0:
+                order.extend(self.children(node))
+        order = np.array(order, dtype=np.int64)
+        new_id = np.full(self.size, -1, dtype=np.int32)
+        new_id[order] = np.arange(len(order))
+
+        capacity = 1 << 14
+        while capacity < len(order):
+            capacity *= 2
+        for name, fill in (("parent", -1), ("first_child", -1), ("n_children", 0),
+                           ("move", -1), ("N", 0), ("Q", 0), ("key", 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(order)] = old[order]
+            setattr(self, name, new)
+        self.parent[1:len(order)] = new_id[self.parent[1:len(order)]]
+        self.parent[0] = -1
+        # Expanded nodes without children keep a first child of 0
+        expanded = (self.first_child[:len(order)] >= 0) & (self.n_children[:len(order)] > 0)
+        self.first_child[:len(order)][expanded] = new_id[self.first_child[:len(order)][expanded]]
+        self.first_child[:len(order)][(self.first_child[:len(order)] >= 0) & ~expanded] = 0
+        self.size = len(order)
+
+    def _grow(self, needed):
+        # Double the capacity of the node arrays until needed nodes fit
+        capacity = len(self.parent)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, fill in (("parent", -1), ("first_child", -1), ("n_children", 0),
+                           ("move", -1), ("N", 0), ("Q", 0), ("key", 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def children(self, node):
+        # Ids of the children of an expanded node
+        start = self.first_child[node]
+        return range(start, start + self.n_children[node])
+
+    def root_stats(self):
+        # Moves, visit counts and total rewards of the children of the root
+        if self.first_child[0] < 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64), np.zeros(0)
+        children = self.children(0)
+        return (self.move[children.start:children.stop].copy(),
+                self.N[children.start:children.stop].copy(),
+                self.Q[children.start:children.stop].copy())
+
+    def winning_move(self):
+        # A move from the root that ends the game with our win, found when the move
+        # was expanded, or None
+        if self.first_child[0] < 0:
+            return None
+        children = self.children(0)
+        start, stop = children.start, children.stop
+        n, q = self.N[start:stop], self.Q[start:stop]
+        # Expanded children without moves of their own are over, and every rollout
+        # through them gets the same reward
+        over = (self.first_child[start:stop] >= 0) & (self.n_children[start:stop] == 0)
+        won = np.flatnonzero(over & (n > 0) & (q == n))
+        return int(self.move[start + won[0]]) if len(won) else None
+
+    def choose(self, stats=()):
+        # Choose the best move from the root. The root statistics of other trees of
+        # the same position, from the workers of a root parallel search, are added in.
+        won = self.winning_move()
+        if won is not None:
+            pos, d = decode_move(won)
+            return (int(pos[0]), int(pos[1])), int(d)
+        moves, n, q = (np.concatenate(a) for a in zip(self.root_stats(), *stats))
+
+        if len(moves) == 0:
+            # Nothing has been expanded, or the game is over
+            my_pos, adv_pos = self.positions
+            child = Node(self.board, my_pos, adv_pos, self.max_step, {my_pos}).find_random_child()
+            return child.cur_pos, child.d
+
+        moves, index = np.unique(moves, return_inverse=True)
+        n = np.bincount(index, weights=n, minlength=len(moves))
+        q = np.bincount(index, weights=q, minlength=len(moves))
+        # most visited move, ties broken by average reward
+        best = np.lexsort((q / np.maximum(n, 1), n))[-1]
+        pos, d = decode_move(int(moves[best]))
+        return (int(pos[0]), int(pos[1])), int(d)
+
+    def do_rollout(self):
         # Train for one iteration.
-        path = self._select(node)
+        path, board, positions, to_move = self._select()
         leaf = path[-1]
-        self._expand(leaf)
-        # i = 0
-        # while i < 5:
-        reward = self._simulate(leaf)
-        # i = i + 1
+        self._expand(leaf, board, positions, to_move)
+        if self.leaf_evaluation:
+            reward = self._evaluate(board, positions, to_move)
+        else:
+            reward = self._simulate(board, positions, to_move)
         self._backpropagate(path, reward)
-
-    def _select(self, node):
-        # Find an unexplored descendent of `node`
-        path = []
-        while True:
+        self.scratch.reset()
+
+    def _select(self):
+        # Find an unexplored descendent of the root, making its moves on the scratch
+        # board on the way. Returns the path, the board and positions at its end and
+        # the player to move there (0 for us, 1 for the adversary).
+        board = self.scratch.board
+        positions = list(self.positions)
+        to_move = 0
+        node = 0
+        path = [node]
+        while self.first_child[node] >= 0 and self.n_children[node] > 0:
+            node = self._uct_select(node)
+            pos, d = decode_move(int(self.move[node]))
+            self.scratch.make(pos[0], pos[1], d)
+            positions[to_move] = pos
+            to_move = 1 - to_move
             path.append(node)
-            if node not in self.children or not self.children[node]:
-                # node is either unexplored or terminal
-                return path
-            unexplored = self.children[node] - self.children.keys()
-            if unexplored:
-                while unexplored:
-                    n = unexplored.pop()
-                    nr, nc = n.cur_pos
-                    nd = n.d
-                    if not node.board[nr, nc, nd]:
-                        break
-                    self.children[node].remove(n)
-                path.append(n)
-                return path
-            while True:
-                n = self._uct_select(node)
-                nr, nc = n.cur_pos
-                nd = n.d
-                if not node.board[nr, nc, nd]:
-                    node = n  # descend a layer deeper
-                    break
-                if n in self.children.keys():
-                    self.children.pop(n)
-                if n in self.children[node]:
-                    self.children[node].remove(n)
-
-    def _expand(self, node):
-        # Update the `children` dict with the children of `node`
-        if node in self.children:
-            return  # already expanded
-        self.children[node] = node.find_children()
-
-    def _simulate(self, node):
-        # Returns the reward for a random simulation (to completion) of `node`
-        test_node = deepcopy(node)
-
-        # Opponent makes next move
-        test_node = Node(test_node.board, test_node.adv_pos, test_node.cur_pos, test_node.max_step,
-                         test_node.visited_pos)
+            if self.N[node] == 0:
+                break
+        return path, board, positions, to_move
 
-        invert_reward = True
+    def _expand(self, node, board, positions, to_move):
+        # Add the moves of the player to move as children of node
+        if self.first_child[node] >= 0:
+            return  # already expanded
+        if self.scratch.end_game(positions[to_move], positions[1 - to_move])[0]:
+            moves = []
+        else:
+            moves = sorted(encode_move(pos, d) for pos, d in find_moves(
+                board, positions[to_move], positions[1 - to_move], self.max_step))
+        start = self.size
+        self._grow(start + len(moves))
+        self.first_child[node] = start
+        self.n_children[node] = len(moves)
+        self.parent[start:start + len(moves)] = node
+        self.move[start:start + len(moves)] = moves
+        # The hashes of the children follow from the hash of node
+        moves = np.asarray(moves, dtype=np.int64)
+        self.key[start:start + len(moves)] = self.key[node] ^ self.keys.move(
+            to_move, positions[to_move], moves >> 8, (moves >> 2) & 0x3F, moves & 0x3)
+        self.size += len(moves)
+
+    def _simulate(self, board, positions, to_move):
+        # Returns the reward for us of a random simulation (to completion) of the position.
+        # The moves are made on the scratch board, do_rollout takes them back.
+        positions = list(positions)
+        mover = to_move
         while True:
-            term, rew = test_node.is_end_game()
+            term, rew = self.scratch.end_game(positions[mover], positions[1 - mover])
             if term:
-                test_node.terminal = True
-                reward = rew
-                return 1 - reward if invert_reward else reward
-            test_node = test_node.find_random_child()
-            # Not 100% sure this makes sense...
-            test_node = Node(test_node.board, test_node.adv_pos, test_node.cur_pos, test_node.max_step,
-                             test_node.visited_pos)
-            invert_reward = not invert_reward
+                # rew is the reward of the player to move
+                return rew if mover == 0 else 1 - rew
+            pos, d = self.scratch.random_move(positions[mover], positions[1 - mover], self.max_step)
+            self.scratch.make(pos[0], pos[1], d)
+            positions[mover] = pos
+            # The other player moves next
+            mover = 1 - mover
+
+    def _evaluate(self, board, positions, to_move):
+        # Returns the reward for us of the position, exact if the game is over and
+        # otherwise from the share of the cells we reach before the adversary
+        term, rew = self.scratch.end_game(positions[to_move], positions[1 - to_move])
+        if term:
+            return rew if to_move == 0 else 1 - rew
+        territory = voronoi(board, positions[0], positions[1])
+        total = territory.p0_cells.sum() + territory.p1_cells.sum() + territory.contested.sum()
+        return 0.5 + 0.5 * int(territory.score) / max(total, 1)
 
     def _backpropagate(self, path, reward):
-        # Send the reward back up to the ancestors of the leaf
-        for node in reversed(path):
+        # Send the reward back up to the ancestors of the leaf.
+        # The nodes at odd depth are our moves, the others the adversary's.
+        for depth, node in enumerate(path):
+            value = reward if depth % 2 == 1 else 1 - reward
             self.N[node] += 1
-            self.Q[node] += reward
-            reward = 1 - reward  # 1 for me is 0 for my enemy, and vice versa
+            self.Q[node] += value
+            self.table.update(self.key[node], value)
 
     def _uct_select(self, node):
         # Select a child of node, balancing exploration & exploitation
-
-        # All children of node should already be expanded:
-        assert all(n in self.children for n in self.children[node])
-
-        log_n_vertex = math.log(self.N[node])
-
-        def uct(n):
-            # Upper confidence bound for trees
-            return self.Q[n] / self.N[n] + self.exploration_weight * math.sqrt(
-                log_n_vertex / self.N[n]
-            )
-
-        return max(self.children[node], key=uct)
+        start = self.first_child[node]
+        stop = start + self.n_children[node]
+        n, q = self.N[start:stop], self.Q[start:stop]
+        # Prefer the statistics of the transposition table when it has seen more
+        tt_n, tt_q = self.table.lookup(self.key[start:stop])
+        use_tt = tt_n > n
+        n = np.where(use_tt, tt_n, n)
+        q = np.where(use_tt, tt_q, q)
+        unvisited = np.flatnonzero(n == 0)
+        if len(unvisited):
+            return start + int(unvisited[0])
+
+        log_n_vertex = math.log(max(self.N[node], n.sum()))
+        # Upper confidence bound for trees
+        uct = q / n + self.exploration_weight * np.sqrt(log_n_vertex / n)
+        return start + int(np.argmax(uct))
 
 
 class Node:
@@ -222,141 +683,26 @@ class Node:
         self.adv_pos = adv_pos
 
     def find_children(self):
-        self.visited_pos = set()
-        self.visited_pos.add(self.cur_pos)
+        # All possible successors of this board state, as compact (position, barrier
+        # direction) moves. Use child to turn one into a full board state.
+        self.visited_pos = {self.cur_pos}
 
         if self.terminal:
-            return set()
+            return []
 
-        copy = deepcopy(self)
-
-        is_end, x = copy.is_end_game()
+        is_end, x = self.is_end_game()
         if is_end:
             self.terminal = True
-            return set()
-
-        moves = ((-1, 0), (0, 1), (1, 0), (0, -1))
-        opposites = {0: 2, 1: 3, 2: 0, 3: 1}
+            return []
 
-        # set containing children nodes
-        children: set = set()
-        children_pos = set()
-        children_pos.add(self.cur_pos)
-
-        k = 0
-        r, c = self.cur_pos
-        while k < 4:
-            if not self.board[r, c, k]:
-                # if the guard can be placed in the location
-                # add step and barrier placement move to set of possible moves
-                # next_move.add(((x, y), i))
-                new_board = deepcopy(self.board)
-                # Set the barrier to True
-                new_board[r, c, k] = True
-                # Set the opposite barrier to True
-                move = moves[k]
-                new_board[r + move[0], c + move[1], opposites[k]] = True
-                pos2 = (r, c)
-                children.add(Node(new_board, pos2, self.adv_pos, self.max_step, children_pos, k))
-
-            k = k + 1
-
-        first_step = True
-        # set containing all possible moves
-        # possible_moves = set()
-        # set containing the possible moves from some step
-        curr_step_pos = set()
-
-        i = 0
-        # get all possible moves of all possible lengths
-        while i < self.max_step:
-            if first_step:
-                one_step_pos, r_children = self.next_move()
-                # possible_moves.update(one_step_moves)
-                curr_step_pos.update(one_step_pos)
-                children.update(r_children)
-                children_pos.update(one_step_pos)
-                first_step = False
-            else:
-                next_step_pos = set()
-                for pos in curr_step_pos:
-                    new_board = deepcopy(self.board)
-                    new_node = Node(new_board, pos, self.adv_pos, self.max_step, children_pos)
-                    step_pos, r_children = new_node.next_move()
-                    next_step_pos.update(step_pos)
-                    children.update(r_children)
-                    children_pos.update(next_step_pos)
-
-                curr_step_pos = set()
-                curr_step_pos.update(next_step_pos)
-
-            i = i + 1
-
-        # All possible successors of this board state
-        return children
-
-    def next_move(self):
-        # possible one-step moves
-        moves = ((-1, 0), (0, 1), (1, 0), (0, -1))
-        opposites = {0: 2, 1: 3, 2: 0, 3: 1}
+        return find_moves(self.board, self.cur_pos, self.adv_pos, self.max_step)
 
-        # set of possible next positions
-        next_pos = set()
-        # set of possible next positions and guard placement
-        # next_move = set()
-        # set containing possible children nodes
-        next_node = set()
-
-        r, c = self.cur_pos
-
-        # move 1 step up
-        m_r, m_c = moves[0]
-        new_pos = (r + m_r, c + m_c)
-        # check that there isn't a barrier blocking movement
-        # and check adversary is not in that new position
-        if not self.board[r, c, 0] and not new_pos == self.adv_pos and new_pos not in self.visited_pos:
-            # add the possible position to the set
-            next_pos.add(new_pos)
-
-        # move 1 step to the right
-        m_r, m_c = moves[1]
-        new_pos = (r + m_r, c + m_c)
-        if not self.board[r, c, 1] and not new_pos == self.adv_pos and new_pos not in self.visited_pos:
-            next_pos.add(new_pos)
-
-        # move 1 step down
-        m_r, m_c = moves[2]
-        new_pos = (r + m_r, c + m_c)
-        if not self.board[r, c, 2] and not new_pos == self.adv_pos and new_pos not in self.visited_pos:
-            next_pos.add(new_pos)
-
-        # move one step to the left
-        m_r, m_c = moves[3]
-        new_pos = (r + m_r, c + m_c)
-        if not self.board[r, c, 3] and not new_pos == self.adv_pos and new_pos not in self.visited_pos:
-            next_pos.add(new_pos)
-
-        # get all possible guard placements for each new position
-        for pos in next_pos:
-            i = 0
-            x, y = pos
-            while i < 4:
-                if not self.board[x, y, i]:
-                    # if the guard can be placed in the location
-                    # add step and barrier placement move to set of possible moves
-                    # next_move.add(((x, y), i))
-                    new_board = deepcopy(self.board)
-                    # Set the barrier to True
-                    new_board[x, y, i] = True
-                    # Set the opposite barrier to True
-                    move = moves[i]
-                    new_board[x + move[0], y + move[1], opposites[i]] = True
-                    pos2 = (x, y)
-                    next_node.add(Node(new_board, pos2, self.adv_pos, self.max_step, self.visited_pos, i))
-
-                i = i + 1
-
-        return next_pos, next_node
+    def child(self, move):
+        # The board state after a move found by find_children
+        (r, c), d = move
+        new_board = self.board.copy()
+        set_barrier(new_board, r, c, d)
+        return Node(new_board, (r, c), self.adv_pos, self.max_step, {self.cur_pos}, d)
 
     def find_random_child(self):
 
@@ -406,45 +752,15 @@ class Node:
         return Node(new_board, my_pos, self.adv_pos, self.max_step, visited, d)
 
     def is_end_game(self):
-        moves = ((-1, 0), (0, 1), (1, 0), (0, -1))
-
-        # Union-Find
-        father = dict()
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                father[(r, c)] = (r, c)
-
-        def find(pos):
-            if father[pos] != pos:
-                father[pos] = find(father[pos])
-            return father[pos]
-
-        def union(pos1, pos2):
-            father[pos1] = pos2
-
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                for d, move in enumerate(
-                        moves[1:3]
-                ):  # Only check down and right
-                    if self.board[r, c, d + 1]:
-                        continue
-                    pos_a = find((r, c))
-                    pos_b = find((r + move[0], c + move[1]))
-                    if pos_a != pos_b:
-                        union(pos_a, pos_b)
-
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                find((r, c))
-        p0_r = find(tuple(self.cur_pos))
-        p1_r = find(tuple(self.adv_pos))
+        labels, sizes = label_regions(self.board)
+        p0_r = labels[self.cur_pos[0], self.cur_pos[1]]
+        p1_r = labels[self.adv_pos[0], self.adv_pos[1]]
 
         if p0_r == p1_r:
             return False, 0.0
 
-        p0_score = list(father.values()).count(p0_r)
-        p1_score = list(father.values()).count(p1_r)
+        p0_score = sizes[p0_r]
+        p1_score = sizes[p1_r]
 
         if p0_score > p1_score:
             return True, 1.0
@@ -0,0 +1,551 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import numpy as np
+from time import perf_counter, time
+from agents.student_agent import Node, StudentAgent
+from connectivity import DistanceMap
+from replay import apply_walls
+from constants import *
+from simulator import Simulator, get_args
+from utils import all_logging_disabled
+from world import World
+
+# Board sizes of the micro benchmarks
+BENCHMARK_BOARD_SIZES = (5, 8, 12, 16)
+# Agent pairs of the macro benchmarks, fast enough to play a few games each
+BENCHMARK_AGENT_PAIRS = (
+    ("random_agent", "random_agent"),
+    ("random_no_endgame", "random_agent"),
+    ("approach_agent", "random_agent"),
+)
+
+
+class Benchmark:
+    """
+    A timed operation. Every sample runs setup, which is not timed, then run, which
+    performs the operation calls times on what setup returned.
+
+    Parameters
+    ----------
+    name : str
+        The name of the benchmark, unique within a suite.
+    setup : callable
+        Called without arguments before every sample.
+    run : callable
+        Called with the result of setup, the timed part of the sample.
+    calls : int
+        The number of operations run performs.
+    """
+
+    def __init__(self, name, setup, run, calls=1):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.calls = calls
+
+    def measure(self, repeat=5):
+        """
+        Time the benchmark over repeat samples.
+
+        Returns
+        -------
+        result : dict
+            seconds, the time of one operation in the fastest sample, which is the
+            least disturbed by the rest of the machine, median, the time of one
+            operation in the median sample, and calls, the operations timed.
+        """
+        times = []
+        for _ in range(repeat):
+            state = self.setup()
+            start = perf_counter()
+            self.run(state)
+            times.append((perf_counter() - start) / self.calls)
+        return {
+            "seconds": min(times),
+            "median": float(np.median(times)),
+            "calls": self.calls * repeat,
+        }
+
+
+def seeded_world(board_size, seed, board_backend=BOARD_BACKEND_ARRAY):
+    """
+    Get a reproducible mid-game world. Random walks are played from a seeded board
+    for up to board_size * board_size moves, and the world is the last position
+    before the game would end.
+
+    Returns
+    -------
+    world : World
+    """
+    np.random.seed(seed)
+    with all_logging_disabled():
+        world = World(board_size=board_size)
+        while world.initial_end:
+            world = World(board_size=board_size)
+        state = (world.chess_board.copy(), world.p0_pos, world.p1_pos)
+        for _ in range(board_size * board_size):
+            _, cur_pos, adv_pos = world.get_current_player()
+            (r, c), dir = world.random_walk(tuple(cur_pos), tuple(adv_pos))
+            if not world.turn:
+                world.p0_pos = np.asarray((r, c))
+            else:
+                world.p1_pos = np.asarray((r, c))
+            world.set_barrier(r, c, dir)
+            world.turn = 1 - world.turn
+            if world.check_endgame()[0]:
+                break
+            state = (world.chess_board.copy(), world.p0_pos, world.p1_pos)
+        world = World(board_backend=board_backend, initial_state=state)
+    return world
+
+
+def free_walls(world, count):
+    """
+    Get up to count random (r, c, dir) walls that are not on the board of the world,
+    one per barrier.
+    """
+    chess_board = world.chess_board
+    walls = [
+        (r, c, dir)
+        for r in range(world.board_size)
+        for c in range(world.board_size)
+        for dir in (DIRECTION_RIGHT, DIRECTION_DOWN)
+        if not chess_board[r, c, dir]
+    ]
+    order = np.random.permutation(len(walls))[:count]
+    return [walls[i] for i in order]
+
+
+def valid_steps(world, count):
+    """
+    Get count random valid (start_pos, end_pos, dir) steps of the player to move.
+    """
+    _, cur_pos, adv_pos = world.get_current_player()
+    steps = [
+        (cur_pos, np.asarray(pos), dir)
+        for pos in sorted(world.get_valid_positions(tuple(cur_pos), tuple(adv_pos)))
+        for dir in range(4)
+        if not world.chess_board[pos[0], pos[1], dir]
+    ]
+    return [steps[i] for i in np.random.randint(0, len(steps), size=count)]
+
+
+def micro_benchmarks(board_sizes=BENCHMARK_BOARD_SIZES, seed=0):
+    """
+    Get the micro benchmarks of the World methods on both board backends, of the
+    student agent's Node and of connectivity.DistanceMap on seeded boards
+    of every size.
+
+    Returns
+    -------
+    benchmarks : list of Benchmark
+    """
+    benchmarks = []
+    for board_size in board_sizes:
+        for board_backend in BOARD_BACKENDS:
+            world = seeded_world(board_size, seed, board_backend)
+            tag = f"[{board_backend},{board_size}]"
+            _, cur_pos, adv_pos = world.get_current_player()
+            cur_pos, adv_pos = tuple(cur_pos), tuple(adv_pos)
+
+            def check_endgame(world, calls=200):
+                for _ in range(calls):
+                    world.check_endgame()
+
+            def check_valid_step(state):
+                world, steps = state
+                for step in steps:
+                    # Every step is checked in a new turn, with nothing cached
+                    world.reachable_cache = None
+                    world.check_valid_step(*step)
+
+            def set_barrier(state):
+                world, walls = state
+                for wall in walls:
+                    world.set_barrier(*wall)
+
+            def random_walk(state, calls=200):
+                world, my_pos, adv_pos = state
+                for _ in range(calls):
+                    world.random_walk(my_pos, adv_pos)
+
+            # A copy of the world for the samples that place walls. Its zones
+            # are built before timing, as they are during a game.
+            def walled_world(world=world, seed=seed):
+                np.random.seed(seed)
+                with all_logging_disabled():
+                    world = World(
+                        board_backend=world.board_backend,
+                        initial_state=(world.chess_board, world.p0_pos, world.p1_pos),
+                    )
+                world.check_endgame()
+                return world, free_walls(world, world.board_size)
+
+            np.random.seed(seed)
+            steps = valid_steps(world, 200)
+            benchmarks += [
+                Benchmark(
+                    "check_endgame" + tag, lambda world=world: world, check_endgame, 200
+                ),
+                Benchmark(
+                    "check_valid_step" + tag,
+                    lambda world=world, steps=steps: (world, steps),
+                    check_valid_step,
+                    len(steps),
+                ),
+                Benchmark("set_barrier" + tag, walled_world, set_barrier, board_size),
+                Benchmark(
+                    "random_walk" + tag,
+                    lambda world=world, cur_pos=cur_pos, adv_pos=adv_pos: (
+                        world,
+                        cur_pos,
+                        adv_pos,
+                    ),
+                    random_walk,
+                    200,
+                ),
+            ]
+
+        world = seeded_world(board_size, seed)
+        _, cur_pos, adv_pos = world.get_current_player()
+        node = Node(
+            world.chess_board, tuple(cur_pos), tuple(adv_pos), world.max_step, set()
+        )
+
+        def find_children(node, calls=50):
+            for _ in range(calls):
+                node.find_children()
+
+        def is_end_game(node, calls=200):
+            for _ in range(calls):
+                node.is_end_game()
+
+        # The walls of a turn of both players added to a distance map, repaired
+        # or measured again
+        np.random.seed(seed)
+        walled_board = world.chess_board.copy()
+        apply_walls(walled_board, free_walls(world, 2))
+
+        def distance_maps(board=world.chess_board, source=tuple(adv_pos)):
+            return [DistanceMap(board, source) for _ in range(50)]
+
+        def update_distances(distance_maps, board=walled_board):
+            for distance_map in distance_maps:
+                distance_map.update(board)
+
+        def rebuild_distances(distance_maps, board=walled_board):
+            for distance_map in distance_maps:
+                DistanceMap(board, distance_map.source)
+
+        benchmarks += [
+            Benchmark(
+                f"DistanceMap.update[{board_size}]",
+                distance_maps,
+                update_distances,
+                50,
+            ),
+            Benchmark(
+                f"DistanceMap.rebuild[{board_size}]",
+                distance_maps,
+                rebuild_distances,
+                50,
+            ),
+            Benchmark(
+                f"Node.find_children[{board_size}]",
+                lambda node=node: node,
+                find_children,
+                50,
+            ),
+            Benchmark(
+                f"Node.is_end_game[{board_size}]",
+                lambda node=node: node,
+                is_end_game,
+                200,
+            ),
+        ]
+    return benchmarks
+
+
+def macro_benchmarks(
+    agent_pairs=BENCHMARK_AGENT_PAIRS, board_size=8, games=4, seed=0
+):
+    """
+    Get the macro benchmarks of whole Simulator.run games, one per agent pair. A
+    sample plays the same seeded games every time, with the players swapped on
+    every other game.
+
+    Returns
+    -------
+    benchmarks : list of Benchmark
+    """
+
+    def play(args):
+        with all_logging_disabled():
+            for game in range(games):
+                np.random.seed(seed + game)
+                Simulator(args).run(swap_players=game % 2 == 1)
+
+    return [
+        Benchmark(
+            f"Simulator.run[{player_1},{player_2},{board_size}]",
+            lambda player_1=player_1, player_2=player_2: get_args(
+                [
+                    "--player_1",
+                    player_1,
+                    "--player_2",
+                    player_2,
+                    "--board_size",
+                    str(board_size),
+                ]
+            ),
+            play,
+            games,
+        )
+        for player_1, player_2 in agent_pairs
+    ]
+
+
+class SearchBenchmark:
+    """
+    The rollout throughput of the student agent's root parallel search. A sample
+    searches the first position of a seeded board for search_time seconds with a
+    fresh agent, whose workers are started before the clock does. Its time is
+    search_time divided by the rollouts of all the trees, so the time of one rollout
+    falls as workers are added, as long as the machine has the cores to run them.
+
+    Parameters
+    ----------
+    n_workers : int
+        The number of trees searched in parallel, see StudentAgent.
+    board_size : int
+    search_time : float
+        The seconds every sample searches for.
+    seed : int
+        The seed of the board.
+    """
+
+    def __init__(self, n_workers, board_size=8, search_time=0.5, seed=0):
+        self.name = f"StudentAgent.parallel_search[n_workers={n_workers},{board_size}]"
+        self.n_workers = n_workers
+        self.board_size = board_size
+        self.search_time = search_time
+        self.seed = seed
+
+    def measure(self, repeat=5):
+        """
+        Time the search over repeat samples, see Benchmark.measure.
+        """
+        np.random.seed(self.seed)
+        with all_logging_disabled():
+            world = World(board_size=self.board_size)
+        position = (
+            world.chess_board,
+            tuple(world.p0_pos),
+            tuple(world.p1_pos),
+            world.max_step,
+        )
+        times = []
+        rollouts = 0
+        for _ in range(repeat):
+            agent = StudentAgent(n_workers=self.n_workers)
+            agent.start_workers()
+            try:
+                stats = agent.parallel_search(
+                    *position, time() + self.search_time
+                )
+            finally:
+                agent.close()
+            # Every rollout visits one child of the root, but for the first
+            sample = sum(n.sum() + 1 for _, n, _ in [agent.tree.root_stats()] + stats)
+            rollouts += int(sample)
+            times.append(self.search_time / sample)
+        return {
+            "seconds": min(times),
+            "median": float(np.median(times)),
+            "calls": rollouts,
+        }
+
+
+def search_benchmarks(worker_counts=None, board_size=8, search_time=0.5, seed=0):
+    """
+    Get the benchmarks of the root parallel search, with one worker and with one
+    per core of the machine, or at least two.
+
+    Returns
+    -------
+    benchmarks : list of SearchBenchmark
+    """
+    if worker_counts is None:
+        worker_counts = (1, max(2, os.cpu_count() or 1))
+    return [
+        SearchBenchmark(n_workers, board_size, search_time, seed)
+        for n_workers in worker_counts
+    ]
+
+
+def run_benchmarks(benchmarks, repeat=5, name_filter=None):
+    """
+    Measure the benchmarks whose name contains name_filter.
+
+    Returns
+    -------
+    results : dict
+        The results of Benchmark.measure by benchmark name.
+    """
+    results = {}
+    for benchmark in benchmarks:
+        if name_filter is not None and name_filter not in benchmark.name:
+            continue
+        results[benchmark.name] = benchmark.measure(repeat)
+        print(
+            f"{benchmark.name:<55} {results[benchmark.name]['seconds'] * 1e6:12.1f} us"
+        )
+    return results
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Compare benchmark results against a baseline. Only the benchmarks found in both
+    are compared.
+
+    Parameters
+    ----------
+    results : dict
+        The current results, as returned by run_benchmarks.
+    baseline : dict
+        The baseline results, in the same format.
+    tolerance : float
+        The fraction by which an operation may be slower than in the baseline.
+
+    Returns
+    -------
+    comparison : list of tuple
+        (name, baseline_seconds, seconds, ratio, is_regression) of every benchmark.
+    """
+    comparison = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]["seconds"]
+        ratio = result["seconds"] / base if base > 0 else np.inf
+        comparison.append(
+            (name, base, result["seconds"], ratio, ratio > 1 + tolerance)
+        )
+    return comparison
+
+
+def environment():
+    """
+    Get the versions and machine the benchmarks run on, which are stored with the
+    results since timings are only comparable in the same environment.
+
+    Returns
+    -------
+    environment : dict
+    """
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def environment_mismatches(baseline_environment):
+    """
+    List the differences between the environment a baseline was recorded in and
+    the current one.
+
+    Returns
+    -------
+    mismatches : list of str
+    """
+    return [
+        f"{key} {baseline_environment.get(key)} in the baseline, {value} here"
+        for key, value in environment().items()
+        if baseline_environment.get(key) != value
+    ]
+
+
+def get_benchmark_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the results to this JSON file",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Compare the results against this JSON file written by --output",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="The fraction by which an operation may be slower than in the baseline",
+    )
+    parser.add_argument("--board_sizes", type=int, nargs="+", default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--filter",
+        type=str,
+        default=None,
+        help="Only run the benchmarks whose name contains this string",
+    )
+    parser.add_argument("--macro_games", type=int, default=4)
+    parser.add_argument("--skip_micro", action="store_true", default=False)
+    parser.add_argument("--skip_macro", action="store_true", default=False)
+    parser.add_argument("--skip_search", action="store_true", default=False)
+    parser.add_argument(
+        "--search_workers",
+        type=int,
+        nargs="+",
+        default=None,
+        help="The worker counts of the root parallel search benchmarks",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = get_benchmark_args()
+    benchmarks = []
+    if not args.skip_micro:
+        benchmarks += micro_benchmarks(
+            args.board_sizes or BENCHMARK_BOARD_SIZES, args.seed
+        )
+    if not args.skip_macro:
+        benchmarks += macro_benchmarks(games=args.macro_games, seed=args.seed)
+    if not args.skip_search:
+        benchmarks += search_benchmarks(args.search_workers, seed=args.seed)
+    results = run_benchmarks(benchmarks, args.repeat, args.filter)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                dict(environment(), results=results),
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for mismatch in environment_mismatches(baseline):
+            print(f"Warning: {mismatch}, the timings may not be comparable")
+        comparison = compare(results, baseline["results"], args.tolerance)
+        regressions = [row for row in comparison if row[4]]
+        for name, base, seconds, ratio, is_regression in comparison:
+            print(
+                f"{name:<55} {base * 1e6:12.1f} us -> {seconds * 1e6:12.1f} us"
+                f" ({ratio:.2f}x){'  REGRESSION' if is_regression else ''}"
+            )
+        if regressions:
+            print(f"{len(regressions)} benchmarks are slower than the baseline")
+            sys.exit(1)
@@ -0,0 +1,225 @@
+import numpy as np
+from constants import *
+
+
+def popcount(mask):
+    """
+    Count the number of set bits of a non-negative python int.
+    """
+    return bin(mask).count("1")
+
+
+class BitBoard:
+    """
+    Bit-packed alternative to the (board_size, board_size, 4) boolean chess board.
+
+    Cell (r, c) is bit r * board_size + c of every mask. Walls are stored once:
+    ``h_walls`` holds the wall below each cell (DIRECTION_DOWN) and ``v_walls``
+    the wall on its right (DIRECTION_RIGHT). The up and left walls of a cell are
+    the down and right walls of its neighbour, and the borders are implicit on
+    the top and left sides and stored on the bottom and right sides, so a wall
+    is always set on both of its faces at once.
+
+    Parameters
+    ----------
+    board_size : int
+        The size of the board.
+    h_walls : int
+        Packed horizontal walls. If None, only the borders are set.
+    v_walls : int
+        Packed vertical walls. If None, only the borders are set.
+    """
+
+    __slots__ = ("board_size", "h_walls", "v_walls", "full_mask")
+
+    def __init__(self, board_size, h_walls=None, v_walls=None):
+        self.board_size = board_size
+        self.full_mask = (1 << (board_size * board_size)) - 1
+        if h_walls is None:
+            # Bottom border
+            h_walls = ((1 << board_size) - 1) << ((board_size - 1) * board_size)
+        if v_walls is None:
+            # Right border
+            v_walls = 0
+            for r in range(board_size):
+                v_walls |= 1 << (r * board_size + board_size - 1)
+        self.h_walls = h_walls
+        self.v_walls = v_walls
+
+    @classmethod
+    def from_array(cls, chess_board):
+        """
+        Pack a (board_size, board_size, 4) boolean chess board.
+        Only the down and right faces are read, so the board is expected to be symmetric.
+        """
+        board_size = chess_board.shape[0]
+        return cls(
+            board_size,
+            cls._pack(chess_board[:, :, DIRECTION_DOWN]),
+            cls._pack(chess_board[:, :, DIRECTION_RIGHT]),
+        )
+
+    @staticmethod
+    def _pack(bits):
+        packed = np.packbits(np.ravel(bits).astype(bool), bitorder="little")
+        return int.from_bytes(packed.tobytes(), "little")
+
+    def _unpack(self, mask):
+        n_cells = self.board_size * self.board_size
+        raw = np.frombuffer(mask.to_bytes((n_cells + 7) // 8, "little"), np.uint8)
+        bits = np.unpackbits(raw, count=n_cells, bitorder="little").astype(bool)
+        return bits.reshape(self.board_size, self.board_size)
+
+    def to_array(self):
+        """
+        Unpack into a (board_size, board_size, 4) boolean chess board.
+        """
+        down = self._unpack(self.h_walls)
+        right = self._unpack(self.v_walls)
+        chess_board = np.zeros((self.board_size, self.board_size, 4), dtype=bool)
+        chess_board[:, :, DIRECTION_DOWN] = down
+        chess_board[1:, :, DIRECTION_UP] = down[:-1]
+        chess_board[0, :, DIRECTION_UP] = True
+        chess_board[:, :, DIRECTION_RIGHT] = right
+        chess_board[:, 1:, DIRECTION_LEFT] = right[:, :-1]
+        chess_board[:, 0, DIRECTION_LEFT] = True
+        return chess_board
+
+    def copy(self):
+        return BitBoard(self.board_size, self.h_walls, self.v_walls)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, BitBoard)
+            and self.board_size == other.board_size
+            and self.h_walls == other.h_walls
+            and self.v_walls == other.v_walls
+        )
+
+    def __hash__(self):
+        return hash((self.board_size, self.h_walls, self.v_walls))
+
+    def __len__(self):
+        return self.board_size
+
+    @property
+    def shape(self):
+        return (self.board_size, self.board_size, 4)
+
+    def _wall_bit(self, r, c, dir):
+        """
+        Return (is_horizontal, bit index) of a wall, or None for the implicit top/left borders.
+        """
+        r, c = int(r), int(c)
+        if dir == DIRECTION_UP:
+            return None if r == 0 else (True, (r - 1) * self.board_size + c)
+        if dir == DIRECTION_RIGHT:
+            return False, r * self.board_size + c
+        if dir == DIRECTION_DOWN:
+            return True, r * self.board_size + c
+        return None if c == 0 else (False, r * self.board_size + c - 1)
+
+    def is_wall(self, r, c, dir):
+        """
+        Check whether cell (r, c) has a barrier (or border) in direction dir.
+        """
+        bit = self._wall_bit(r, c, dir)
+        if bit is None:
+            return True
+        horizontal, index = bit
+        return bool(((self.h_walls if horizontal else self.v_walls) >> index) & 1)
+
+    def set_barrier(self, r, c, dir):
+        """
+        Set a barrier on both faces of the wall at cell (r, c) in direction dir.
+        """
+        bit = self._wall_bit(r, c, dir)
+        if bit is None:
+            return
+        horizontal, index = bit
+        if horizontal:
+            self.h_walls |= 1 << index
+        else:
+            self.v_walls |= 1 << index
+
+    def __getitem__(self, key):
+        r, c, dir = key
+        return self.is_wall(r, c, dir)
+
+    def __setitem__(self, key, value):
+        r, c, dir = (int(k) for k in key)
+        if value:
+            self.set_barrier(r, c, dir)
+            return
+        bit = self._wall_bit(r, c, dir)
+        if (
+            bit is None
+            or (dir == DIRECTION_DOWN and r == self.board_size - 1)
+            or (dir == DIRECTION_RIGHT and c == self.board_size - 1)
+        ):
+            raise ValueError(f"Cannot remove the border at ({r}, {c}, {dir})")
+        horizontal, index = bit
+        if horizontal:
+            self.h_walls &= ~(1 << index)
+        else:
+            self.v_walls &= ~(1 << index)
+
+    def cell_mask(self, r, c):
+        return 1 << (int(r) * self.board_size + int(c))
+
+    def cells(self, mask):
+        """
+        List the (r, c) positions of the cells set in mask.
+        """
+        positions = []
+        while mask:
+            low = mask & -mask
+            index = low.bit_length() - 1
+            positions.append(divmod(index, self.board_size))
+            mask ^= low
+        return positions
+
+    def expand(self, mask):
+        """
+        Grow a set of cells by one step in every direction not blocked by a barrier.
+        """
+        down = self.full_mask & ~self.h_walls
+        right = self.full_mask & ~self.v_walls
+        n = self.board_size
+        return (
+            mask
+            | ((mask & down) << n)
+            | ((mask >> n) & down)
+            | ((mask & right) << 1)
+            | ((mask >> 1) & right)
+        )
+
+    def reachable(self, start_pos, blocked_pos=None, max_step=None):
+        """
+        Mask of the cells reachable from start_pos within max_step steps
+        (unbounded if None) without walking through blocked_pos.
+        """
+        allowed = self.full_mask
+        if blocked_pos is not None:
+            allowed &= ~self.cell_mask(*blocked_pos)
+        mask = self.cell_mask(*start_pos)
+        step = 0
+        while max_step is None or step < max_step:
+            grown = self.expand(mask) & allowed
+            if grown == mask:
+                break
+            mask = grown
+            step += 1
+        return mask
+
+    def region(self, pos):
+        """
+        Mask of the closed zone containing pos.
+        """
+        return self.reachable(pos)
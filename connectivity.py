@@ -0,0 +1,506 @@
+import heapq
+from collections import deque
+import numpy as np
+from bitboard import BitBoard
+from constants import *
+
+# Moves (Up, Right, Down, Left)
+MOVES = ((-1, 0), (0, 1), (1, 0), (0, -1))
+
+
+def label_regions(chess_board):
+    """
+    Label the closed zones of one or more boards with vectorized label propagation.
+
+    Every cell starts with its own flat index as label. Each pass lowers the label
+    of both ends of every open edge to the smaller of the two, then jumps every
+    label to the label of the cell it points to, until nothing changes. Each zone
+    ends up labelled with the flat index of its first cell.
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (..., board_size, board_size, 4) or BitBoard
+        The board, or a batch of boards with any number of leading dimensions.
+
+    Returns
+    -------
+    labels : numpy.ndarray of shape (..., board_size, board_size)
+        The label of the zone of each cell.
+    sizes : numpy.ndarray of shape (..., board_size * board_size)
+        The number of blocks of each zone, indexed by label (0 for unused labels).
+    """
+    if isinstance(chess_board, BitBoard):
+        chess_board = chess_board.to_array()
+    chess_board = np.asarray(chess_board, dtype=bool)
+    batch_shape = chess_board.shape[:-3]
+    board_size = chess_board.shape[-2]
+    n_cells = board_size * board_size
+
+    open_down = ~chess_board[..., :-1, :, DIRECTION_DOWN]
+    open_right = ~chess_board[..., :, :-1, DIRECTION_RIGHT]
+    labels = np.broadcast_to(
+        np.arange(n_cells).reshape(board_size, board_size),
+        batch_shape + (board_size, board_size),
+    ).copy()
+    while True:
+        new_labels = labels.copy()
+        up, down = labels[..., :-1, :], labels[..., 1:, :]
+        np.minimum(
+            new_labels[..., :-1, :],
+            np.where(open_down, down, n_cells),
+            out=new_labels[..., :-1, :],
+        )
+        np.minimum(
+            new_labels[..., 1:, :],
+            np.where(open_down, up, n_cells),
+            out=new_labels[..., 1:, :],
+        )
+        left, right = labels[..., :, :-1], labels[..., :, 1:]
+        np.minimum(
+            new_labels[..., :, :-1],
+            np.where(open_right, right, n_cells),
+            out=new_labels[..., :, :-1],
+        )
+        np.minimum(
+            new_labels[..., :, 1:],
+            np.where(open_right, left, n_cells),
+            out=new_labels[..., :, 1:],
+        )
+        # Pointer jumping
+        flat = new_labels.reshape(batch_shape + (n_cells,))
+        flat = np.take_along_axis(flat, flat, axis=-1)
+        new_labels = flat.reshape(labels.shape)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+
+    flat = labels.reshape(-1, n_cells)
+    offsets = np.arange(flat.shape[0])[:, None] * n_cells
+    sizes = np.bincount((flat + offsets).ravel(), minlength=flat.shape[0] * n_cells)
+    return labels, sizes.reshape(batch_shape + (n_cells,))
+
+
+def reachable_positions(chess_board, start_pos, adv_pos, max_step):
+    """
+    Get every position a player can end its move on.
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (board_size, board_size, 4) or BitBoard
+        The chess board.
+    start_pos : tuple of int
+        The position of the player.
+    adv_pos : tuple of int
+        The position of the adversary, which cannot be walked through.
+    max_step : int
+        The maximum number of steps.
+
+    Returns
+    -------
+    positions : set of tuple of int
+        The positions within max_step steps of start_pos, start_pos included.
+    """
+    start_pos = (int(start_pos[0]), int(start_pos[1]))
+    adv_pos = (int(adv_pos[0]), int(adv_pos[1]))
+    if isinstance(chess_board, BitBoard):
+        mask = chess_board.reachable(start_pos, adv_pos, max_step)
+        return set(chess_board.cells(mask))
+
+    visited = {start_pos}
+    queue = deque([(start_pos, 0)])
+    while queue:
+        (r, c), cur_step = queue.popleft()
+        if cur_step == max_step:
+            continue
+        for dir, (m_r, m_c) in enumerate(MOVES):
+            if chess_board[r, c, dir]:
+                continue
+            next_pos = (r + m_r, c + m_c)
+            if next_pos == adv_pos or next_pos in visited:
+                continue
+            visited.add(next_pos)
+            queue.append((next_pos, cur_step + 1))
+    return visited
+
+
+class RegionTracker:
+    """
+    Closed zones of a chess board, kept up to date one wall at a time.
+
+    Every cell carries the label of its zone and the size of every zone is kept,
+    so asking whether two cells are separated and how big their zones are is O(1).
+    When a wall is added, only the zone it cuts is searched: two BFS are run in
+    lockstep from both sides of the wall and stop as soon as they meet. If one of
+    them runs out of cells first, those cells form a new zone.
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (board_size, board_size, 4) or BitBoard
+        The board to track. Walls must be added through add_wall after they are set.
+    """
+
+    def __init__(self, chess_board):
+        self.chess_board = chess_board
+        self.board_size = len(chess_board)
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Label every zone of the board from scratch.
+        """
+        labels, sizes = label_regions(self.chess_board)
+        self.labels = labels.ravel().tolist()
+        self.sizes = {label: int(sizes[label]) for label in set(self.labels)}
+        # Labels from label_regions are cell indices, new zones get fresh ones
+        self.next_label = self.board_size * self.board_size
+
+    def _neighbours(self, index):
+        r, c = divmod(index, self.board_size)
+        for dir, (m_r, m_c) in enumerate(MOVES):
+            if not self.chess_board[r, c, dir]:
+                yield (r + m_r) * self.board_size + c + m_c
+
+    def add_wall(self, r, c, dir):
+        """
+        Update the zones after a barrier has been set at cell (r, c) in direction dir.
+        """
+        r, c = int(r), int(c)
+        m_r, m_c = MOVES[dir]
+        a = r * self.board_size + c
+        b = (r + m_r) * self.board_size + c + m_c
+        if self.labels[a] != self.labels[b]:
+            return
+
+        visited = ({a}, {b})
+        queues = (deque([a]), deque([b]))
+        side = 0
+        while True:
+            queue, seen, other = queues[side], visited[side], visited[1 - side]
+            if not queue:
+                break
+            index = queue.popleft()
+            for neighbour in self._neighbours(index):
+                if neighbour in other:
+                    # Both sides are still connected
+                    return
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+            side = 1 - side
+
+        # The side whose search ran dry has been cut off into a new zone
+        cut = visited[side]
+        old_label = self.labels[a]
+        label = self.next_label
+        self.next_label += 1
+        for index in cut:
+            self.labels[index] = label
+        self.sizes[label] = len(cut)
+        self.sizes[old_label] -= len(cut)
+
+    def label(self, pos):
+        r, c = pos
+        return self.labels[int(r) * self.board_size + int(c)]
+
+    def region_size(self, pos):
+        """
+        Number of blocks in the zone containing pos.
+        """
+        return self.sizes[self.label(pos)]
+
+    def scores(self, p0_pos, p1_pos):
+        """
+        Check whether the players are separated and get the size of their zones.
+
+        Returns
+        -------
+        is_separated : bool
+            Whether the players are in different zones.
+        p0_score : int
+            Size of the zone of the first player.
+        p1_score : int
+            Size of the zone of the second player.
+        """
+        p0_label = self.label(p0_pos)
+        p1_label = self.label(p1_pos)
+        return p0_label != p1_label, self.sizes[p0_label], self.sizes[p1_label]
+
+
+class BridgeAnalysis:
+    """
+    The walls that would split the zone of a cell, found with one iterative pass
+    of Tarjan's bridge finding algorithm.
+
+    The open edges between cells form a graph. A bridge of that graph is an edge
+    whose removal disconnects it, so putting a barrier on a bridge of the zone of
+    root is exactly what cuts a part of the zone off from root. For every such
+    barrier, the cells cut off are a contiguous range of the depth first search
+    order, so checking which side of it any cell ends up on is O(1).
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (board_size, board_size, 4) or BitBoard
+        The chess board.
+    root : tuple of int
+        A cell of the zone to analyse, usually the position of the adversary.
+
+    Attributes
+    ----------
+    is_bridge : numpy.ndarray of shape (board_size, board_size, 4)
+        Whether a barrier at (r, c, dir) splits the zone of root, on both faces.
+    cut_size : numpy.ndarray of shape (board_size, board_size, 4)
+        The number of cells such a barrier cuts off from root, 0 for the others.
+    zone_size : int
+        The number of cells of the zone of root.
+    """
+
+    def __init__(self, chess_board, root):
+        if isinstance(chess_board, BitBoard):
+            chess_board = chess_board.to_array()
+        chess_board = np.asarray(chess_board, dtype=bool)
+        n = len(chess_board)
+        self.board_size = n
+        steps = [m_r * n + m_c for m_r, m_c in MOVES]
+        is_open = (~chess_board).reshape(n * n, 4).tolist()
+
+        root = int(root[0]) * n + int(root[1])
+        # Depth first search order, lowest order reachable through a back edge,
+        # subtree size and the direction to each cell from its parent
+        order = [-1] * (n * n)
+        low = [0] * (n * n)
+        size = [1] * (n * n)
+        parent = [-1] * (n * n)
+        parent_dir = [-1] * (n * n)
+        order[root] = 0
+        counter = 1
+        self.is_bridge = np.zeros((n, n, 4), dtype=bool)
+        self.cut_start = np.full((n, n, 4), -1, dtype=int)
+        self.cut_size = np.zeros((n, n, 4), dtype=int)
+
+        # Every frame is a cell and the next direction to look at from it
+        stack = [[root, 0]]
+        while stack:
+            frame = stack[-1]
+            u, dir = frame
+            if dir < 4:
+                frame[1] += 1
+                if not is_open[u][dir]:
+                    continue
+                v = u + steps[dir]
+                if order[v] < 0:
+                    order[v] = low[v] = counter
+                    counter += 1
+                    parent[v] = u
+                    parent_dir[v] = dir
+                    stack.append([v, 0])
+                elif v != parent[u]:
+                    low[u] = min(low[u], order[v])
+                continue
+
+            stack.pop()
+            p = parent[u]
+            if p < 0:
+                continue
+            low[p] = min(low[p], low[u])
+            size[p] += size[u]
+            if low[u] > order[p]:
+                # No back edge from the subtree of u climbs over the edge (p, u)
+                dir = parent_dir[u]
+                p_r, p_c = divmod(p, n)
+                u_r, u_c = divmod(u, n)
+                for r, c, d in ((p_r, p_c, dir), (u_r, u_c, (dir + 2) % 4)):
+                    self.is_bridge[r, c, d] = True
+                    self.cut_start[r, c, d] = order[u]
+                    self.cut_size[r, c, d] = size[u]
+
+        self.order = np.array(order).reshape(n, n)
+        self.zone_size = counter
+
+    def separates(self, pos, r, c, dir):
+        """
+        Check whether a barrier at (r, c, dir) would separate pos from root.
+        Vectorized over r, c and dir.
+        """
+        index = self.order[pos[0], pos[1]]
+        start = self.cut_start[r, c, dir]
+        return (
+            self.is_bridge[r, c, dir]
+            & (index >= 0)
+            & (start <= index)
+            & (index < start + self.cut_size[r, c, dir])
+        )
+
+    def separating_walls(self, pos):
+        """
+        Find every barrier that would separate pos from root, with the zones both
+        would get.
+
+        Parameters
+        ----------
+        pos : tuple of int
+            A cell of the zone of root, usually the position of the player to move.
+
+        Returns
+        -------
+        separates : numpy.ndarray of shape (board_size, board_size, 4) of bool
+            Whether a barrier at (r, c, dir) separates pos from root.
+        root_score : numpy.ndarray of shape (board_size, board_size, 4)
+            The size of the zone of root after such a barrier, 0 for the others.
+        pos_score : numpy.ndarray of shape (board_size, board_size, 4)
+            The size of the zone of pos after such a barrier, 0 for the others.
+        """
+        separates = self.separates(pos, slice(None), slice(None), slice(None))
+        pos_score = np.where(separates, self.cut_size, 0)
+        root_score = np.where(separates, self.zone_size - self.cut_size, 0)
+        return separates, root_score, pos_score
+
+
+class DistanceMap:
+    """
+    Distances in steps from a source cell to every cell of the board, kept up to
+    date one wall at a time.
+
+    Players do not block the way. When a wall is added, only the cells whose every
+    shortest path went through it are searched, in order of distance, and their
+    distances are repaired from the cells around them with a bucketed search. Walls
+    that no shortest path uses cost O(1).
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (board_size, board_size, 4) or BitBoard
+        The chess board, copied.
+    source : tuple of int
+        The cell to measure the distances from.
+
+    Attributes
+    ----------
+    distances : numpy.ndarray of shape (board_size, board_size)
+        The distance of every cell, -1 for the cells the source cannot reach.
+    """
+
+    def __init__(self, chess_board, source):
+        if isinstance(chess_board, BitBoard):
+            chess_board = chess_board.to_array()
+        self.chess_board = np.array(chess_board, dtype=bool)
+        self.board_size = len(chess_board)
+        self.source = (int(source[0]), int(source[1]))
+        self.rebuild()
+
+    def rebuild(self):
+        """
+        Compute every distance from scratch with a BFS.
+        """
+        self.distances = np.full((self.board_size, self.board_size), -1, dtype=int)
+        self.distances[self.source] = 0
+        queue = deque([self.source])
+        while queue:
+            pos = queue.popleft()
+            distance = self.distances[pos] + 1
+            for next_pos in self._neighbours(pos):
+                if self.distances[next_pos] < 0:
+                    self.distances[next_pos] = distance
+                    queue.append(next_pos)
+
+    def _neighbours(self, pos):
+        r, c = pos
+        for dir, (m_r, m_c) in enumerate(MOVES):
+            if not self.chess_board[r, c, dir]:
+                yield r + m_r, c + m_c
+
+    def add_wall(self, r, c, dir):
+        """
+        Set a barrier at cell (r, c) in direction dir and repair the distances.
+        """
+        r, c = int(r), int(c)
+        if self.chess_board[r, c, dir]:
+            return
+        m_r, m_c = MOVES[dir]
+        a, b = (r, c), (r + m_r, c + m_c)
+        self.chess_board[r, c, dir] = True
+        self.chess_board[b[0], b[1], (dir + 2) % 4] = True
+        distances = self.distances
+        if distances[a] == distances[b]:
+            # No shortest path goes through the wall
+            return
+
+        # The cells that lost every shortest path, found level by level from the
+        # far end of the wall
+        far = a if distances[a] > distances[b] else b
+        affected = set()
+        queue = deque([far])
+        queued = {far}
+        while queue:
+            pos = queue.popleft()
+            distance = distances[pos]
+            if any(
+                distances[prev] == distance - 1 and prev not in affected
+                for prev in self._neighbours(pos)
+            ):
+                continue
+            affected.add(pos)
+            for next_pos in self._neighbours(pos):
+                if distances[next_pos] == distance + 1 and next_pos not in queued:
+                    queued.add(next_pos)
+                    queue.append(next_pos)
+
+        # Repair them from the cells around them that kept their distance
+        for pos in affected:
+            distances[pos] = -1
+        heap = []
+        for pos in affected:
+            around = [distances[prev] for prev in self._neighbours(pos) if distances[prev] >= 0]
+            if around:
+                heap.append((min(around) + 1, pos))
+        heapq.heapify(heap)
+        while heap:
+            distance, pos = heapq.heappop(heap)
+            if distances[pos] >= 0:
+                continue
+            distances[pos] = distance
+            for next_pos in self._neighbours(pos):
+                if next_pos in affected and distances[next_pos] < 0:
+                    heapq.heappush(heap, (distance + 1, next_pos))
+
+    def update(self, chess_board):
+        """
+        Bring the map up to date with a board that has the same walls and
+        possibly some more. Any other board is measured from scratch.
+        """
+        if isinstance(chess_board, BitBoard):
+            chess_board = chess_board.to_array()
+        chess_board = np.asarray(chess_board, dtype=bool)
+        if chess_board.shape != self.chess_board.shape or (
+            self.chess_board & ~chess_board
+        ).any():
+            self.__init__(chess_board, self.source)
+            return
+        # Every inner wall has a down or a right face
+        added = chess_board & ~self.chess_board
+        for dir in (DIRECTION_RIGHT, DIRECTION_DOWN):
+            for r, c in zip(*np.nonzero(added[:, :, dir])):
+                self.add_wall(r, c, dir)
+
+    def path(self, target):
+        """
+        Get a shortest path from the source to target, in O(path length).
+
+        Returns
+        -------
+        path : list of tuple of int
+            The cells of the path, source and target included, or None if the
+            source cannot reach target.
+        """
+        pos = (int(target[0]), int(target[1]))
+        if self.distances[pos] < 0:
+            return None
+        path = [pos]
+        while pos != self.source:
+            distance = self.distances[pos]
+            pos = next(
+                prev
+                for prev in self._neighbours(pos)
+                if self.distances[prev] == distance - 1
+            )
+            path.append(pos)
+        path.reverse()
+        return path
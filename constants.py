@@ -18,3 +18,6 @@ PLAYER_1_NAME = "A"
 PLAYER_2_NAME = "B"
 PLAYER_1_COLOR = "tab:blue"
 PLAYER_2_COLOR = "tab:brown"
+BOARD_BACKEND_ARRAY = "array"
+BOARD_BACKEND_BITBOARD = "bitboard"
+BOARD_BACKENDS = (BOARD_BACKEND_ARRAY, BOARD_BACKEND_BITBOARD)
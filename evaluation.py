@@ -0,0 +1,94 @@
+from collections import namedtuple
+import numpy as np
+from bitboard import BitBoard
+from constants import *
+
+# Territory of both players, see voronoi
+Voronoi = namedtuple(
+    "Voronoi",
+    ["p0_distances", "p1_distances", "p0_cells", "p1_cells", "contested", "score"],
+)
+
+
+def voronoi(chess_board, p0_pos, p1_pos):
+    """
+    Split the board between the players by who can reach each cell first.
+
+    Both BFS run together as boolean frontiers that advance one step at a time
+    through the open sides of every frontier cell at once. A player cannot walk
+    through the other player, as in the game.
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (..., board_size, board_size, 4) or BitBoard
+        The board, or a batch of boards with any number of leading dimensions.
+    p0_pos : array_like of shape (..., 2)
+        The position of the first player on every board.
+    p1_pos : array_like of shape (..., 2)
+        The position of the second player on every board.
+
+    Returns
+    -------
+    voronoi : Voronoi
+        p0_distances, p1_distances : numpy.ndarray of shape (..., board_size, board_size)
+            The number of steps each player needs to reach every cell, -1 if it cannot.
+        p0_cells, p1_cells : numpy.ndarray of shape (..., board_size, board_size) of bool
+            The cells each player reaches strictly first.
+        contested : numpy.ndarray of shape (..., board_size, board_size) of bool
+            The cells both players reach in the same number of steps.
+        score : numpy.ndarray of shape (...) of int
+            The number of cells of the first player minus those of the second.
+    """
+    if isinstance(chess_board, BitBoard):
+        chess_board = chess_board.to_array()
+    chess_board = np.asarray(chess_board, dtype=bool)
+    batch_shape = chess_board.shape[:-3]
+    board_size = chess_board.shape[-2]
+    boards = chess_board.reshape((-1, board_size, board_size, 4))
+    games = np.arange(len(boards))
+    p0_pos = np.asarray(p0_pos, dtype=int).reshape(-1, 2)
+    p1_pos = np.asarray(p1_pos, dtype=int).reshape(-1, 2)
+
+    # Open sides, as seen from the cell a step comes from
+    open_up = ~boards[:, 1:, :, DIRECTION_UP]
+    open_down = ~boards[:, :-1, :, DIRECTION_DOWN]
+    open_left = ~boards[:, :, 1:, DIRECTION_LEFT]
+    open_right = ~boards[:, :, :-1, DIRECTION_RIGHT]
+
+    distances = []
+    for pos, adv_pos in ((p0_pos, p1_pos), (p1_pos, p0_pos)):
+        distance = np.full(boards.shape[:-1], -1, dtype=int)
+        frontier = np.zeros(boards.shape[:-1], dtype=bool)
+        frontier[games, pos[:, 0], pos[:, 1]] = True
+        # Cells that cannot be stepped on again: the ones reached and the adversary
+        blocked = frontier.copy()
+        blocked[games, adv_pos[:, 0], adv_pos[:, 1]] = True
+        step = 0
+        while frontier.any():
+            distance[frontier] = step
+            reached = np.zeros_like(frontier)
+            reached[:, :-1, :] |= frontier[:, 1:, :] & open_up
+            reached[:, 1:, :] |= frontier[:, :-1, :] & open_down
+            reached[:, :, :-1] |= frontier[:, :, 1:] & open_left
+            reached[:, :, 1:] |= frontier[:, :, :-1] & open_right
+            frontier = reached & ~blocked
+            blocked |= frontier
+            step += 1
+        distances.append(distance)
+
+    p0_distances, p1_distances = distances
+    p0_reached, p1_reached = p0_distances >= 0, p1_distances >= 0
+    p0_cells = p0_reached & (~p1_reached | (p0_distances < p1_distances))
+    p1_cells = p1_reached & (~p0_reached | (p1_distances < p0_distances))
+    contested = p0_reached & p1_reached & (p0_distances == p1_distances)
+    score = p0_cells.sum(axis=(-2, -1)) - p1_cells.sum(axis=(-2, -1))
+
+    grid_shape = batch_shape + (board_size, board_size)
+    return Voronoi(
+        p0_distances.reshape(grid_shape),
+        p1_distances.reshape(grid_shape),
+        p0_cells.reshape(grid_shape),
+        p1_cells.reshape(grid_shape),
+        contested.reshape(grid_shape),
+        score.reshape(batch_shape),
+    )
@@ -0,0 +1,199 @@
+import cProfile
+import os
+import pstats
+import numpy as np
+from time import perf_counter_ns
+
+# Phases of World.step, in the order they run
+STEP_PHASES = (
+    "agent_board",
+    "agent_step",
+    "check_valid_step",
+    "random_walk",
+    "logging",
+    "set_barrier",
+    "check_endgame",
+    "render",
+)
+
+
+class _ProfileSnapshot:
+    # The collected stats of a cProfile.Profile, in the form pstats.Stats loads
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class StepProfiler:
+    """
+    Timings of the phases of World.step, collected with perf_counter_ns over any
+    number of steps and games, and optionally a cProfile profile of every agent.
+
+    A World given a profiler times its steps with lap:
+
+        lap = profiler.start()
+        ...
+        lap = profiler.lap("agent_step", lap)
+
+    A profiler can be pickled, to send the timings of games played in a worker
+    process back to the parent process, which adds them up with merge.
+
+    Parameters
+    ----------
+    profile_agents : bool
+        Whether to also run cProfile during the step of every agent. The agents
+        are profiled by registered name, so an agent playing both sides has a single
+        profile. Supervised agents step in their own process, which cProfile does
+        not see.
+    """
+
+    def __init__(self, profile_agents=False):
+        self.times = {phase: [] for phase in STEP_PHASES}
+        self.profile_agents = profile_agents
+        # Running profiles of the agents, and the stats of the ones collected
+        self.agent_profiles = {}
+        self.agent_stats = {}
+
+    @staticmethod
+    def start():
+        """
+        Get the time a phase starts, to pass to lap.
+        """
+        return perf_counter_ns()
+
+    def lap(self, phase, start):
+        """
+        Record the time a phase took since start, and get the time it ended,
+        which is when the next phase starts.
+        """
+        now = perf_counter_ns()
+        self.times[phase].append(now - start)
+        return now
+
+    def start_agent(self, agent_name):
+        """
+        Start the cProfile profile of an agent, if agents are profiled.
+        """
+        if not self.profile_agents:
+            return
+        profile = self.agent_profiles.get(agent_name)
+        if profile is None:
+            profile = self.agent_profiles[agent_name] = cProfile.Profile()
+        profile.enable()
+
+    def stop_agent(self, agent_name):
+        """
+        Stop the cProfile profile of an agent. Stopping a profile that is not
+        running does nothing.
+        """
+        profile = self.agent_profiles.get(agent_name)
+        if profile is not None:
+            profile.disable()
+
+    def get_agent_stats(self):
+        """
+        Collect the profiles of the agents.
+
+        Returns
+        -------
+        agent_stats : dict
+            The pstats.Stats of every profiled agent by name.
+        """
+        for agent_name, profile in self.agent_profiles.items():
+            profile.create_stats()
+            self._add_stats(agent_name, profile.stats)
+        self.agent_profiles = {}
+        return {
+            agent_name: pstats.Stats(_ProfileSnapshot(stats))
+            for agent_name, stats in self.agent_stats.items()
+        }
+
+    def _add_stats(self, agent_name, stats):
+        if agent_name not in self.agent_stats:
+            self.agent_stats[agent_name] = dict(stats)
+            return
+        merged = pstats.Stats(_ProfileSnapshot(self.agent_stats[agent_name]))
+        merged.add(_ProfileSnapshot(stats))
+        self.agent_stats[agent_name] = merged.stats
+
+    def merge(self, other):
+        """
+        Add the timings and agent profiles of another profiler to this one.
+        """
+        for phase, times in other.times.items():
+            self.times[phase].extend(times)
+        for agent_name, stats in other.get_agent_stats().items():
+            self._add_stats(agent_name, stats.stats)
+
+    def __getstate__(self):
+        # Running profiles cannot be pickled, their stats can
+        self.get_agent_stats()
+        return self.__dict__
+
+    def summary(self):
+        """
+        Get the statistics of every phase that ran.
+
+        Returns
+        -------
+        summary : dict
+            For every phase, count, the number of times it ran, total, its total
+            time in seconds, share, the fraction of the time of all phases, and mean,
+            p50, p90 and p99, its mean time and percentiles in microseconds.
+        """
+        grand_total = sum(sum(times) for times in self.times.values())
+        summary = {}
+        for phase, times in self.times.items():
+            if not times:
+                continue
+            times = np.asarray(times, dtype=np.float64) / 1e3
+            p50, p90, p99 = np.percentile(times, (50, 90, 99))
+            summary[phase] = {
+                "count": len(times),
+                "total": times.sum() / 1e6,
+                "share": times.sum() * 1e3 / grand_total if grand_total else 0.0,
+                "mean": times.mean(),
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+            }
+        return summary
+
+    def report(self):
+        """
+        Format the summary of the phases as a table.
+
+        Returns
+        -------
+        report : str
+        """
+        lines = [
+            f"{'phase':<17}{'count':>8}{'total s':>10}{'share':>8}"
+            f"{'mean us':>11}{'p50 us':>11}{'p90 us':>11}{'p99 us':>11}"
+        ]
+        for phase, stats in self.summary().items():
+            lines.append(
+                f"{phase:<17}{stats['count']:>8}{stats['total']:>10.3f}"
+                f"{stats['share']:>8.1%}{stats['mean']:>11.1f}{stats['p50']:>11.1f}"
+                f"{stats['p90']:>11.1f}{stats['p99']:>11.1f}"
+            )
+        return "\n".join(lines)
+
+    def dump_agent_stats(self, path):
+        """
+        Write the cProfile profile of every agent to path/<agent name>.prof, to be
+        read with pstats or a profile viewer.
+
+        Returns
+        -------
+        paths : list of str
+            The files written.
+        """
+        os.makedirs(path, exist_ok=True)
+        paths = []
+        for agent_name, stats in self.get_agent_stats().items():
+            paths.append(os.path.join(path, f"{agent_name}.prof"))
+            stats.dump_stats(paths[-1])
+        return paths
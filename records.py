@@ -0,0 +1,328 @@
+from collections import namedtuple
+import os
+import numpy as np
+from bitboard import BitBoard
+from constants import *
+
+# File layout
+# -----------
+# <path>      : FILE_MAGIC, then one record per game appended back to back
+# <path>.idx  : one little-endian uint64 per game, the offset of its record in <path>
+#
+# A game record is a GAME_HEADER, the initial walls packed as bits (down faces then
+# right faces of every cell, see BitBoard), then n_moves little-endian uint16 moves
+# (r << 8 | c << 2 | dir), where (r, c) is the position the player moved to and dir
+# the barrier it put. Player A makes the even moves and player B the odd ones.
+FILE_MAGIC = b"CSGR\x01\x00\x00\x00"
+INDEX_SUFFIX = ".idx"
+GAME_HEADER = np.dtype(
+    [
+        ("board_size", "u1"),
+        ("max_step", "u1"),
+        ("p0_pos", "u1", (2,)),
+        ("p1_pos", "u1", (2,)),
+        ("n_moves", "<u2"),
+        ("p0_score", "<u2"),
+        ("p1_score", "<u2"),
+    ]
+)
+MOVE_DTYPE = np.dtype("<u2")
+MAX_RECORD_BOARD_SIZE = 64
+
+GameRecord = namedtuple(
+    "GameRecord",
+    [
+        "board_size",
+        "max_step",
+        "chess_board",
+        "p0_pos",
+        "p1_pos",
+        "moves",
+        "p0_score",
+        "p1_score",
+    ],
+)
+GameRecord.__doc__ = """
+A decoded game. chess_board is the initial (board_size, board_size, 4) board and
+moves an (n_moves, 3) array of (r, c, dir).
+"""
+
+
+def walls_size(board_size):
+    """
+    Number of bytes of the packed initial walls of a board.
+    """
+    return (2 * board_size * board_size + 7) // 8
+
+
+def encode_moves(moves):
+    """
+    Pack an (n_moves, 3) array of (r, c, dir) into uint16 moves.
+    """
+    moves = np.asarray(moves, dtype=np.uint16).reshape(-1, 3)
+    return (moves[:, 0] << 8) | (moves[:, 1] << 2) | moves[:, 2]
+
+
+def decode_moves(packed):
+    """
+    Unpack uint16 moves into an (n_moves, 3) array of (r, c, dir).
+    """
+    packed = np.asarray(packed, dtype=np.uint16)
+    return np.stack([packed >> 8, (packed >> 2) & 0x3F, packed & 0x3], axis=-1)
+
+
+def encode_game(chess_board, p0_pos, p1_pos, max_step, moves, p0_score, p1_score):
+    """
+    Encode a game into the bytes of its record.
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (board_size, board_size, 4) or BitBoard
+        The initial chess board.
+    p0_pos : tuple of int
+        The initial position of player A.
+    p1_pos : tuple of int
+        The initial position of player B.
+    max_step : int
+        The maximum number of steps.
+    moves : list of tuple of int
+        The (r, c, dir) of every move.
+    p0_score : int
+        The final score of player A.
+    p1_score : int
+        The final score of player B.
+
+    Returns
+    -------
+    data : bytes
+    """
+    if isinstance(chess_board, BitBoard):
+        chess_board = chess_board.to_array()
+    board_size = chess_board.shape[0]
+    if board_size > MAX_RECORD_BOARD_SIZE:
+        raise ValueError(
+            f"Boards larger than {MAX_RECORD_BOARD_SIZE} cannot be recorded, got {board_size}"
+        )
+    header = np.zeros((), dtype=GAME_HEADER)
+    header["board_size"] = board_size
+    header["max_step"] = max_step
+    header["p0_pos"] = p0_pos
+    header["p1_pos"] = p1_pos
+    header["n_moves"] = len(moves)
+    header["p0_score"] = p0_score
+    header["p1_score"] = p1_score
+    walls = np.concatenate(
+        [
+            np.ravel(chess_board[:, :, DIRECTION_DOWN]),
+            np.ravel(chess_board[:, :, DIRECTION_RIGHT]),
+        ]
+    )
+    return (
+        header.tobytes()
+        + np.packbits(walls, bitorder="little").tobytes()
+        + encode_moves(moves).astype(MOVE_DTYPE).tobytes()
+    )
+
+
+def record_size(header):
+    """
+    Number of bytes of a game record given its header.
+    """
+    return (
+        GAME_HEADER.itemsize
+        + walls_size(int(header["board_size"]))
+        + int(header["n_moves"]) * MOVE_DTYPE.itemsize
+    )
+
+
+def decode_game(buffer, offset=0):
+    """
+    Decode the game record starting at offset in buffer.
+
+    Parameters
+    ----------
+    buffer : bytes or numpy.ndarray of uint8
+    offset : int
+
+    Returns
+    -------
+    record : GameRecord
+    """
+    header = np.frombuffer(buffer, dtype=GAME_HEADER, count=1, offset=offset)[0]
+    board_size = int(header["board_size"])
+    offset += GAME_HEADER.itemsize
+    n_walls = walls_size(board_size)
+    walls = np.unpackbits(
+        np.frombuffer(buffer, dtype=np.uint8, count=n_walls, offset=offset),
+        count=2 * board_size * board_size,
+        bitorder="little",
+    ).astype(bool)
+    offset += n_walls
+    down, right = walls.reshape(2, board_size, board_size)
+    chess_board = BitBoard(
+        board_size, BitBoard._pack(down), BitBoard._pack(right)
+    ).to_array()
+    moves = decode_moves(
+        np.frombuffer(
+            buffer, dtype=MOVE_DTYPE, count=int(header["n_moves"]), offset=offset
+        )
+    )
+    return GameRecord(
+        board_size,
+        int(header["max_step"]),
+        chess_board,
+        tuple(int(x) for x in header["p0_pos"]),
+        tuple(int(x) for x in header["p1_pos"]),
+        moves.astype(int),
+        int(header["p0_score"]),
+        int(header["p1_score"]),
+    )
+
+
+class GameRecorder:
+    """
+    Collect the moves of the games of a World and encode each game once it ends.
+
+    Parameters
+    ----------
+    on_record : callable
+        Called with the bytes of every finished game. If None, they are kept in self.records.
+    """
+
+    def __init__(self, on_record=None):
+        self.on_record = on_record
+        self.records = []
+        self.game = None
+
+    def begin_game(self, chess_board, p0_pos, p1_pos, max_step):
+        """
+        Start recording a game from its initial state, dropping any unfinished game.
+        """
+        if isinstance(chess_board, BitBoard):
+            chess_board = chess_board.to_array()
+        else:
+            chess_board = np.array(chess_board, dtype=bool)
+        self.game = (chess_board, tuple(p0_pos), tuple(p1_pos), max_step, [])
+
+    def record_move(self, r, c, dir):
+        self.game[4].append((int(r), int(c), int(dir)))
+
+    def end_game(self, p0_score, p1_score):
+        """
+        Encode the current game with its final scores.
+        """
+        data = encode_game(*self.game, p0_score, p1_score)
+        self.game = None
+        if self.on_record is None:
+            self.records.append(data)
+        else:
+            self.on_record(data)
+
+
+class GameRecordWriter:
+    """
+    Append-only writer of a game record file and its offset index.
+
+    Parameters
+    ----------
+    path : str
+        The record file. It is created if it does not exist, otherwise games are appended.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Checked before opening for append, so nothing is left open on an error
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                    raise ValueError(f"{path} is not a game record file")
+        self.data_file = open(path, "ab")
+        if self.data_file.tell() == 0:
+            self.data_file.write(FILE_MAGIC)
+        self.index_file = open(path + INDEX_SUFFIX, "ab")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def recorder(self):
+        """
+        Get a GameRecorder appending its games to this file.
+        """
+        return GameRecorder(on_record=self.append)
+
+    def append(self, data):
+        """
+        Append the bytes of an encoded game.
+        """
+        offset = self.data_file.tell()
+        self.data_file.write(data)
+        self.data_file.flush()
+        self.index_file.write(np.array([offset], dtype="<u8").tobytes())
+        self.index_file.flush()
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+
+class GameRecordReader:
+    """
+    Memory-mapped random access to the games of a record file.
+    Games are only decoded when accessed, so files with millions of games can be read.
+
+    Parameters
+    ----------
+    path : str
+        The record file. If its index is missing, it is rebuilt by scanning the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        if self.data[: len(FILE_MAGIC)].tobytes() != FILE_MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+        index_path = path + INDEX_SUFFIX
+        if os.path.exists(index_path) and os.path.getsize(index_path) > 0:
+            self.offsets = np.memmap(index_path, dtype="<u8", mode="r")
+        else:
+            self.offsets = self.build_index()
+
+    def build_index(self):
+        """
+        Find the offset of every game by walking through the record headers.
+        """
+        offsets = []
+        offset = len(FILE_MAGIC)
+        while offset + GAME_HEADER.itemsize <= len(self.data):
+            header = np.frombuffer(self.data, GAME_HEADER, count=1, offset=offset)[0]
+            size = record_size(header)
+            if offset + size > len(self.data):
+                break
+            offsets.append(offset)
+            offset += size
+        return np.array(offsets, dtype="<u8")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def header(self, i):
+        """
+        Get the header of game i without decoding its board and moves.
+        """
+        return np.frombuffer(
+            self.data, GAME_HEADER, count=1, offset=int(self.offsets[i])
+        )[0]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Game {i} is out of range")
+        return decode_game(self.data, int(self.offsets[i]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
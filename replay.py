@@ -0,0 +1,153 @@
+import numpy as np
+from bitboard import BitBoard
+from constants import *
+from records import GameRecordReader
+from utils import all_logging_disabled
+from world import World
+
+# Moves (Up, Right, Down, Left)
+MOVES = np.array(((-1, 0), (0, 1), (1, 0), (0, -1)))
+OPPOSITES = np.array((2, 3, 0, 1))
+
+
+def apply_walls(chess_board, moves):
+    """
+    Set the barriers of many moves at once on a (board_size, board_size, 4) chess board.
+
+    Parameters
+    ----------
+    chess_board : numpy.ndarray of shape (board_size, board_size, 4)
+        The chess board, modified in place.
+    moves : numpy.ndarray of shape (n_moves, 3)
+        The (r, c, dir) of every move.
+    """
+    moves = np.asarray(moves, dtype=int).reshape(-1, 3)
+    r, c, dir = moves.T
+    chess_board[r, c, dir] = True
+    chess_board[r + MOVES[dir, 0], c + MOVES[dir, 1], OPPOSITES[dir]] = True
+
+
+def replay(record, move_index=None, board_backend=BOARD_BACKEND_ARRAY):
+    """
+    Rebuild the World of a recorded game after its first move_index moves, without
+    running any agent. The barriers are applied in bulk, so the zones are computed
+    once, by the endgame check of the new World, instead of after every move.
+
+    Parameters
+    ----------
+    record : records.GameRecord
+        The recorded game.
+    move_index : int
+        The number of moves to apply. If None, all of them.
+    board_backend : str
+        The board backend of the rebuilt world.
+
+    Returns
+    -------
+    world : World
+        The world with the player to move next as its current player.
+    """
+    n_moves = len(record.moves)
+    if move_index is None:
+        move_index = n_moves
+    if not 0 <= move_index <= n_moves:
+        raise ValueError(f"Move index {move_index} is out of range [0, {n_moves}]")
+    moves = record.moves[:move_index]
+
+    chess_board = record.chess_board.copy()
+    apply_walls(chess_board, moves)
+    p0_pos, p1_pos = record.p0_pos, record.p1_pos
+    # Player A makes the even moves and player B the odd ones
+    if move_index > 0:
+        p0_pos = tuple(moves[(move_index - 1) // 2 * 2, :2])
+    if move_index > 1:
+        p1_pos = tuple(moves[(move_index - 2) // 2 * 2 + 1, :2])
+
+    with all_logging_disabled():
+        world = World(
+            board_backend=board_backend,
+            initial_state=(chess_board, p0_pos, p1_pos, move_index % 2, move_index),
+        )
+    return world
+
+
+def verify_game(record, strict=False):
+    """
+    Check a recorded game against the rules of the World.
+
+    Parameters
+    ----------
+    record : records.GameRecord
+        The recorded game.
+    strict : bool
+        If True, also replay the game move by move and check that every move is
+        valid and that the game does not end before its last move.
+
+    Returns
+    -------
+    error : str
+        What does not match, or None if the record is consistent.
+    """
+    with all_logging_disabled():
+        if strict:
+            world = replay(record, 0)
+            for i, (r, c, dir) in enumerate(record.moves):
+                _, cur_pos, _ = world.get_current_player()
+                if not world.check_valid_step(cur_pos, np.array([r, c]), dir):
+                    return f"Move {i} to ({r}, {c}) facing {dir} is not valid"
+                if world.turn:
+                    world.p1_pos = np.array([r, c])
+                else:
+                    world.p0_pos = np.array([r, c])
+                world.set_barrier(r, c, dir)
+                world.turn = 1 - world.turn
+                is_end, _, _ = world.check_endgame()
+                if is_end and i < len(record.moves) - 1:
+                    return f"Game ended after move {i} but {len(record.moves)} were recorded"
+        else:
+            world = replay(record)
+        is_end, p0_score, p1_score = world.check_endgame()
+    if not is_end:
+        return "Game has not ended after the last move"
+    if (p0_score, p1_score) != (record.p0_score, record.p1_score):
+        return (
+            f"Scores {p0_score}:{p1_score} do not match the recorded "
+            f"{record.p0_score}:{record.p1_score}"
+        )
+    return None
+
+
+def verify_file(path, strict=False):
+    """
+    Verify every game of a game record file.
+
+    Returns
+    -------
+    errors : dict
+        The error of every inconsistent game, by game index.
+    """
+    errors = {}
+    for i, record in enumerate(GameRecordReader(path)):
+        error = verify_game(record, strict=strict)
+        if error is not None:
+            errors[i] = error
+    return errors
+
+
+if __name__ == "__main__":
+    import argparse
+    from time import time
+
+    parser = argparse.ArgumentParser(description="Verify a game record file")
+    parser.add_argument("record_path", type=str)
+    parser.add_argument("--strict", action="store_true", default=False)
+    args = parser.parse_args()
+
+    start_time = time()
+    errors = verify_file(args.record_path, strict=args.strict)
+    n_games = len(GameRecordReader(args.record_path))
+    for i, error in errors.items():
+        print(f"Game {i}: {error}")
+    print(
+        f"{n_games - len(errors)}/{n_games} games verified in {time() - start_time:.2f} seconds"
+    )
@@ -0,0 +1,197 @@
+import math
+from abc import ABC, abstractmethod
+from statistics import NormalDist
+
+# How tied games count towards the score of a player
+TIES_HALF = "half"
+TIES_EXCLUDE = "exclude"
+TIES = (TIES_HALF, TIES_EXCLUDE)
+
+
+def wilson_interval(score, games, confidence=0.95):
+    """
+    Get the Wilson score interval of a win rate.
+
+    Parameters
+    ----------
+    score : float
+        The number of games won, ties counting as half a win.
+    games : int
+        The number of games played.
+    confidence : float
+        The probability the interval holds the true win rate.
+
+    Returns
+    -------
+    low : float
+    high : float
+        The bounds of the interval, (0, 1) when no game was played.
+    """
+    if games == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = score / games
+    center = rate + z * z / (2 * games)
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games))
+    scale = 1 + z * z / games
+    return max(0.0, (center - margin) / scale), min(1.0, (center + margin) / scale)
+
+
+class SequentialTest(ABC):
+    """
+    A test of the win rate of a player that is updated after every game and tells
+    when enough games were played to decide whether the win rate is above or
+    below some level. The results must be given in the order the games were
+    scheduled, not in the order they finished, or the decision depends on the
+    speed of the games.
+
+    Parameters
+    ----------
+    ties : str
+        One of TIES. "half" counts a tie as half a win, "exclude" leaves ties out
+        of the test.
+    confidence : float
+        The confidence of the reported interval.
+    """
+
+    def __init__(self, ties=TIES_HALF, confidence=0.95):
+        if ties not in TIES:
+            raise ValueError(f"Unknown tie rule '{ties}'. Choose one of {TIES}.")
+        self.ties_rule = ties
+        self.confidence = confidence
+        self.score = 0.0
+        self.games = 0
+        self.ties = 0
+        # True once the win rate is decided to be high, False once low
+        self.decision = None
+
+    def update(self, score):
+        """
+        Add the result of the next game.
+
+        Parameters
+        ----------
+        score : float
+            1 if the player won, 0 if it lost and 0.5 on a tie.
+
+        Returns
+        -------
+        decision : bool or None
+            True if the win rate is decided to be high, False if it is decided to
+            be low, None while undecided. Once made, the decision does not change.
+        """
+        if score == 0.5:
+            self.ties += 1
+            if self.ties_rule == TIES_EXCLUDE:
+                return self.decision
+        self.score += score
+        self.games += 1
+        if self.decision is None:
+            self.decision = self.decide()
+        return self.decision
+
+    @abstractmethod
+    def decide(self):
+        """
+        Get the decision after the games so far: True if the win rate is high,
+        False if it is low, None while undecided.
+        """
+
+    def interval(self):
+        """
+        Get the confidence interval of the win rate, see wilson_interval.
+        """
+        return wilson_interval(self.score, self.games, self.confidence)
+
+    @abstractmethod
+    def describe(self):
+        """
+        Get a one line summary of the decision, for the logs.
+        """
+
+
+class SPRT(SequentialTest):
+    """
+    Wald's sequential probability ratio test of the win rate being p1 against it
+    being p0, with p0 < p1. The log-likelihood ratio of the results is updated
+    after every game, and the test stops once it leaves the bounds set by the
+    error rates. A tie counted as half a win adds half the log-likelihood ratio
+    of a win and half that of a loss.
+
+    Parameters
+    ----------
+    p0 : float
+        The win rate of the low hypothesis.
+    p1 : float
+        The win rate of the high hypothesis.
+    alpha : float
+        The probability of deciding high when the win rate is p0.
+    beta : float
+        The probability of deciding low when the win rate is p1.
+    """
+
+    def __init__(self, p0=0.45, p1=0.55, alpha=0.05, beta=0.05, **kwargs):
+        super(SPRT, self).__init__(**kwargs)
+        if not 0 < p0 < p1 < 1:
+            raise ValueError(f"SPRT needs 0 < p0 < p1 < 1, got p0={p0} and p1={p1}")
+        if not (0 < alpha < 1 and 0 < beta < 1):
+            raise ValueError(f"SPRT error rates must be in (0, 1), got {alpha}, {beta}")
+        self.p0 = p0
+        self.p1 = p1
+        self.win_llr = math.log(p1 / p0)
+        self.loss_llr = math.log((1 - p1) / (1 - p0))
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.llr = 0.0
+
+    def decide(self):
+        self.llr = self.score * self.win_llr + (self.games - self.score) * self.loss_llr
+        if self.llr >= self.upper:
+            return True
+        if self.llr <= self.lower:
+            return False
+        return None
+
+    def describe(self):
+        bounds = f"LLR {self.llr:.3f} in [{self.lower:.3f}, {self.upper:.3f}]"
+        if self.decision is None:
+            return f"SPRT undecided, {bounds}"
+        rate = self.p1 if self.decision else self.p0
+        return f"SPRT accepted win rate {rate}, {bounds}"
+
+
+class ConfidenceStop(SequentialTest):
+    """
+    Stop once the confidence interval of the win rate is entirely above or below
+    a threshold. Looking at the interval after every game makes an early wrong
+    decision more likely than its confidence says, which min_games and a higher
+    confidence keep in check.
+
+    Parameters
+    ----------
+    threshold : float
+        The win rate to decide above or below.
+    min_games : int
+        The number of games to play before deciding.
+    """
+
+    def __init__(self, threshold=0.5, min_games=30, **kwargs):
+        super(ConfidenceStop, self).__init__(**kwargs)
+        self.threshold = threshold
+        self.min_games = min_games
+
+    def decide(self):
+        if self.games < self.min_games:
+            return None
+        low, high = self.interval()
+        if low > self.threshold:
+            return True
+        if high < self.threshold:
+            return False
+        return None
+
+    def describe(self):
+        if self.decision is None:
+            return f"Win rate undecided against {self.threshold}"
+        side = "above" if self.decision else "below"
+        return f"Win rate {side} {self.threshold} at {self.confidence} confidence"
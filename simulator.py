@@ -1,16 +1,28 @@
 from world import World, PLAYER_1_NAME, PLAYER_2_NAME
+from constants import BOARD_BACKEND_ARRAY, BOARD_BACKENDS
 import argparse
 from utils import all_logging_disabled
+from records import GameRecorder, GameRecordWriter
+from profiling import StepProfiler
+from sequential import SPRT, TIES, TIES_HALF, ConfidenceStop
 import logging
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import numpy as np
+import os
+import random
 
 logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+# Sequential tests of the autoplay win rate, see --sequential
+SEQUENTIAL_SPRT = "sprt"
+SEQUENTIAL_CI = "ci"
 
-def get_args():
+
+def get_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("--player_1", type=str, default="random_agent")
     parser.add_argument("--player_2", type=str, default="random_agent")
@@ -33,10 +45,140 @@ def get_args():
     parser.add_argument("--display_save_path", type=str, default="plots/")
     parser.add_argument("--autoplay", action="store_true", default=False)
     parser.add_argument("--autoplay_runs", type=int, default=1000)
-    args = parser.parse_args()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="In autoplay mode, the number of processes playing games in parallel",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="In autoplay mode, the master seed every game seed is derived from",
+    )
+    parser.add_argument(
+        "--search_workers",
+        type=int,
+        default=None,
+        help="The number of processes of the agents searching in parallel. Defaults to the cores shared between the --workers games",
+    )
+    parser.add_argument(
+        "--readonly_board",
+        action="store_true",
+        default=False,
+        help="Give agents a read-only view of the board instead of a copy",
+    )
+    parser.add_argument(
+        "--agent_move_time",
+        type=float,
+        default=None,
+        help="Run agents in supervised processes and replace steps taking longer than this many seconds by a random walk",
+    )
+    parser.add_argument(
+        "--agent_game_time",
+        type=float,
+        default=None,
+        help="Run agents in supervised processes and replace their steps by random walks once they used this many seconds in a game",
+    )
+    parser.add_argument(
+        "--record_path",
+        type=str,
+        default=None,
+        help="Append every game played to this game record file",
+    )
+    parser.add_argument(
+        "--board_backend",
+        type=str,
+        default=BOARD_BACKEND_ARRAY,
+        choices=BOARD_BACKENDS,
+        help="How the world stores the walls of the board",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="Time every phase of the game steps and report their totals, means and percentiles",
+    )
+    parser.add_argument(
+        "--profile_path",
+        type=str,
+        default=None,
+        help="With --profile, also profile every agent with cProfile and write <agent>.prof files to this directory",
+    )
+    parser.add_argument(
+        "--sequential",
+        type=str,
+        default=None,
+        choices=(SEQUENTIAL_SPRT, SEQUENTIAL_CI),
+        help="In autoplay mode, stop before --autoplay_runs games once a sequential test decides the win rate of player 1",
+    )
+    parser.add_argument(
+        "--sprt_p0",
+        type=float,
+        default=0.45,
+        help="With --sequential sprt, the win rate of player 1 under the low hypothesis",
+    )
+    parser.add_argument(
+        "--sprt_p1",
+        type=float,
+        default=0.55,
+        help="With --sequential sprt, the win rate of player 1 under the high hypothesis",
+    )
+    parser.add_argument(
+        "--sprt_alpha",
+        type=float,
+        default=0.05,
+        help="With --sequential sprt, the probability of accepting p1 when the win rate is p0",
+    )
+    parser.add_argument(
+        "--sprt_beta",
+        type=float,
+        default=0.05,
+        help="With --sequential sprt, the probability of accepting p0 when the win rate is p1",
+    )
+    parser.add_argument(
+        "--ci_threshold",
+        type=float,
+        default=0.5,
+        help="With --sequential ci, stop once the confidence interval of the win rate of player 1 excludes this rate",
+    )
+    parser.add_argument(
+        "--ci_min_games",
+        type=int,
+        default=30,
+        help="With --sequential ci, the number of games to play before stopping",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="The confidence of the reported win rate interval, and of --sequential ci",
+    )
+    parser.add_argument(
+        "--ties",
+        type=str,
+        default=TIES_HALF,
+        choices=TIES,
+        help="With --sequential, count ties as half a win or leave them out of the test",
+    )
+    args = parser.parse_args(argv)
     return args
 
 
+def get_search_workers(args):
+    """
+    Get the number of processes the agents searching in parallel may use in a game:
+    --search_workers, or an even share of the cores between the --workers games
+    played at once. None leaves the agents their own default.
+    """
+    if args.search_workers is not None:
+        return args.search_workers
+    if args.workers > 1:
+        return max(1, (os.cpu_count() or 1) // args.workers)
+    return None
+
+
 class Simulator:
     """
     Entry point of the game simulator.
@@ -44,10 +186,16 @@ class Simulator:
     Parameters
     ----------
     args : argparse.Namespace
+    recorder : records.GameRecorder
+        If not None, records every game played
     """
 
-    def __init__(self, args):
+    def __init__(self, args, recorder=None):
         self.args = args
+        self.recorder = recorder
+        self.profiler = None
+        if args.profile:
+            self.profiler = StepProfiler(profile_agents=args.profile_path is not None)
 
     def reset(self, swap_players=False, board_size=None):
         """
@@ -66,6 +214,8 @@ class Simulator:
             player_1, player_2 = self.args.player_2, self.args.player_1
         else:
             player_1, player_2 = self.args.player_1, self.args.player_2
+        if getattr(self, "world", None) is not None:
+            self.world.close()
         self.world = World(
             player_1=player_1,
             player_2=player_2,
@@ -75,24 +225,81 @@ class Simulator:
             display_save=self.args.display_save,
             display_save_path=self.args.display_save_path,
             autoplay=self.args.autoplay,
+            board_backend=self.args.board_backend,
+            readonly_board=self.args.readonly_board,
+            agent_move_time=self.args.agent_move_time,
+            agent_game_time=self.args.agent_game_time,
+            recorder=self.recorder,
+            profiler=self.profiler,
+            search_workers=get_search_workers(self.args),
         )
         if self.world.initial_end:
             logger.warning("Initialization failed! Reset the world again!")
-            self.reset()
+            self.reset(swap_players=swap_players, board_size=board_size)
 
     def run(self, swap_players=False, board_size=None):
         self.reset(swap_players=swap_players, board_size=board_size)
         is_end, p0_score, p1_score = self.world.step()
         while not is_end:
             is_end, p0_score, p1_score = self.world.step()
+        self.world.close()
         logger.info(
             f"Run finished. Player {PLAYER_1_NAME}: {p0_score}, Player {PLAYER_2_NAME}: {p1_score}"
         )
+        if self.world.p0_timeouts or self.world.p1_timeouts:
+            logger.warning(
+                f"Steps over the time budget. Player {PLAYER_1_NAME}: {self.world.p0_timeouts}, Player {PLAYER_2_NAME}: {self.world.p1_timeouts}"
+            )
         return p0_score, p1_score, self.world.p0_time, self.world.p1_time
 
+    def report_profile(self):
+        """
+        Log the timings of the step phases of the games played with --profile, and
+        write the agent profiles if --profile_path is set.
+        """
+        if self.profiler is None:
+            return
+        logger.info(f"Step phases:\n{self.profiler.report()}")
+        if self.args.profile_path is not None:
+            for path in self.profiler.dump_agent_stats(self.args.profile_path):
+                logger.info(f"Agent profile written to {path}")
+
+    def get_sequential_test(self):
+        """
+        Get the sequential test of the win rate of player 1 chosen with --sequential.
+
+        Returns
+        -------
+        test : sequential.SequentialTest or None
+        """
+        if self.args.sequential == SEQUENTIAL_SPRT:
+            return SPRT(
+                self.args.sprt_p0,
+                self.args.sprt_p1,
+                self.args.sprt_alpha,
+                self.args.sprt_beta,
+                ties=self.args.ties,
+                confidence=self.args.confidence,
+            )
+        if self.args.sequential == SEQUENTIAL_CI:
+            return ConfidenceStop(
+                self.args.ci_threshold,
+                self.args.ci_min_games,
+                ties=self.args.ties,
+                confidence=self.args.confidence,
+            )
+        return None
+
     def autoplay(self):
         """
         Run multiple simulations of the gameplay and aggregate win %
+
+        Every game gets its own seed derived from the master seed (--seed), so the
+        results do not depend on the number of workers (--workers).
+
+        With --sequential, the results are fed to a sequential test in the order
+        the games were scheduled, and autoplay stops as soon as the test decides,
+        so the games played also do not depend on the number of workers.
         """
         p1_win_count = 0
         p2_win_count = 0
@@ -101,42 +308,126 @@ class Simulator:
         if self.args.display:
             logger.warning("Since running autoplay mode, display will be disabled")
         self.args.display = False
+        seed_sequence = np.random.SeedSequence(self.args.seed)
+        logger.info(f"Autoplay master seed: {seed_sequence.entropy}")
+        game_seeds = [
+            int(child.generate_state(1)[0])
+            for child in seed_sequence.spawn(self.args.autoplay_runs)
+        ]
+        game_args = (repeat(self.args), range(self.args.autoplay_runs), game_seeds)
+        test = self.get_sequential_test()
+        n_games = 0
+        executor = None
+        writer = None
         with all_logging_disabled():
-            for i in tqdm(range(self.args.autoplay_runs)):
-                swap_players = i % 2 == 0
-                board_size = np.random.randint(args.board_size_min, args.board_size_max)
-                p0_score, p1_score, p0_time, p1_time = self.run(
-                    swap_players=swap_players, board_size=board_size
-                )
-                if swap_players:
-                    p0_score, p1_score, p0_time, p1_time = (
-                        p1_score,
-                        p0_score,
-                        p1_time,
-                        p0_time,
-                    )
-                if p0_score > p1_score:
-                    p1_win_count += 1
-                elif p0_score < p1_score:
-                    p2_win_count += 1
-                else:  # Tie
-                    p1_win_count += 1
-                    p2_win_count += 1
-                p1_times.append(p0_time)
-                p2_times.append(p1_time)
+            try:
+                if self.args.record_path is not None:
+                    writer = GameRecordWriter(self.args.record_path)
+                if self.args.workers > 1:
+                    executor = ProcessPoolExecutor(max_workers=self.args.workers)
+                    # Small chunks when stopping early, to waste few games
+                    chunksize = 1
+                    if test is None:
+                        chunksize = max(
+                            1, self.args.autoplay_runs // (8 * self.args.workers)
+                        )
+                    games = executor.map(play_game, *game_args, chunksize=chunksize)
+                else:
+                    games = map(play_game, *game_args)
+                # The games come in the order they were scheduled, and each one is
+                # written and counted as it comes, so an interrupted autoplay keeps
+                # the games played so far
+                for scores, records, profiler in tqdm(games, total=self.args.autoplay_runs):
+                    if writer is not None:
+                        for data in records:
+                            writer.append(data)
+                    if profiler is not None:
+                        self.profiler.merge(profiler)
+                    p0_score, p1_score, p0_time, p1_time = scores
+                    n_games += 1
+                    if p0_score > p1_score:
+                        p1_win_count += 1
+                    elif p0_score < p1_score:
+                        p2_win_count += 1
+                    else:  # Tie
+                        p1_win_count += 1
+                        p2_win_count += 1
+                    p1_times.append(p0_time)
+                    p2_times.append(p1_time)
+                    if test is not None:
+                        score = 0.5 if p0_score == p1_score else float(p0_score > p1_score)
+                        if test.update(score) is not None:
+                            break
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
+                if writer is not None:
+                    writer.close()
 
         logger.info(
-            f"Player {PLAYER_1_NAME} win percentage: {p1_win_count / self.args.autoplay_runs} ({np.round(np.mean(p1_times), 5)} seconds/game)"
+            f"Player {PLAYER_1_NAME} win percentage: {p1_win_count / n_games} ({np.round(np.mean(p1_times), 5)} seconds/game)"
         )
         logger.info(
-            f"Player {PLAYER_2_NAME} win percentage: {p2_win_count / self.args.autoplay_runs}, ({np.round(np.mean(p2_times), 5)} seconds/game)"
+            f"Player {PLAYER_2_NAME} win percentage: {p2_win_count / n_games}, ({np.round(np.mean(p2_times), 5)} seconds/game)"
+        )
+        if test is not None:
+            low, high = test.interval()
+            logger.info(
+                f"{test.describe()} after {n_games} of {self.args.autoplay_runs} games. Player {PLAYER_1_NAME} win rate {test.score / max(test.games, 1):.3f}, {test.confidence} interval [{low:.3f}, {high:.3f}] ({test.ties} ties, --ties {test.ties_rule})"
+            )
+        self.report_profile()
+        return test
+
+
+def play_game(args, game_index, seed):
+    """
+    Play one autoplay game with its own seed. Module level so it can run in a worker process.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+    game_index : int
+        Index of the game in the autoplay schedule. Players are swapped on even games.
+    seed : int
+        Seed of the game, which also draws its board size
+
+    Returns
+    -------
+    results : tuple
+        (player_1_score, player_2_score, player_1_time, player_2_time) for the
+        players given as --player_1 and --player_2, whatever their seat in the game
+    records : list of bytes
+        The encoded record of the game if --record_path is set, written by the parent
+        process so the file does not depend on the number of workers
+    profiler : profiling.StepProfiler
+        The step timings of the game if --profile is set, else None
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    swap_players = game_index % 2 == 0
+    board_size = np.random.randint(args.board_size_min, args.board_size_max)
+    recorder = GameRecorder() if args.record_path is not None else None
+    simulator = Simulator(args, recorder)
+    with all_logging_disabled():
+        p0_score, p1_score, p0_time, p1_time = simulator.run(
+            swap_players=swap_players, board_size=board_size
         )
+    records = recorder.records if recorder is not None else []
+    if swap_players:
+        return (p1_score, p0_score, p1_time, p0_time), records, simulator.profiler
+    return (p0_score, p1_score, p0_time, p1_time), records, simulator.profiler
 
 
 if __name__ == "__main__":
     args = get_args()
-    simulator = Simulator(args)
     if args.autoplay:
-        simulator.autoplay()
+        Simulator(args).autoplay()
+    elif args.record_path is not None:
+        with GameRecordWriter(args.record_path) as writer:
+            simulator = Simulator(args, writer.recorder())
+            simulator.run()
+            simulator.report_profile()
     else:
+        simulator = Simulator(args)
         simulator.run()
+        simulator.report_profile()
@@ -0,0 +1,177 @@
+import multiprocessing as mp
+import random
+import traceback
+from time import time
+import numpy as np
+from store import AGENT_REGISTRY
+
+
+def run_agent_worker(agent_class, seed, conn, search_workers=None, move_time=None):
+    """
+    Host an agent in a worker process and answer step requests until told to stop.
+
+    Parameters
+    ----------
+    agent_class : type
+        The class of the agent. It is pickled by reference, so a spawned worker
+        imports the module defining it.
+    seed : int
+        Seed of the random generators of the worker
+    conn : multiprocessing.connection.Connection
+        First sends the (name, autoplay, supports_bitboard) flags of the agent.
+        Then receives the arguments of Agent.step, or None to stop, and sends back
+        (True, (next_pos, dir)) or (False, traceback)
+    search_workers : int
+        See Agent.configure
+    move_time : float
+        See Agent.configure
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    agent = agent_class()
+    agent.configure(search_workers=search_workers, move_time=move_time)
+    conn.send((agent.name, agent.autoplay, agent.supports_bitboard))
+    while True:
+        request = conn.recv()
+        if request is None:
+            break
+        try:
+            conn.send((True, agent.step(*request)))
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+    conn.close()
+
+
+class SupervisedAgent:
+    """
+    Run an agent in a persistent worker process and enforce its time budget.
+
+    A step that does not answer within the time left raises a TimeoutError, and a
+    step that raises an exception or kills the worker raises a RuntimeError. Either
+    way the worker is replaced by a new one with a fresh agent, which answers the
+    next steps but has lost any state kept across turns. Once the game budget is
+    used up, every step raises a TimeoutError without asking the agent.
+
+    The agent is only ever created in the worker, which sends back its flags.
+
+    Parameters
+    ----------
+    agent_name : str
+        The registered name of the agent
+    move_time : float
+        Time budget in seconds of a single step. If None, steps are not limited.
+    game_time : float
+        Time budget in seconds of all the steps of a game. If None, the game is not limited.
+    search_workers : int
+        See Agent.configure
+    """
+
+    def __init__(self, agent_name, move_time=None, game_time=None, search_workers=None):
+        self.agent_name = agent_name
+        self.move_time = move_time
+        self.game_time = game_time
+        self.search_workers = search_workers
+        # Time spent in step and number of steps cut off by the deadline
+        self.time_used = 0
+        self.violations = 0
+        self.process = None
+        self.start()
+
+    def __str__(self) -> str:
+        return self.name
+
+    def start(self):
+        """
+        Start the worker process hosting the agent.
+        """
+        self.conn, child_conn = mp.Pipe()
+        self.process = mp.Process(
+            target=run_agent_worker,
+            args=(
+                AGENT_REGISTRY[self.agent_name],
+                np.random.randint(0, 2**31 - 1),
+                child_conn,
+                self.search_workers,
+                self.move_time,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        try:
+            self.name, self.autoplay, self.supports_bitboard = self.conn.recv()
+        except EOFError:
+            self.process.join()
+            self.conn.close()
+            self.process = None
+            raise RuntimeError(f"The worker of {self.agent_name} died creating the agent")
+
+    def close(self):
+        """
+        Stop the worker process.
+        """
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+        self.process = None
+
+    def restart(self):
+        """
+        Kill the worker process and start a new one with a fresh agent.
+        """
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self.start()
+
+    def time_left(self):
+        """
+        Get the time the next step may take, or None if it is not limited.
+        """
+        limits = []
+        if self.move_time is not None:
+            limits.append(self.move_time)
+        if self.game_time is not None:
+            limits.append(self.game_time - self.time_used)
+        return min(limits) if limits else None
+
+    def step(self, chess_board, my_pos, adv_pos, max_step):
+        """
+        Ask the worker for a step, see Agent.step.
+        """
+        time_left = self.time_left()
+        if time_left is not None and time_left <= 0:
+            self.violations += 1
+            raise TimeoutError(f"{self.name} has used up its time budget of the game")
+
+        start_time = time()
+        try:
+            self.conn.send((chess_board, my_pos, adv_pos, max_step))
+            answered = self.conn.poll(time_left)
+            if answered:
+                success, result = self.conn.recv()
+        except (EOFError, OSError):
+            # The worker died during this step or since the last one
+            answered = True
+            success, result = False, "The worker process died"
+        self.time_used += time() - start_time
+        if not answered:
+            self.violations += 1
+            # The worker is still busy on this step, replace it
+            self.restart()
+            raise TimeoutError(
+                f"{self.name} did not answer within {time_left:.3f} seconds"
+            )
+        if not success:
+            # The agent may be left in any state, replace it
+            self.restart()
+            raise RuntimeError(f"{self.name} raised an exception:\n{result}")
+        return result
@@ -1,17 +1,24 @@
 import pytest
 from world import World
+from bitboard import BitBoard
+from constants import BOARD_BACKENDS, BOARD_BACKEND_BITBOARD
 import numpy as np
 
 
-@pytest.fixture
-def world_init():
-    world = World()
+@pytest.fixture(params=BOARD_BACKENDS)
+def world_init(request):
+    world = World(board_backend=request.param)
     world.board_size = 5
-    world.chess_board = np.zeros((world.board_size, world.board_size, 4), dtype=bool)
-    world.chess_board[0, :, 0] = True
-    world.chess_board[:, 0, 3] = True
-    world.chess_board[-1, :, 2] = True
-    world.chess_board[:, -1, 1] = True
+    if request.param == BOARD_BACKEND_BITBOARD:
+        world.chess_board = BitBoard(world.board_size)
+    else:
+        world.chess_board = np.zeros(
+            (world.board_size, world.board_size, 4), dtype=bool
+        )
+        world.chess_board[0, :, 0] = True
+        world.chess_board[:, 0, 3] = True
+        world.chess_board[-1, :, 2] = True
+        world.chess_board[:, -1, 1] = True
     world.max_step = (world.board_size + 1) // 2
     return world
 
@@ -1,6 +1,7 @@
 import pytest
 import os
 import random
+import time
 import numpy as np
 from world import World
 from agents import *
@@ -34,3 +35,384 @@ def test_step(board_size, agent):
     assert dir in [0, 1, 2, 3]
     next_pos = np.asarray(next_pos, dtype=cur_pos.dtype)
     assert world.check_boundary(next_pos)
+
+
+def test_mc_tree():
+    from agents.student_agent import MCTree
+
+    np.random.seed(0)
+    random.seed(0)
+    world = World(board_size=6, display_ui=False)
+    cur_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    # A tiny capacity makes the node arrays grow during the rollouts
+    tree = MCTree(world.chess_board.copy(), cur_pos, adv_pos, world.max_step, capacity=2)
+    for _ in range(50):
+        tree.do_rollout()
+    assert tree.N[0] == 50
+    children = tree.children(0)
+    # The first rollout only expands the root
+    assert tree.N[children.start : children.stop].sum() == 49
+    assert np.all(tree.parent[children.start : children.stop] == 0)
+    next_pos, dir = tree.choose()
+    assert world.check_valid_step(np.array(cur_pos), np.array(next_pos), dir)
+
+
+def test_scratch_board():
+    from agents.student_agent import Node, ScratchBoard
+
+    np.random.seed(1)
+    random.seed(1)
+    world = World(board_size=6, display_ui=False)
+    chess_board = world.chess_board.copy()
+    scratch = ScratchBoard(chess_board)
+    positions = [tuple(world.p0_pos), tuple(world.p1_pos)]
+    mover = 0
+    while True:
+        node = Node(scratch.board.copy(), positions[mover], positions[1 - mover], world.max_step, set())
+        assert scratch.end_game(positions[mover], positions[1 - mover]) == node.is_end_game()
+        if node.is_end_game()[0]:
+            break
+        pos, dir = scratch.random_move(positions[mover], positions[1 - mover], world.max_step)
+        assert not scratch.board[pos[0], pos[1], dir]
+        scratch.make(pos[0], pos[1], dir)
+        positions[mover] = pos
+        mover = 1 - mover
+    assert len(scratch.undo) > 0
+    # Taking back the moves gives the board back
+    scratch.reset()
+    assert np.array_equal(scratch.board, chess_board)
+
+
+def test_mc_tree_reroot():
+    from agents.student_agent import MCTree, set_barrier
+
+    np.random.seed(2)
+    random.seed(2)
+    world = World(board_size=6, display_ui=False)
+    chess_board = world.chess_board.copy()
+    my_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    tree = MCTree(chess_board, my_pos, adv_pos, world.max_step)
+    for _ in range(300):
+        tree.do_rollout()
+
+    # Play the most visited reply to the most visited move
+    children = tree.children(0)
+    child = children.start + int(np.argmax(tree.N[children.start : children.stop]))
+    grandchildren = tree.children(child)
+    grandchild = grandchildren.start + int(
+        np.argmax(tree.N[grandchildren.start : grandchildren.stop])
+    )
+    visits, key = tree.N[grandchild], tree.key[grandchild]
+    n_subtree = tree.N[tree.children(grandchild).start : tree.children(grandchild).stop].sum()
+    board = chess_board.copy()
+    moves = []
+    for node in (child, grandchild):
+        move = int(tree.move[node])
+        moves.append(((move >> 8, (move >> 2) & 0x3F), move & 0x3))
+        set_barrier(board, *moves[-1][0], moves[-1][1])
+
+    assert not tree.reroot(board, adv_pos, my_pos)
+    assert tree.reroot(board, moves[0][0], moves[1][0])
+    assert tree.N[0] == visits and tree.key[0] == key
+    children = tree.children(0)
+    assert tree.N[children.start : children.stop].sum() == n_subtree
+    assert np.all(tree.parent[children.start : children.stop] == 0)
+    assert np.all(tree.parent[1 : tree.size] < np.arange(1, tree.size))
+    for _ in range(50):
+        tree.do_rollout()
+    assert np.array_equal(tree.scratch.board, board)
+    next_pos, dir = tree.choose()
+    assert not board[next_pos[0], next_pos[1], dir]
+
+
+def test_root_parallel_step():
+    from agents.student_agent import StudentAgent
+
+    np.random.seed(3)
+    random.seed(3)
+    world = World(board_size=6, display_ui=False)
+    agent = StudentAgent(n_workers=3)
+    agent.time_manager.first_move_time = 0.5
+    try:
+        next_pos, dir = agent.step(
+            world.chess_board.copy(), tuple(world.p0_pos), tuple(world.p1_pos), world.max_step
+        )
+        assert len(agent.workers) == 2
+        assert all(process.is_alive() for process, _ in agent.workers)
+        assert world.check_valid_step(world.p0_pos, np.array(next_pos), dir)
+    finally:
+        agent.close()
+    assert agent.workers == []
+
+
+def test_root_parallel_early_stop():
+    from agents.student_agent import StudentAgent
+
+    chess_board = np.zeros((5, 5, 4), dtype=bool)
+    chess_board[0, :, 0] = True
+    chess_board[:, 0, 3] = True
+    chess_board[-1, :, 2] = True
+    chess_board[:, -1, 1] = True
+    chess_board[0, 0, 1] = chess_board[0, 1, 3] = True
+    agent = StudentAgent(n_workers=2)
+    try:
+        start_time = time.time()
+        # The winning move stops this search early, and the worker with it
+        stats = agent.parallel_search(chess_board, (2, 2), (0, 0), 3, start_time + 5, start_time + 10)
+        assert time.time() - start_time < 2
+        assert len(stats) == 1
+        assert agent.tree.choose(stats) == ((1, 0), 0)
+        # The worker is ready for the next search
+        stats = agent.parallel_search(chess_board, (2, 2), (0, 0), 3, time.time() + 0.1)
+        assert len(stats[0][0]) > 0
+    finally:
+        agent.close()
+
+
+def test_search_workers():
+    from simulator import get_args, get_search_workers
+
+    world = World(player_1="student_agent_parallel", board_size=5, search_workers=2)
+    assert world.p0.n_workers == 2
+    # The default leaves the agent one worker per core
+    assert World(player_1="student_agent_parallel", board_size=5).p0.n_workers == (os.cpu_count() or 1)
+
+    args = get_args(["--workers", "64"])
+    assert get_search_workers(args) == max(1, (os.cpu_count() or 1) // 64)
+    args = get_args(["--workers", "64", "--search_workers", "3"])
+    assert get_search_workers(args) == 3
+    assert get_search_workers(get_args([])) is None
+
+
+def test_time_manager():
+    from agents.student_agent import TimeManager
+
+    time_manager = TimeManager(game_time=10.0, first_move_time=4.0, max_move_time=1.0)
+    chess_board = np.zeros((6, 6, 4), dtype=bool)
+    assert time_manager.allot(chess_board, first=True) == (2.0, 4.0)
+    soft, hard = time_manager.allot(chess_board, first=False)
+    # The soft limit is the nominal move time at most
+    assert 0 < soft <= time_manager.move_time < hard <= 1.0
+    # The first move is not charged to the game budget
+    time_manager.spend(3.0, first=True)
+    time_manager.spend(9.5, first=False)
+    assert time_manager.allot(chess_board, first=False)[1] <= 0.5
+
+    # Without a game time, the budget is the move time of every expected move
+    time_manager = TimeManager()
+    time_manager.allot(chess_board, first=True)
+    expected_moves = time_manager.expected_moves(chess_board)
+    assert time_manager.game_time == pytest.approx(time_manager.move_time * expected_moves)
+
+    moves = np.array([0, 1, 2])
+    # A clear favourite that cannot be overtaken in time stops early
+    stats = (moves, np.array([900, 50, 50]), np.array([600.0, 10.0, 10.0]))
+    assert time_manager.should_stop(stats, 0.1, 0.5, 1.0, rate=1000)
+    # A runner-up rated higher than the most visited move is searched past the
+    # soft limit, up to the hard one
+    stats = (moves, np.array([500, 480, 20]), np.array([250.0, 245.0, 5.0]))
+    assert not time_manager.should_stop(stats, 0.6, 0.5, 1.0, rate=1000)
+    assert time_manager.should_stop(stats, 1.0, 0.5, 1.0, rate=1000)
+    # Otherwise the search stops at the soft limit
+    stats = (moves, np.array([500, 480, 20]), np.array([400.0, 100.0, 5.0]))
+    assert not time_manager.should_stop(stats, 0.4, 0.5, 1.0, rate=1000)
+    assert time_manager.should_stop(stats, 0.5, 0.5, 1.0, rate=1000)
+
+
+def test_student_agent_stops_early():
+    from agents.student_agent import StudentAgent
+
+    chess_board = np.zeros((5, 5, 4), dtype=bool)
+    chess_board[0, :, 0] = True
+    chess_board[:, 0, 3] = True
+    chess_board[-1, :, 2] = True
+    chess_board[:, -1, 1] = True
+    # The adversary can only leave its corner downwards, where we can wall it in
+    chess_board[0, 0, 1] = chess_board[0, 1, 3] = True
+    agent = StudentAgent()
+    agent.first_iteration = False
+    soft, _ = agent.time_manager.allot(chess_board, first=False)
+    start_time = time.time()
+    assert agent.step(chess_board, (2, 2), (0, 0), 3) == ((1, 0), 0)
+    assert time.time() - start_time < soft / 2
+
+
+def test_student_agent_mean_move_time():
+    # The games differ from run to run, as the rollouts of a move depend on the
+    # clock, so the times are taken over several games
+    move_times = []
+    for seed in range(6):
+        np.random.seed(seed)
+        random.seed(seed)
+        world = World(player_1="student_agent", player_2="random_agent", board_size=6)
+        time_manager = world.p0.time_manager
+        time_manager.first_move_time = 0.5
+        game_times = []
+        is_end = False
+        while not is_end:
+            time_used = time_manager.time_used
+            is_end, _, _ = world.step()
+            if world.turn == 1:
+                game_times.append(time_manager.time_used - time_used)
+        # The first move is not charged
+        move_times += game_times[1:]
+    move_time = time_manager.move_time
+    # The winning moves are played as soon as they are found, which brings the
+    # mean under the fixed move time
+    assert sum(t < move_time / 2 for t in move_times) >= 2
+    assert np.mean(move_times) < 0.9 * move_time
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_node_find_children(seed):
+    from agents.student_agent import Node
+
+    np.random.seed(seed)
+    world = World(board_size=7, display_ui=False)
+    cur_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    node = Node(world.chess_board.copy(), cur_pos, adv_pos, world.max_step, {cur_pos})
+    moves = node.find_children()
+    assert len(moves) == len(set(moves))
+    expected = {
+        ((r, c), d)
+        for r in range(7)
+        for c in range(7)
+        for d in range(4)
+        if not world.chess_board[r, c, d]
+        and world.check_valid_step(np.array(cur_pos), np.array((r, c)), d)
+    }
+    assert set(moves) == expected
+    # Children only become board states on demand
+    child = node.child(moves[0])
+    (r, c), d = moves[0]
+    assert child.board[r, c, d] and not node.board[r, c, d]
+    assert child.cur_pos == (r, c) and child.d == d
+
+
+def test_mc_tree_leaf_evaluation():
+    from agents.student_agent import MCTree
+
+    np.random.seed(4)
+    random.seed(4)
+    world = World(board_size=7, display_ui=False)
+    cur_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    tree = MCTree(world.chess_board.copy(), cur_pos, adv_pos, world.max_step, leaf_evaluation=True)
+    for _ in range(100):
+        tree.do_rollout()
+    assert np.all((tree.Q[: tree.size] >= 0) & (tree.Q[: tree.size] <= tree.N[: tree.size]))
+    next_pos, dir = tree.choose()
+    assert world.check_valid_step(np.array(cur_pos), np.array(next_pos), dir)
+
+
+def test_voronoi_student_agent():
+    from agents.student_agent import VoronoiStudentAgent
+    from store import AGENT_REGISTRY
+
+    assert AGENT_REGISTRY["student_agent_voronoi"] is VoronoiStudentAgent
+    np.random.seed(4)
+    random.seed(4)
+    world = World(board_size=7, display_ui=False)
+    agent = VoronoiStudentAgent()
+    cur_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    agent.search(world.chess_board.copy(), cur_pos, adv_pos, world.max_step, time.time() + 0.2)
+    assert agent.tree.leaf_evaluation
+
+
+def test_alphabeta_finds_win():
+    from agents.alphabeta_agent import AlphaBetaAgent
+
+    np.random.seed(0)
+    world = World(board_size=5, display_ui=False)
+    chess_board = np.zeros((5, 5, 4), dtype=bool)
+    chess_board[0, :, 0] = True
+    chess_board[:, 0, 3] = True
+    chess_board[-1, :, 2] = True
+    chess_board[:, -1, 1] = True
+    world.chess_board = chess_board
+    # The adversary can only leave its corner downwards
+    world.set_barrier(0, 0, 1)
+    world.p0_pos = np.array([2, 2])
+    world.p1_pos = np.array([0, 0])
+
+    agent = AlphaBetaAgent()
+    agent.first_move_time = 1.0
+    next_pos, dir = agent.step(world.chess_board.copy(), (2, 2), (0, 0), world.max_step)
+    assert agent.depth >= 1
+    assert world.check_valid_step(world.p0_pos, np.array(next_pos), dir)
+    world.p0_pos = np.array(next_pos)
+    world.set_barrier(next_pos[0], next_pos[1], dir)
+    is_end, p0_score, p1_score = world.check_endgame()
+    assert is_end and p0_score > p1_score
+
+
+def test_alphabeta_matches_minimax():
+    from agents.alphabeta_agent import AlphaBetaAgent
+
+    np.random.seed(6)
+    world = World(board_size=5, display_ui=False)
+    assert not world.check_endgame()[0]
+    my_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    agent = AlphaBetaAgent()
+    agent.first_move_time = 0.01
+    agent.step(world.chess_board.copy(), my_pos, adv_pos, world.max_step)
+    agent.deadline = float("inf")
+
+    # Plain depth 2 minimax, without pruning or tables
+    best = -np.inf
+    for move in agent.ordered_moves(my_pos, adv_pos, None, 0):
+        (r, c), dir = agent.decode(move)
+        agent.make(r, c, dir)
+        is_end, value = agent.end_value(adv_pos, (r, c))
+        if not is_end:
+            replies = agent.ordered_moves(adv_pos, (r, c), None, 1)
+            value = max(agent.evaluate_moves(adv_pos, (r, c), replies))
+        agent.unmake(r, c, dir)
+        best = max(best, -value)
+
+    key = int(agent.keys.hash(agent.board, my_pos, adv_pos))
+    assert agent.negamax(2, -np.inf, np.inf, 0, my_pos, adv_pos, key) == best
+    assert np.array_equal(agent.board, world.chess_board)
+
+
+def test_alphabeta_move_time():
+    from agents.alphabeta_agent import AlphaBetaAgent
+
+    np.random.seed(2)
+    world = World(board_size=12, display_ui=False)
+    for _ in range(10):
+        _, cur_pos, adv_pos = world.get_current_player()
+        (r, c), dir = world.random_walk(tuple(cur_pos), tuple(adv_pos))
+        if world.turn:
+            world.p1_pos = np.array((r, c))
+        else:
+            world.p0_pos = np.array((r, c))
+        world.set_barrier(r, c, dir)
+        world.turn = 1 - world.turn
+    assert not world.check_endgame()[0]
+    _, cur_pos, adv_pos = world.get_current_player()
+
+    agent = AlphaBetaAgent(move_time=0.5)
+    agent.first_move = False
+    start_time = time.perf_counter()
+    next_pos, dir = agent.step(
+        world.chess_board.copy(), tuple(cur_pos), tuple(adv_pos), world.max_step
+    )
+    end_time = time.perf_counter()
+    assert agent.deadline == pytest.approx(start_time + agent.move_time, abs=0.05)
+    assert agent.depth >= 1
+    # The search stops at the first node after the deadline, the margin is for
+    # loaded machines only
+    assert end_time < agent.deadline + 1.0
+    assert world.check_valid_step(cur_pos, np.array(next_pos), dir)
+
+
+def test_alphabeta_configure():
+    from agents.alphabeta_agent import AlphaBetaAgent, BUDGET_SHARE
+
+    agent = AlphaBetaAgent(move_time=1.0, first_move_time=3.0)
+    agent.configure(search_workers=4)
+    assert (agent.move_time, agent.first_move_time) == (1.0, 3.0)
+    # Both budgets fit in the world's budget of a step
+    agent.configure(move_time=2.0)
+    assert agent.move_time == 1.0
+    assert agent.first_move_time == BUDGET_SHARE * 2.0
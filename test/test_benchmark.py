@@ -0,0 +1,60 @@
+import numpy as np
+from benchmark import (
+    Benchmark,
+    compare,
+    environment,
+    environment_mismatches,
+    micro_benchmarks,
+    run_benchmarks,
+    seeded_world,
+)
+from constants import BOARD_BACKENDS
+
+
+def test_seeded_world():
+    worlds = [seeded_world(6, 3, board_backend) for board_backend in BOARD_BACKENDS]
+    for world in worlds:
+        assert not world.check_endgame()[0]
+        assert np.array_equal(world.p0_pos, worlds[0].p0_pos)
+        assert np.array_equal(world.p1_pos, worlds[0].p1_pos)
+    boards = [np.asarray(world.chess_board) for world in worlds[:1]]
+    boards += [world.chess_board.to_array() for world in worlds[1:]]
+    assert all(np.array_equal(board, boards[0]) for board in boards)
+
+
+def test_micro_benchmarks():
+    results = run_benchmarks(micro_benchmarks(board_sizes=(5,)), repeat=1)
+    assert "check_valid_step[bitboard,5]" in results
+    assert "Node.is_end_game[5]" in results
+    assert all(result["seconds"] > 0 for result in results.values())
+
+
+def test_compare():
+    calls = []
+    benchmark = Benchmark("append", lambda: calls, lambda calls: calls.append(1), 1)
+    assert benchmark.measure(repeat=3)["calls"] == 3
+    assert len(calls) == 3
+
+    baseline = {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}}
+    results = {"a": {"seconds": 1.2}, "b": {"seconds": 1.5}, "c": {"seconds": 9.0}}
+    comparison = compare(results, baseline, tolerance=0.25)
+    assert [(name, is_regression) for name, _, _, _, is_regression in comparison] == [
+        ("a", False),
+        ("b", True),
+    ]
+
+    assert environment_mismatches(environment()) == []
+    baseline_environment = dict(environment(), numpy="1.22.2")
+    assert environment_mismatches(baseline_environment) == [
+        f"numpy 1.22.2 in the baseline, {np.__version__} here"
+    ]
+
+
+def test_search_benchmark():
+    from benchmark import SearchBenchmark
+    from store import AGENT_REGISTRY
+
+    assert "student_agent_parallel" in AGENT_REGISTRY
+    result = SearchBenchmark(2, board_size=6, search_time=0.05).measure(repeat=1)
+    assert result["calls"] > 1
+    assert 0 < result["seconds"] < 0.05
@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+from bitboard import BitBoard, popcount
+from world import World
+
+
+@pytest.fixture
+def random_world():
+    np.random.seed(0)
+    return World(board_size=8)
+
+
+def test_borders():
+    board = BitBoard(4)
+    expected = np.zeros((4, 4, 4), dtype=bool)
+    expected[0, :, 0] = True
+    expected[:, 0, 3] = True
+    expected[-1, :, 2] = True
+    expected[:, -1, 1] = True
+    assert np.array_equal(board.to_array(), expected)
+
+
+def test_round_trip(random_world):
+    board = BitBoard.from_array(random_world.chess_board)
+    assert np.array_equal(board.to_array(), random_world.chess_board)
+    for r in range(8):
+        for c in range(8):
+            for dir in range(4):
+                assert board[r, c, dir] == random_world.chess_board[r, c, dir]
+
+
+def test_set_barrier_sets_both_faces():
+    board = BitBoard(5)
+    board.set_barrier(2, 3, 0)
+    assert board[2, 3, 0] and board[1, 3, 2]
+    board[1, 1, 1] = True
+    assert board[1, 2, 3]
+    board[1, 2, 3] = False
+    assert not board[1, 1, 1]
+
+
+def test_remove_border_fails():
+    board = BitBoard(5)
+    with pytest.raises(ValueError):
+        board[0, 2, 0] = False
+    with pytest.raises(ValueError):
+        board[2, 4, 1] = False
+
+
+def test_copy_is_independent():
+    board = BitBoard(5)
+    other = board.copy()
+    other.set_barrier(2, 2, 2)
+    assert not board[2, 2, 2]
+    assert other != board
+
+
+def test_reachable(random_world):
+    board = BitBoard.from_array(random_world.chess_board)
+    start = tuple(random_world.p0_pos)
+    adv = tuple(random_world.p1_pos)
+    mask = board.reachable(start, adv, random_world.max_step)
+    assert not mask & board.cell_mask(*adv)
+    for r, c in board.cells(board.full_mask):
+        free_dirs = [d for d in range(4) if not board[r, c, d]]
+        if not free_dirs:
+            continue
+        in_mask = bool(mask & board.cell_mask(r, c))
+        assert in_mask == random_world.check_valid_step(
+            random_world.p0_pos, np.array([r, c]), free_dirs[0]
+        )
+
+
+def test_region_size():
+    board = BitBoard(4)
+    for c in range(4):
+        board.set_barrier(1, c, 2)
+    assert popcount(board.region((0, 0))) == 8
+    assert popcount(board.region((3, 3))) == 8
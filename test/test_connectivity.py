@@ -0,0 +1,181 @@
+import pytest
+import numpy as np
+from connectivity import BridgeAnalysis, DistanceMap, RegionTracker, label_regions
+from world import World
+
+
+def zone_partition(tracker):
+    """
+    Group cells by zone so trackers can be compared regardless of label values.
+    """
+    zones = {}
+    for index, label in enumerate(tracker.labels):
+        zones.setdefault(label, set()).add(index)
+    return sorted(sorted(zone) for zone in zones.values())
+
+
+def test_tracker_split():
+    world = World(board_size=5)
+    world.chess_board = np.zeros((5, 5, 4), dtype=bool)
+    world.chess_board[0, :, 0] = True
+    world.chess_board[:, 0, 3] = True
+    world.chess_board[-1, :, 2] = True
+    world.chess_board[:, -1, 1] = True
+    world.p0_pos = np.asarray([0, 0])
+    world.p1_pos = np.asarray([4, 4])
+    regions = world.get_regions()
+    assert regions.scores(world.p0_pos, world.p1_pos) == (False, 25, 25)
+    for c in range(4):
+        world.set_barrier(1, c, 2)
+    assert world.get_regions() is regions
+    assert not world.check_endgame()[0]
+    world.set_barrier(1, 4, 2)
+    assert world.check_endgame() == (True, 10, 15)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_tracker_matches_rebuild(seed):
+    np.random.seed(seed)
+    world = World(board_size=8)
+    world.check_endgame()
+    for _ in range(60):
+        r, c = np.random.randint(0, 8, size=2)
+        dir = np.random.randint(0, 4)
+        if world.chess_board[r, c, dir]:
+            continue
+        world.set_barrier(r, c, dir)
+        assert zone_partition(world.regions) == zone_partition(
+            RegionTracker(world.chess_board)
+        )
+
+
+def test_label_regions_world_2(world_2):
+    labels, sizes = label_regions(world_2.chess_board)
+    p0_label = labels[tuple(world_2.p0_pos)]
+    p1_label = labels[tuple(world_2.p1_pos)]
+    assert p0_label != p1_label
+    assert sizes[p0_label] == 15
+    assert sizes[p1_label] == 10
+    assert sizes.sum() == 25
+
+
+def test_label_regions_batch():
+    boards = []
+    for seed in range(4):
+        np.random.seed(seed)
+        boards.append(World(board_size=7).chess_board)
+    labels, sizes = label_regions(np.stack(boards))
+    for i, board in enumerate(boards):
+        single_labels, single_sizes = label_regions(board)
+        assert np.array_equal(labels[i], single_labels)
+        assert np.array_equal(sizes[i], single_sizes)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2, 3])
+def test_bridges_match_brute_force(seed):
+    np.random.seed(seed)
+    world = World(board_size=6)
+    chess_board = world.chess_board
+    p0_pos, p1_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    # Add walls as long as the players stay connected
+    for _ in range(15):
+        (r, c), dir = world.random_walk(p0_pos, p1_pos)
+        world.set_barrier(r, c, dir)
+        if world.check_endgame()[0]:
+            # Take the last wall back on a new board
+            chess_board = chess_board.copy()
+            chess_board[r, c, dir] = False
+            m_r, m_c = ((-1, 0), (0, 1), (1, 0), (0, -1))[dir]
+            chess_board[r + m_r, c + m_c, (dir + 2) % 4] = False
+            world.chess_board = chess_board
+            break
+
+    bridges = BridgeAnalysis(chess_board, p1_pos)
+    separates, p1_score, p0_score = bridges.separating_walls(p0_pos)
+    for r, c, dir in zip(*np.nonzero(~chess_board)):
+        board = chess_board.copy()
+        board[r, c, dir] = True
+        m_r, m_c = ((-1, 0), (0, 1), (1, 0), (0, -1))[dir]
+        board[r + m_r, c + m_c, (dir + 2) % 4] = True
+        labels, sizes = label_regions(board)
+        is_separated = labels[p0_pos] != labels[p1_pos]
+        assert separates[r, c, dir] == is_separated
+        assert bridges.separates(p0_pos, r, c, dir) == is_separated
+        if is_separated:
+            assert p0_score[r, c, dir] == sizes[labels[p0_pos]]
+            assert p1_score[r, c, dir] == sizes[labels[p1_pos]]
+
+
+def test_random_no_endgame_avoids_endgame():
+    from agents.random_no_endgame import RandomNoEndgame
+
+    agent = RandomNoEndgame()
+    for seed in range(10):
+        np.random.seed(seed)
+        world = World(board_size=5)
+        # Corner the adversary so that many walls would enclose it
+        world.p1_pos = np.array([0, 0])
+        world.p0_pos = np.array([0, 1])
+        world.set_barrier(1, 0, 1)
+        if world.check_endgame()[0]:
+            continue
+        my_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+        (r, c), dir = agent.step(world.chess_board.copy(), my_pos, adv_pos, world.max_step)
+        assert world.check_valid_step(world.p0_pos, np.array([r, c]), dir)
+        world.p0_pos = np.array([r, c])
+        world.set_barrier(r, c, dir)
+        assert not world.check_endgame()[0]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_distance_map_matches_rebuild(seed):
+    from connectivity import DistanceMap
+
+    np.random.seed(seed)
+    world = World(board_size=8)
+    source = tuple(world.p0_pos)
+    distance_map = DistanceMap(world.chess_board, source)
+    for _ in range(40):
+        free = np.argwhere(~world.chess_board)
+        r, c, dir = free[np.random.randint(0, len(free))]
+        world.set_barrier(r, c, dir)
+        distance_map.update(world.chess_board)
+        expected = DistanceMap(world.chess_board, source)
+        assert np.array_equal(distance_map.distances, expected.distances)
+        assert np.array_equal(distance_map.chess_board, world.chess_board)
+
+    for target in zip(*np.nonzero(distance_map.distances >= 0)):
+        path = distance_map.path(target)
+        assert path[0] == source and path[-1] == target
+        assert len(path) == distance_map.distances[target] + 1
+        for (r, c), (next_r, next_c) in zip(path, path[1:]):
+            dir = [(-1, 0), (0, 1), (1, 0), (0, -1)].index((next_r - r, next_c - c))
+            assert not world.chess_board[r, c, dir]
+    unreachable = np.argwhere(distance_map.distances < 0)
+    if len(unreachable):
+        assert distance_map.path(tuple(unreachable[0])) is None
+
+
+def test_approach_agent_game():
+    np.random.seed(0)
+    world = World(player_1="approach_agent", player_2="random_agent", board_size=7)
+    is_end = False
+    while not is_end:
+        is_end, p0_score, p1_score = world.step()
+    assert p0_score + p1_score <= 7 * 7
+
+
+def test_approach_agent_follows_shortest_path():
+    from agents.approach_agent import ApproachAgent
+
+    np.random.seed(1)
+    world = World(board_size=8)
+    my_pos, adv_pos = tuple(world.p0_pos), tuple(world.p1_pos)
+    next_pos, dir = ApproachAgent().step(world.chess_board.copy(), my_pos, adv_pos, world.max_step)
+    assert world.check_valid_step(world.p0_pos, np.array(next_pos), dir)
+    # The agent walks at most max_step tiles along a shortest path to the adversary
+    from_me = DistanceMap(world.chess_board, my_pos)
+    from_adv = DistanceMap(world.chess_board, adv_pos)
+    distance = from_me.distances[adv_pos]
+    assert from_me.distances[next_pos] == min(world.max_step, distance - 1)
+    assert from_adv.distances[next_pos] == distance - from_me.distances[next_pos]
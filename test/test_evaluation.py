@@ -0,0 +1,73 @@
+from collections import deque
+import pytest
+import numpy as np
+from evaluation import voronoi
+from world import World
+
+# Moves (Up, Right, Down, Left)
+MOVES = ((-1, 0), (0, 1), (1, 0), (0, -1))
+
+
+def bfs_distances(chess_board, start_pos, adv_pos):
+    distances = np.full(chess_board.shape[:2], -1)
+    distances[start_pos] = 0
+    queue = deque([start_pos])
+    while queue:
+        r, c = queue.popleft()
+        for dir, (m_r, m_c) in enumerate(MOVES):
+            next_pos = (r + m_r, c + m_c)
+            if (
+                chess_board[r, c, dir]
+                or next_pos == adv_pos
+                or distances[next_pos] >= 0
+            ):
+                continue
+            distances[next_pos] = distances[r, c] + 1
+            queue.append(next_pos)
+    return distances
+
+
+@pytest.fixture
+def boards():
+    boards = []
+    for seed in range(4):
+        np.random.seed(seed)
+        world = World(board_size=7)
+        for _ in range(10):
+            free = np.argwhere(~world.chess_board)
+            r, c, dir = free[np.random.randint(0, len(free))]
+            world.set_barrier(r, c, dir)
+        boards.append((world.chess_board, tuple(world.p0_pos), tuple(world.p1_pos)))
+    return boards
+
+
+def test_voronoi(boards):
+    for chess_board, p0_pos, p1_pos in boards:
+        territory = voronoi(chess_board, p0_pos, p1_pos)
+        p0_distances = bfs_distances(chess_board, p0_pos, p1_pos)
+        p1_distances = bfs_distances(chess_board, p1_pos, p0_pos)
+        assert np.array_equal(territory.p0_distances, p0_distances)
+        assert np.array_equal(territory.p1_distances, p1_distances)
+        assert territory.p0_cells[p0_pos] and territory.p1_cells[p1_pos]
+        # Every reached cell goes to exactly one of the three groups
+        groups = (
+            territory.p0_cells.astype(int) + territory.p1_cells + territory.contested
+        )
+        assert np.array_equal(groups, (p0_distances >= 0) | (p1_distances >= 0))
+        assert territory.score == territory.p0_cells.sum() - territory.p1_cells.sum()
+
+
+def test_voronoi_batch(boards):
+    chess_board, p0_pos, p1_pos = (np.array(a) for a in zip(*boards))
+    territory = voronoi(
+        chess_board.reshape(2, 2, 7, 7, 4),
+        p0_pos.reshape(2, 2, 2),
+        p1_pos.reshape(2, 2, 2),
+    )
+    assert territory.score.shape == (2, 2)
+    for i, (chess_board, p0_pos, p1_pos) in enumerate(boards):
+        single = voronoi(chess_board, p0_pos, p1_pos)
+        assert np.array_equal(
+            territory.p0_distances[i // 2, i % 2], single.p0_distances
+        )
+        assert territory.score[i // 2, i % 2] == single.score
@@ -0,0 +1,57 @@
+import pickle
+import pstats
+import numpy as np
+from profiling import StepProfiler
+from world import World
+
+
+def play(profiler, seed):
+    np.random.seed(seed)
+    world = World(
+        player_1="random_agent", player_2="random_no_endgame", profiler=profiler
+    )
+    steps = 1
+    while not world.step()[0]:
+        steps += 1
+    return steps
+
+
+def test_step_profiler(world_init):
+    profiler = StepProfiler()
+    world_init.profiler = profiler
+    world_init.p0_pos = np.asarray([0, 0])
+    world_init.p1_pos = np.asarray([4, 4])
+    world_init.turn = 0
+    world_init.step()
+    summary = profiler.summary()
+    for phase in ("agent_board", "agent_step", "check_valid_step", "check_endgame"):
+        assert summary[phase]["count"] == 1
+    assert "render" not in summary
+    assert abs(sum(stats["share"] for stats in summary.values()) - 1) < 1e-9
+    assert profiler.report().splitlines()[0].startswith("phase")
+
+
+def test_step_profiler_merge(tmp_path):
+    profiler = StepProfiler(profile_agents=True)
+    steps = play(profiler, 0)
+    assert len(profiler.times["agent_step"]) == steps
+
+    # As sent back by an autoplay worker
+    other = StepProfiler(profile_agents=True)
+    other_steps = play(other, 1)
+    profiler.merge(pickle.loads(pickle.dumps(other)))
+    assert len(profiler.times["check_endgame"]) == steps + other_steps
+
+    paths = profiler.dump_agent_stats(str(tmp_path))
+    assert sorted(p.rsplit("/", 1)[-1] for p in paths) == [
+        "random_agent.prof",
+        "random_no_endgame.prof",
+    ]
+    stats = pstats.Stats(str(tmp_path / "random_no_endgame.prof"))
+    calls = [
+        n_calls
+        for (_, _, function), (_, n_calls, _, _, _) in stats.stats.items()
+        if function == "step"
+    ]
+    # The second player steps on every other turn
+    assert sum(calls) == steps // 2 + other_steps // 2
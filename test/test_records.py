@@ -0,0 +1,114 @@
+import gc
+import os
+import warnings
+import numpy as np
+import pytest
+from records import (
+    GameRecorder,
+    GameRecordReader,
+    GameRecordWriter,
+    INDEX_SUFFIX,
+    decode_game,
+    decode_moves,
+    encode_moves,
+)
+from world import World
+
+
+def play_recorded_game(seed, recorder):
+    np.random.seed(seed)
+    world = World(board_size=6, recorder=recorder)
+    initial_board = world.chess_board.copy()
+    is_end, p0_score, p1_score = world.step()
+    while not is_end:
+        is_end, p0_score, p1_score = world.step()
+    return world, initial_board, p0_score, p1_score
+
+
+def test_moves_round_trip():
+    moves = np.array([[0, 0, 0], [11, 7, 3], [63, 63, 2]])
+    assert np.array_equal(decode_moves(encode_moves(moves)), moves)
+
+
+def test_recorder():
+    recorder = GameRecorder()
+    world, initial_board, p0_score, p1_score = play_recorded_game(0, recorder)
+    assert len(recorder.records) == 1
+    record = decode_game(recorder.records[0])
+    assert record.board_size == 6
+    assert np.array_equal(record.chess_board, initial_board)
+    assert record.p0_score == p0_score
+    assert record.p1_score == p1_score
+    assert tuple(record.moves[-1][:2]) in (tuple(world.p0_pos), tuple(world.p1_pos))
+
+
+def test_writer_and_reader(tmp_path):
+    path = str(tmp_path / "games.rec")
+    scores = []
+    with GameRecordWriter(path) as writer:
+        for seed in range(5):
+            _, _, p0_score, p1_score = play_recorded_game(seed, writer.recorder())
+            scores.append((p0_score, p1_score))
+    reader = GameRecordReader(path)
+    assert len(reader) == 5
+    assert [(game.p0_score, game.p1_score) for game in reader] == scores
+    assert int(reader.header(3)["p0_score"]) == scores[3][0]
+
+    # Appending to an existing file keeps the previous games
+    with GameRecordWriter(path) as writer:
+        play_recorded_game(5, writer.recorder())
+    assert len(GameRecordReader(path)) == 6
+
+    # The index can be rebuilt from the records
+    os.remove(path + INDEX_SUFFIX)
+    reader = GameRecordReader(path)
+    assert len(reader) == 6
+    assert (reader[0].p0_score, reader[0].p1_score) == scores[0]
+
+
+def test_writer_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a game record")
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        with pytest.raises(ValueError):
+            GameRecordWriter(str(path))
+        gc.collect()
+    # No file is left open
+    assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+    assert path.read_bytes() == b"not a game record"
+
+
+def test_autoplay_streams_records(tmp_path, monkeypatch):
+    import simulator
+
+    path = str(tmp_path / "games.rec")
+    args = simulator.get_args(
+        [
+            "--player_1",
+            "random_agent",
+            "--player_2",
+            "random_agent",
+            "--autoplay",
+            "--autoplay_runs",
+            "5",
+            "--board_size_min",
+            "5",
+            "--board_size_max",
+            "7",
+            "--record_path",
+            path,
+        ]
+    )
+    play_game = simulator.play_game
+
+    def interrupted_game(args, game_index, seed):
+        if game_index == 2:
+            raise KeyboardInterrupt
+        return play_game(args, game_index, seed)
+
+    monkeypatch.setattr(simulator, "play_game", interrupted_game)
+    with pytest.raises(KeyboardInterrupt):
+        simulator.Simulator(args).autoplay()
+    # The games finished before the interruption are in the file
+    assert len(GameRecordReader(path)) == 2
@@ -0,0 +1,56 @@
+import pytest
+import numpy as np
+from records import GameRecorder, decode_game
+from replay import replay, verify_game
+from world import World
+
+
+@pytest.fixture
+def recorded_game():
+    np.random.seed(1)
+    recorder = GameRecorder()
+    world = World(board_size=7, recorder=recorder)
+    states = [(world.chess_board.copy(), tuple(world.p0_pos), tuple(world.p1_pos))]
+    is_end = False
+    while not is_end:
+        is_end, _, _ = world.step()
+        states.append(
+            (world.chess_board.copy(), tuple(world.p0_pos), tuple(world.p1_pos))
+        )
+    return decode_game(recorder.records[0]), states
+
+
+def test_replay_every_move(recorded_game):
+    record, states = recorded_game
+    assert len(states) == len(record.moves) + 1
+    for move_index, (chess_board, p0_pos, p1_pos) in enumerate(states):
+        world = replay(record, move_index)
+        assert np.array_equal(world.chess_board, chess_board)
+        assert tuple(world.p0_pos) == p0_pos
+        assert tuple(world.p1_pos) == p1_pos
+        assert world.turn == move_index % 2
+        assert world.barrier_count == move_index
+
+
+def test_resumed_initial_state(recorded_game):
+    record, states = recorded_game
+    chess_board, p0_pos, p1_pos = states[3]
+    world = World(initial_state=(chess_board, p0_pos, p1_pos, 1, 3))
+    assert (world.turn, world.barrier_count) == (1, 3)
+    with pytest.raises(ValueError):
+        World(initial_state=(chess_board, p0_pos, p1_pos, 1))
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_verify_game(recorded_game, strict):
+    record, _ = recorded_game
+    assert verify_game(record, strict=strict) is None
+    tampered = record._replace(p0_score=record.p0_score + 1)
+    assert verify_game(tampered, strict=strict) is not None
+
+
+def test_verify_game_early_end(recorded_game):
+    record, _ = recorded_game
+    # Moves recorded after the game ended are rejected
+    moves = np.concatenate([record.moves, record.moves[-2:]])
+    assert verify_game(record._replace(moves=moves), strict=True) is not None
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from sequential import SPRT, ConfidenceStop, SequentialTest, wilson_interval
+from simulator import Simulator, get_args
+
+
+def test_wilson_interval():
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    low, high = wilson_interval(50, 100)
+    assert low == pytest.approx(0.4038, abs=1e-4)
+    assert high == pytest.approx(0.5962, abs=1e-4)
+    low, high = wilson_interval(10, 10)
+    assert high == 1.0 and 0.69 < low < 0.73
+    # Wider at a higher confidence
+    assert wilson_interval(50, 100, 0.99)[0] < wilson_interval(50, 100, 0.95)[0]
+
+
+@pytest.mark.parametrize("rate", [0.3, 0.7])
+def test_sprt(rate):
+    rng = np.random.default_rng(0)
+    test = SPRT(0.45, 0.55, 0.05, 0.05)
+    decision = None
+    while decision is None:
+        decision = test.update(float(rng.random() < rate))
+    assert decision == (rate > 0.5)
+    assert test.games < 200
+    # The decision is kept once made
+    games = test.games
+    assert test.update(1 - float(decision)) == decision
+    assert test.games == games + 1
+
+
+def test_sprt_ties():
+    half = SPRT(0.45, 0.55)
+    excluded = SPRT(0.45, 0.55, ties="exclude")
+    for test in (half, excluded):
+        for score in (1, 0.5, 0.5, 0):
+            test.update(score)
+    assert (half.games, half.score, half.ties) == (4, 2.0, 2)
+    assert (excluded.games, excluded.score, excluded.ties) == (2, 1.0, 2)
+    assert half.llr == pytest.approx(0.0)
+    with pytest.raises(ValueError):
+        SPRT(0.55, 0.45)
+    with pytest.raises(ValueError):
+        SPRT(ties="win")
+    # Only the tests deciding on the results can be created
+    with pytest.raises(TypeError):
+        SequentialTest()
+
+
+def test_confidence_stop():
+    test = ConfidenceStop(threshold=0.5, min_games=10)
+    for _ in range(9):
+        assert test.update(1) is None
+    assert test.update(1) is True
+    low, high = test.interval()
+    assert low > 0.5
+
+
+def test_autoplay_sequential():
+    args = get_args(
+        [
+            "--autoplay",
+            "--autoplay_runs",
+            "200",
+            "--seed",
+            "0",
+            "--sequential",
+            "sprt",
+            "--sprt_p0",
+            "0.2",
+            "--sprt_p1",
+            "0.5",
+        ]
+    )
+    test = Simulator(args).autoplay()
+    assert test.decision is True
+    assert test.games < 200
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+import tournament
+from simulator import get_args
+from tournament import (
+    PairingCache,
+    board_seeds,
+    fit_ratings,
+    play_pairings,
+    standings,
+)
+
+
+def test_fit_ratings():
+    agents = ["a", "b", "c"]
+    # a beats b 3 to 1, b and c tie every game
+    results = {
+        ("a", "b"): [(5, 1)] * 3 + [(1, 5)],
+        ("b", "c"): [(3, 3)] * 4,
+    }
+    ratings = fit_ratings(agents, results, prior_games=0)
+    assert ratings["a"] - ratings["b"] == pytest.approx(400 * np.log10(3), abs=1e-3)
+    assert ratings["b"] == pytest.approx(ratings["c"], abs=1e-3)
+    assert sum(ratings.values()) == pytest.approx(0, abs=1e-6)
+
+    # The prior keeps an agent winning every game finite
+    ratings = fit_ratings(["a", "b"], {("a", "b"): [(5, 1)] * 4})
+    assert ratings["a"] - ratings["b"] == pytest.approx(400 * np.log10(9), abs=1e-3)
+    table = standings(["a", "b"], {("a", "b"): [(5, 1)] * 4}, ratings)
+    assert table.splitlines()[1].split()[:2] == ["1", "a"]
+
+
+def test_play_pairings_cache(tmp_path):
+    cache_path = str(tmp_path / "cache.json")
+    seeds = board_seeds(2, seed=3)
+    played = []
+
+    def simulator_args(player_1, player_2):
+        played.append((player_1, player_2))
+        return get_args(
+            [
+                "--player_1",
+                player_1,
+                "--player_2",
+                player_2,
+                "--autoplay",
+                "--board_size_min",
+                "5",
+                "--board_size_max",
+                "7",
+            ]
+        )
+
+    pairings = [("random_agent", "random_agent")]
+    results = play_pairings(
+        pairings, simulator_args, seeds, cache=PairingCache(cache_path)
+    )
+    assert len(results[pairings[0]]) == 4
+    assert len(played) == 4
+
+    # Only the pairings with other settings are played again
+    cached = play_pairings(
+        pairings, simulator_args, seeds, cache=PairingCache(cache_path)
+    )
+    assert cached == results
+    assert len(played) == 4
+    play_pairings(
+        pairings,
+        simulator_args,
+        seeds,
+        cache=PairingCache(cache_path),
+        settings={"seed": 1},
+    )
+    assert len(played) == 8
+
+
+def test_pairing_cache_key_engine(tmp_path, monkeypatch):
+    engine_module = tmp_path / "world.py"
+    engine_module.write_text("RULES = 1\n")
+    monkeypatch.setattr(tournament, "ENGINE_MODULES", (str(engine_module),))
+    key = PairingCache.key("random_agent", "alphabeta_agent", {"seed": 0})
+    assert PairingCache.key("random_agent", "alphabeta_agent", {"seed": 0}) == key
+
+    # Editing an engine module plays every pairing again
+    engine_module.write_text("RULES = 2\n")
+    assert PairingCache.key("random_agent", "alphabeta_agent", {"seed": 0}) != key
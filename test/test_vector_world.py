@@ -0,0 +1,28 @@
+import numpy as np
+from records import decode_game
+from replay import verify_game
+from vector_world import VectorWorld
+
+
+def test_run_all_games():
+    world = VectorWorld(50, 6, seed=0)
+    p0_score, p1_score = world.run()
+    assert not world.active.any()
+    assert np.all(p0_score + p1_score <= 36)
+    assert np.all(p0_score > 0) and np.all(p1_score > 0)
+
+
+def test_seeded_games_repeat():
+    first = VectorWorld(20, 7, seed=3).run()
+    second = VectorWorld(20, 7, seed=3).run()
+    assert np.array_equal(first[0], second[0])
+    assert np.array_equal(first[1], second[1])
+
+
+def test_recorded_games_follow_the_rules():
+    world = VectorWorld(30, 6, seed=1, record=True)
+    world.run()
+    records = world.encode_games()
+    assert len(records) == 30
+    for data in records:
+        assert verify_game(decode_game(data), strict=True) is None
@@ -1,4 +1,29 @@
+import os
 import pytest
+import numpy as np
+from agents.agent import Agent
+from bitboard import BitBoard
+from constants import BOARD_BACKEND_BITBOARD
+from store import register_agent
+from supervisor import SupervisedAgent
+from world import World
+
+
+@register_agent("crash_test_agent")
+class CrashTestAgent(Agent):
+    """
+    An agent that kills its worker process when asked for a step with max_step 0.
+    It is defined at module level, so a spawned worker can import it.
+    """
+
+    def __init__(self):
+        super(CrashTestAgent, self).__init__()
+        self.name = "CrashTestAgent"
+
+    def step(self, chess_board, my_pos, adv_pos, max_step):
+        if max_step == 0:
+            os._exit(1)
+        return my_pos, 0
 
 
 @pytest.mark.parametrize("end_pos", [(0, 4), (0, 0), (2, 3), (3, 0), (4, 4)])
@@ -40,3 +65,105 @@ def test_check_endgame_world_2(world_2):
     assert is_end
     assert p0_score == 15
     assert p1_score == 10
+
+
+def test_get_valid_positions(world_1):
+    positions = world_1.get_valid_positions()
+    assert (2, 3) in positions
+    assert (2, 1) not in positions
+    assert (0, 2) in positions
+    assert (2, 0) not in positions
+    assert world_1.get_reachable() is world_1.get_reachable()
+    # The cached positions cannot be changed by callers
+    with pytest.raises(AttributeError):
+        positions.add((0, 0))
+    assert (0, 0) not in world_1.get_valid_positions()
+    # Enclose player A, only its own position is left
+    world_1.set_barrier(2, 3, 0)
+    world_1.set_barrier(2, 3, 2)
+    world_1.set_barrier(2, 3, 3)
+    assert world_1.get_valid_positions() == {(2, 3)}
+
+
+def test_assigned_board_resets_caches(world_1):
+    assert not world_1.check_endgame()[0]
+    assert (0, 2) in world_1.get_valid_positions()
+    # The same walls with player A enclosed, on a new board
+    if world_1.board_backend == BOARD_BACKEND_BITBOARD:
+        chess_board = BitBoard.from_array(world_1.chess_board.to_array())
+        for dir in (0, 2, 3):
+            chess_board.set_barrier(2, 3, dir)
+    else:
+        chess_board = world_1.chess_board.copy()
+        chess_board[2, 3] = True
+        chess_board[1, 3, 2] = chess_board[3, 3, 0] = chess_board[2, 2, 1] = True
+    world_1.chess_board = chess_board
+    assert world_1.regions is None and world_1.reachable_cache is None
+    assert world_1.get_valid_positions() == {(2, 3)}
+    assert world_1.check_endgame() == (True, 1, 24)
+
+
+def test_random_walk_is_valid(world_1):
+    for _ in range(20):
+        next_pos, dir = world_1.random_walk(
+            tuple(world_1.p0_pos), tuple(world_1.p1_pos)
+        )
+        assert world_1.check_valid_step(world_1.p0_pos, next_pos, dir)
+
+
+def test_readonly_board(world_1):
+    world_1.readonly_board = True
+    # Agents that accept a BitBoard get a copy of it instead
+    world_1.p0.supports_bitboard = False
+    chess_board = world_1.get_agent_board(world_1.p0)
+    assert not chess_board.flags.writeable
+    with pytest.raises(ValueError):
+        chess_board[2, 2, 0] = True
+    assert not world_1.chess_board[2, 2, 0]
+
+
+def test_supervised_agents():
+    world = World(board_size=5, agent_move_time=5)
+    try:
+        is_end, _, _ = world.step()
+        assert world.p0.time_used > 0
+        assert world.p0_timeouts == 0
+    finally:
+        world.close()
+
+
+def test_supervised_agent_restarts_after_crash():
+    agent = SupervisedAgent("crash_test_agent", move_time=5)
+    try:
+        assert agent.name == "CrashTestAgent"
+        chess_board = np.zeros((5, 5, 4), dtype=bool)
+        with pytest.raises(RuntimeError):
+            agent.step(chess_board, (1, 1), (3, 3), 0)
+        assert agent.step(chess_board, (1, 1), (3, 3), 2) == ((1, 1), 0)
+        assert agent.violations == 0
+    finally:
+        agent.close()
+
+
+def test_failed_step_is_charged():
+    world = World(player_1="crash_test_agent", board_size=5, agent_move_time=5)
+    try:
+        world.max_step = 0
+        world.step()
+        # The step crashed before the deadline and is replaced by a random walk,
+        # but its time is charged
+        assert world.p0_timeouts == 0
+        assert world.p0_time > 0
+    finally:
+        world.close()
+
+
+def test_game_time_budget():
+    world = World(board_size=5, agent_game_time=0)
+    try:
+        world.step()
+        assert world.p0_timeouts == 1
+        assert world.p0.violations == 1
+        assert world.turn == 1
+    finally:
+        world.close()
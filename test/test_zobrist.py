@@ -0,0 +1,53 @@
+import numpy as np
+from world import World
+from zobrist import TranspositionTable, ZobristKeys
+
+
+def test_incremental_hash():
+    np.random.seed(0)
+    world = World(board_size=6)
+    keys = ZobristKeys(world.board_size)
+    key = keys.hash(world.chess_board, world.p0_pos, world.p1_pos, world.turn)
+    for _ in range(10):
+        turn = world.turn
+        my_pos = tuple(world.p1_pos if turn else world.p0_pos)
+        adv_pos = tuple(world.p0_pos if turn else world.p1_pos)
+        (r, c), dir = world.random_walk(my_pos, adv_pos)
+        if turn:
+            world.p1_pos = np.array([r, c])
+        else:
+            world.p0_pos = np.array([r, c])
+        world.set_barrier(r, c, dir)
+        world.turn = 1 - world.turn
+        key ^= keys.move(turn, my_pos, r, c, dir)
+        assert key == keys.hash(
+            world.chess_board, world.p0_pos, world.p1_pos, world.turn
+        )
+
+
+def test_hash_transposition():
+    keys = ZobristKeys(5)
+    chess_board = np.zeros((5, 5, 4), dtype=bool)
+    key = keys.hash(chess_board, (0, 0), (4, 4))
+    p1_move = keys.move(1, (4, 4), 3, 4, 3)
+    # The same two barriers put in either order, with the same last position
+    first = keys.move(0, (0, 0), 2, 2, 0) ^ p1_move ^ keys.move(0, (2, 2), 1, 2, 3)
+    second = keys.move(0, (0, 0), 1, 2, 3) ^ p1_move ^ keys.move(0, (1, 2), 1, 2, 2)
+    assert key ^ first == key ^ second
+    chess_board[[2, 1, 1, 1, 3, 3], [2, 2, 2, 1, 4, 3], [0, 2, 3, 1, 3, 1]] = True
+    assert key ^ first == keys.hash(chess_board, (1, 2), (3, 4), 1)
+
+
+def test_transposition_table():
+    table = TranspositionTable(5)
+    assert len(table) == 8
+    keys = np.array([3, 11, 4], dtype=np.uint64)
+    table.update(keys[0], 1.0)
+    table.update(keys[0], 0.5)
+    visits, value = table.lookup(keys)
+    assert visits.tolist() == [2, 0, 0]
+    assert value.tolist() == [1.5, 0.0, 0.0]
+    # 11 takes the slot of 3
+    table.update(keys[1], 0.0)
+    visits, _ = table.lookup(keys)
+    assert visits.tolist() == [0, 1, 0]
@@ -0,0 +1,434 @@
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+import numpy as np
+from tqdm import tqdm
+from constants import BOARD_BACKEND_ARRAY, BOARD_BACKENDS
+from simulator import get_args as get_simulator_args
+from simulator import play_game
+from store import AGENT_REGISTRY
+from utils import all_logging_disabled
+
+logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
+logger = logging.getLogger(__name__)
+
+# Version of the pairing cache file, bumped when the games it holds change meaning
+CACHE_VERSION = 1
+# Elo points per factor of 10 in Bradley-Terry strength
+ELO_SCALE = 400
+# Modules of the game engine, relative to this file. The games of every agent
+# depend on them, so their digest is part of the pairing cache keys
+ENGINE_MODULES = (
+    "world.py",
+    "simulator.py",
+    "bitboard.py",
+    "connectivity.py",
+    "evaluation.py",
+    "zobrist.py",
+    "constants.py",
+    "utils.py",
+    "agents/agent.py",
+)
+
+
+def autoplay_agents():
+    """
+    List the registered agents that support autoplay.
+
+    Returns
+    -------
+    agents : list of str
+        The registered names of the agents, sorted.
+    """
+    agents = []
+    for agent_name, agent_class in sorted(AGENT_REGISTRY.items()):
+        with all_logging_disabled():
+            agent = agent_class()
+            agent.close()
+        if agent.autoplay:
+            agents.append(agent_name)
+    return agents
+
+
+def board_seeds(n_boards, seed=0):
+    """
+    Get the seeds of the boards every pairing plays on, from the master seed.
+
+    Returns
+    -------
+    seeds : list of int
+    """
+    return [
+        int(child.generate_state(1)[0])
+        for child in np.random.SeedSequence(seed).spawn(n_boards)
+    ]
+
+
+def agent_digest(agent_name):
+    """
+    Get a digest of the source file of a registered agent, so the cached games of
+    an agent are played again once its file changes.
+    """
+    return files_digest([inspect.getsourcefile(AGENT_REGISTRY[agent_name])])
+
+
+def engine_digest():
+    """
+    Get a digest of the ENGINE_MODULES, so every cached game is played again once
+    the rules, the board or the simulator change.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    return files_digest([os.path.join(root, module) for module in ENGINE_MODULES])
+
+
+def files_digest(paths):
+    # Short sha1 of the contents of the files, in order
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+class PairingCache:
+    """
+    The games of finished pairings, kept in a JSON file so a tournament only plays
+    the pairings it has not played yet.
+
+    Every pairing is stored under a key made of the agents, the digests of their
+    source files and of the engine modules, and the settings the games depend on,
+    so changing any of them plays the pairing again.
+
+    Parameters
+    ----------
+    path : str
+        The cache file. If None, nothing is kept.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pairings = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.pairings = data["pairings"]
+            else:
+                logger.warning(f"Ignoring the pairing cache {path} of another version")
+
+    @staticmethod
+    def key(player_1, player_2, settings):
+        """
+        Get the cache key of a pairing played with the given settings.
+        """
+        return json.dumps(
+            [
+                player_1,
+                agent_digest(player_1),
+                player_2,
+                agent_digest(player_2),
+                engine_digest(),
+                sorted(settings.items()),
+            ]
+        )
+
+    def get(self, key):
+        """
+        Get the (player_1_score, player_2_score) of the games of a pairing, or None.
+        """
+        return self.pairings.get(key)
+
+    def put(self, key, games):
+        """
+        Store the games of a pairing and write the cache file.
+        """
+        self.pairings[key] = [list(game) for game in games]
+        if self.path is None:
+            return
+        # Write a new file and rename it, so an interrupted write loses nothing
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "pairings": self.pairings}, f)
+        os.replace(temp_path, self.path)
+
+
+def play_pairings(pairings, simulator_args, seeds, workers=1, cache=None, settings=None):
+    """
+    Play every pairing on every board twice, once with each agent moving first.
+    The games of all the pairings not in the cache are played in parallel, and a
+    pairing is stored in the cache as soon as its games are over.
+
+    Parameters
+    ----------
+    pairings : list of tuple of str
+        The (player_1, player_2) pairings to play.
+    simulator_args : callable
+        Called with (player_1, player_2), gives the argparse.Namespace of the games.
+    seeds : list of int
+        The seeds of the boards.
+    workers : int
+        The number of processes playing games in parallel.
+    cache : PairingCache
+    settings : dict
+        The settings the games depend on, part of the cache keys.
+
+    Returns
+    -------
+    results : dict
+        The (player_1_score, player_2_score) of every game, by pairing.
+    """
+    cache = cache if cache is not None else PairingCache()
+    settings = settings or {}
+    results = {}
+    keys = {}
+    for pairing in pairings:
+        keys[pairing] = PairingCache.key(*pairing, settings)
+        games = cache.get(keys[pairing])
+        if games is not None:
+            results[pairing] = [tuple(game) for game in games]
+    to_play = [pairing for pairing in pairings if pairing not in results]
+    logger.info(
+        f"Playing {len(to_play)} of {len(pairings)} pairings, {len(pairings) - len(to_play)} cached"
+    )
+    if not to_play:
+        return results
+
+    # Every board is played by game indices 2 * i and 2 * i + 1, which play_game
+    # plays with the players in both seats
+    n_games = 2 * len(seeds)
+    game_args = [simulator_args(*pairing) for pairing in to_play for _ in range(n_games)]
+    game_indices = [index for _ in to_play for index in range(n_games)]
+    game_seeds = [seed for _ in to_play for seed in seeds for _ in range(2)]
+
+    executor = None
+    with all_logging_disabled():
+        try:
+            if workers > 1:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                games = executor.map(play_game, game_args, game_indices, game_seeds)
+            else:
+                games = map(play_game, game_args, game_indices, game_seeds)
+            scores = []
+            finished = 0
+            for result in tqdm(games, total=len(game_args)):
+                scores.append(tuple(int(score) for score in result[0][:2]))
+                if len(scores) == n_games:
+                    # The games come in order, so a pairing is over after every n_games
+                    pairing = to_play[finished]
+                    results[pairing] = scores
+                    cache.put(keys[pairing], scores)
+                    scores = []
+                    finished += 1
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    return results
+
+
+def game_outcome(player_1_score, player_2_score):
+    """
+    Get the result of a game for the first player: 1 for a win, 0.5 for a tie and
+    0 for a loss.
+    """
+    if player_1_score == player_2_score:
+        return 0.5
+    return float(player_1_score > player_2_score)
+
+
+def fit_ratings(agents, results, prior_games=1.0, iterations=1000, tolerance=1e-9):
+    """
+    Fit Bradley-Terry strengths to the results of a tournament and turn them into
+    Elo ratings, with the minorization-maximization updates of Hunter (2004). A
+    tie counts as half a win for each agent. Every pairing also gets prior_games
+    virtual tied games, which keeps the ratings of agents winning or losing every
+    game finite.
+
+    Parameters
+    ----------
+    agents : list of str
+    results : dict
+        The (player_1_score, player_2_score) of every game, by (player_1, player_2)
+        pairing, as returned by play_pairings.
+
+    Returns
+    -------
+    ratings : dict
+        The Elo rating of every agent, 0 on average.
+    """
+    index = {agent: i for i, agent in enumerate(agents)}
+    n = len(agents)
+    wins = np.zeros((n, n))
+    games = np.zeros((n, n))
+    for (player_1, player_2), scores in results.items():
+        i, j = index[player_1], index[player_2]
+        score = sum(game_outcome(*game) for game in scores)
+        wins[i, j] += score + prior_games / 2
+        wins[j, i] += len(scores) - score + prior_games / 2
+        games[i, j] += len(scores) + prior_games
+        games[j, i] += len(scores) + prior_games
+
+    strengths = np.ones(n)
+    total_wins = wins.sum(axis=1)
+    for _ in range(iterations):
+        pair_sums = strengths[:, None] + strengths[None, :]
+        updated = total_wins / (games / pair_sums).sum(axis=1)
+        updated /= np.exp(np.log(updated).mean())
+        converged = np.abs(updated - strengths).max() < tolerance
+        strengths = updated
+        if converged:
+            break
+    elo = ELO_SCALE * np.log10(strengths)
+    return {agent: float(elo[index[agent]]) for agent in agents}
+
+
+def standings(agents, results, ratings):
+    """
+    Format the ratings, scores and number of games of every agent as a table,
+    best first.
+
+    Returns
+    -------
+    table : str
+    """
+    scores = {agent: 0.0 for agent in agents}
+    played = {agent: 0 for agent in agents}
+    for (player_1, player_2), games in results.items():
+        score = sum(game_outcome(*game) for game in games)
+        scores[player_1] += score
+        scores[player_2] += len(games) - score
+        played[player_1] += len(games)
+        played[player_2] += len(games)
+    lines = [f"{'rank':>4}  {'agent':<24}{'elo':>8}{'score':>9}{'games':>7}"]
+    for rank, agent in enumerate(sorted(agents, key=ratings.get, reverse=True), 1):
+        share = scores[agent] / played[agent] if played[agent] else 0.0
+        lines.append(
+            f"{rank:>4}  {agent:<24}{ratings[agent]:>8.1f}{share:>9.1%}{played[agent]:>7}"
+        )
+    return "\n".join(lines)
+
+
+def run_tournament(args):
+    """
+    Play a round robin between the agents of args and log their standings.
+
+    Returns
+    -------
+    ratings : dict
+        The Elo rating of every agent.
+    results : dict
+        The games of every pairing, see play_pairings.
+    """
+    supported = autoplay_agents()
+    agents = sorted(args.agents or supported)
+    for agent in agents:
+        if agent not in supported:
+            raise ValueError(
+                f"Agent '{agent}' is not registered or does not support autoplay."
+            )
+    if len(agents) < 2:
+        raise ValueError(f"A tournament needs two agents or more, got {agents}")
+    pairings = list(combinations(agents, 2))
+    seeds = board_seeds(args.boards, args.seed)
+    settings = {
+        "seed": args.seed,
+        "boards": args.boards,
+        "board_size_min": args.board_size_min,
+        "board_size_max": args.board_size_max,
+        "board_backend": args.board_backend,
+        "agent_move_time": args.agent_move_time,
+        "agent_game_time": args.agent_game_time,
+    }
+
+    def simulator_args(player_1, player_2):
+        argv = [
+            "--player_1",
+            player_1,
+            "--player_2",
+            player_2,
+            "--autoplay",
+            "--board_size_min",
+            str(args.board_size_min),
+            "--board_size_max",
+            str(args.board_size_max),
+            "--board_backend",
+            args.board_backend,
+            # The games played at once share the cores of the parallel searches
+            "--workers",
+            str(args.workers),
+        ]
+        if args.agent_move_time is not None:
+            argv += ["--agent_move_time", str(args.agent_move_time)]
+        if args.agent_game_time is not None:
+            argv += ["--agent_game_time", str(args.agent_game_time)]
+        return get_simulator_args(argv)
+
+    logger.info(
+        f"Round robin of {agents}: {len(pairings)} pairings of {2 * args.boards} games"
+    )
+    results = play_pairings(
+        pairings,
+        simulator_args,
+        seeds,
+        args.workers,
+        PairingCache(args.cache_path or None),
+        settings,
+    )
+    ratings = fit_ratings(agents, results)
+    logger.info(f"Standings:\n{standings(agents, results, ratings)}")
+    return ratings, results
+
+
+def get_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--agents",
+        type=str,
+        nargs="+",
+        default=None,
+        help="The agents of the tournament. Defaults to every registered agent supporting autoplay",
+    )
+    parser.add_argument(
+        "--boards",
+        type=int,
+        default=10,
+        help="The number of boards every pairing plays, each with both colours",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="The master seed the board seeds are derived from",
+    )
+    parser.add_argument("--board_size_min", type=int, default=6)
+    parser.add_argument("--board_size_max", type=int, default=12)
+    parser.add_argument(
+        "--board_backend",
+        type=str,
+        default=BOARD_BACKEND_ARRAY,
+        choices=BOARD_BACKENDS,
+    )
+    parser.add_argument("--agent_move_time", type=float, default=None)
+    parser.add_argument("--agent_game_time", type=float, default=None)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="The number of processes playing games in parallel",
+    )
+    parser.add_argument(
+        "--cache_path",
+        type=str,
+        default="tournament_cache.json",
+        help="Keep the games of finished pairings in this file, to only play new pairings next time. Empty to keep nothing",
+    )
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run_tournament(get_args())
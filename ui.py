@@ -1,5 +1,6 @@
 ## UI Placeholder
 import matplotlib.pyplot as plt
+from connectivity import label_regions
 from constants import *
 from pathlib import Path
 
@@ -25,6 +26,7 @@ class UIEngine:
         set_top_wall=False,
         set_bottom_wall=False,
         color="silver",
+        fill_color=None,
     ):
         """
         Plot a box with configurable walls
@@ -49,7 +51,17 @@ class UIEngine:
             set bottom wall
         color : str
             color of the wall
+        fill_color : str
+            if not None, shade the box with this color
         """
+        if fill_color is not None:
+            plt.fill(
+                [x, x + w, x + w, x],
+                [y, y, y + w, y + w],
+                color=fill_color,
+                alpha=0.2,
+                lw=0,
+            )
         # left wall
         plt.plot([x, x], [y, y + w], "-", lw=2, color="red" if set_left_wall else color)
         # top wall
@@ -106,7 +118,12 @@ class UIEngine:
         self.plot_box(1, 3, self.grid_size[0] + self.grid_size[1], color="black")
 
     def plot_grid_with_board(
-        self, chess_board, player_1_pos=None, player_2_pos=None, debug=False
+        self,
+        chess_board,
+        player_1_pos=None,
+        player_2_pos=None,
+        debug=False,
+        show_territory=False,
     ):
         """
         Main function to plot the grid of the game
@@ -121,7 +138,14 @@ class UIEngine:
             position of player 2
         debug : bool
             if True, plot the position of the players
+        show_territory : bool
+            if True, shade the zone of each player with its color
         """
+        territory = {}
+        if show_territory and player_1_pos is not None and player_2_pos is not None:
+            labels, _ = label_regions(chess_board)
+            territory[labels[tuple(player_1_pos)]] = PLAYER_1_COLOR
+            territory[labels[tuple(player_2_pos)]] = PLAYER_2_COLOR
         x_pos = 0
         for y in range(self.grid_size[1] * 2 + 1, 1, -2):
             y_pos = 0
@@ -152,6 +176,9 @@ class UIEngine:
                     set_top_wall=up_wall,
                     set_bottom_wall=down_wall,
                     text=text,
+                    fill_color=(
+                        territory.get(labels[x_pos, y_pos]) if territory else None
+                    ),
                 )
                 y_pos += 1
             x_pos += 1
@@ -249,7 +276,13 @@ class UIEngine:
 
         """
         plt.clf()
-        self.plot_grid_with_board(chess_board, p1_pos, p2_pos, debug=debug)
+        # Shade the zones of the players once the game has ended
+        show_territory = (
+            len(self.world.results_cache) > 0 and self.world.results_cache[0]
+        )
+        self.plot_grid_with_board(
+            chess_board, p1_pos, p2_pos, debug=debug, show_territory=show_territory
+        )
         self.plot_game_boundary()
         self.fix_axis()
         self.plot_text_info()
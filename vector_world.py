@@ -0,0 +1,244 @@
+import numpy as np
+from connectivity import label_regions
+from constants import *
+from records import encode_game
+
+# Moves (Up, Right, Down, Left)
+MOVES = np.array(((-1, 0), (0, 1), (1, 0), (0, -1)))
+OPPOSITES = np.array((2, 3, 0, 1))
+
+
+class VectorWorld:
+    """
+    Many games between two random agents played in lockstep on one
+    (n_games, board_size, board_size, 4) array.
+
+    Every step moves the current player of every unfinished game with the same
+    random walk as RandomAgent, sampled for all games at once, then labels the
+    zones of all boards together to retire the games that ended.
+
+    Parameters
+    ----------
+    n_games : int
+        The number of games.
+    board_size : int
+        The size of every board.
+    seed : int
+        Seed of the random generator. If None, fresh entropy is used.
+    record : bool
+        Whether to keep the moves so the games can be encoded as game records.
+    """
+
+    def __init__(self, n_games, board_size, seed=None, record=False):
+        self.n_games = n_games
+        self.board_size = board_size
+        self.max_step = (board_size + 1) // 2
+        self.rng = np.random.default_rng(seed)
+        self.record = record
+
+        self.chess_board = np.zeros((n_games, board_size, board_size, 4), dtype=bool)
+        self.p0_pos = np.zeros((n_games, 2), dtype=int)
+        self.p1_pos = np.zeros((n_games, 2), dtype=int)
+        games = np.arange(n_games)
+        while len(games):
+            self.init_games(games)
+            is_end, _, _ = self.check_endgame(games)
+            games = games[is_end]
+
+        self.turn = 0
+        # Unfinished games and results of the finished ones
+        self.active = np.ones(n_games, dtype=bool)
+        self.p0_score = np.zeros(n_games, dtype=int)
+        self.p1_score = np.zeros(n_games, dtype=int)
+        self.n_moves = np.zeros(n_games, dtype=int)
+        if record:
+            self.initial_state = (
+                self.chess_board.copy(),
+                self.p0_pos.copy(),
+                self.p1_pos.copy(),
+            )
+            self.moves = []
+
+    def init_games(self, games):
+        """
+        Draw new symmetric boards and start positions for some games, as World does.
+
+        Parameters
+        ----------
+        games : numpy.ndarray of int
+            The indices of the games.
+        """
+        n = self.board_size
+        self.chess_board[games] = False
+        self.chess_board[games, 0, :, DIRECTION_UP] = True
+        self.chess_board[games, :, 0, DIRECTION_LEFT] = True
+        self.chess_board[games, -1, :, DIRECTION_DOWN] = True
+        self.chess_board[games, :, -1, DIRECTION_RIGHT] = True
+
+        for _ in range(self.max_step):
+            pos = self.rng.integers(0, n, size=(len(games), 2))
+            dir = self.rng.integers(0, 4, size=len(games))
+            taken = self.chess_board[games, pos[:, 0], pos[:, 1], dir]
+            while taken.any():
+                pos[taken] = self.rng.integers(0, n, size=(taken.sum(), 2))
+                dir[taken] = self.rng.integers(0, 4, size=taken.sum())
+                taken = self.chess_board[games, pos[:, 0], pos[:, 1], dir]
+            self.set_barriers(games, pos, dir)
+            self.set_barriers(games, n - 1 - pos, OPPOSITES[dir])
+
+        pos = self.rng.integers(0, n, size=(len(games), 2))
+        overlap = np.all(pos == n - 1 - pos, axis=1)
+        while overlap.any():
+            pos[overlap] = self.rng.integers(0, n, size=(overlap.sum(), 2))
+            overlap = np.all(pos == n - 1 - pos, axis=1)
+        self.p0_pos[games] = pos
+        self.p1_pos[games] = n - 1 - pos
+
+    def set_barriers(self, games, pos, dir):
+        """
+        Set one barrier, on both of its faces, in each of the given games.
+        """
+        r, c = pos[:, 0], pos[:, 1]
+        self.chess_board[games, r, c, dir] = True
+        self.chess_board[
+            games, r + MOVES[dir, 0], c + MOVES[dir, 1], OPPOSITES[dir]
+        ] = True
+
+    def random_choice(self, allowed):
+        """
+        Pick a random allowed direction in every row of an (n, 4) mask.
+        Rows without any allowed direction get an arbitrary one.
+        """
+        return np.argmax(
+            np.where(allowed, self.rng.random(allowed.shape), -1.0), axis=1
+        )
+
+    def check_endgame(self, games):
+        """
+        Check if some games have ended and compute their scores.
+
+        Returns
+        -------
+        is_endgame : numpy.ndarray of bool
+        player_1_score : numpy.ndarray of int
+        player_2_score : numpy.ndarray of int
+        """
+        labels, sizes = label_regions(self.chess_board[games])
+        rows = np.arange(len(games))
+        p0_label = labels[rows, self.p0_pos[games, 0], self.p0_pos[games, 1]]
+        p1_label = labels[rows, self.p1_pos[games, 0], self.p1_pos[games, 1]]
+        return p0_label != p1_label, sizes[rows, p0_label], sizes[rows, p1_label]
+
+    def step(self):
+        """
+        Take a step in every unfinished game and retire the games that ended.
+        """
+        games = np.flatnonzero(self.active)
+        rows = np.arange(len(games))
+        if self.turn:
+            my_pos, adv_pos = self.p1_pos[games], self.p0_pos[games]
+        else:
+            my_pos, adv_pos = self.p0_pos[games], self.p1_pos[games]
+
+        # Random Walk
+        steps = self.rng.integers(0, self.max_step + 1, size=len(games))
+        for k in range(self.max_step):
+            walking = steps > k
+            if not walking.any():
+                break
+            next_pos = my_pos[:, None, :] + MOVES[None]
+            allowed = ~self.chess_board[games, my_pos[:, 0], my_pos[:, 1]]
+            allowed &= ~np.all(next_pos == adv_pos[:, None, :], axis=-1)
+            allowed &= walking[:, None]
+            dir = self.random_choice(allowed)
+            moved = allowed.any(axis=1)
+            my_pos[moved] = next_pos[rows[moved], dir[moved]]
+
+        # Put Barrier
+        dir = self.random_choice(~self.chess_board[games, my_pos[:, 0], my_pos[:, 1]])
+        self.set_barriers(games, my_pos, dir)
+        if self.turn:
+            self.p1_pos[games] = my_pos
+        else:
+            self.p0_pos[games] = my_pos
+        self.n_moves[games] += 1
+        if self.record:
+            moves = np.full((self.n_games, 3), -1)
+            moves[games] = np.column_stack([my_pos, dir])
+            self.moves.append(moves)
+        self.turn = 1 - self.turn
+
+        is_end, p0_score, p1_score = self.check_endgame(games)
+        ended = games[is_end]
+        self.p0_score[ended] = p0_score[is_end]
+        self.p1_score[ended] = p1_score[is_end]
+        self.active[ended] = False
+
+    def run(self):
+        """
+        Play every game to the end.
+
+        Returns
+        -------
+        player_1_score : numpy.ndarray of int
+        player_2_score : numpy.ndarray of int
+        """
+        while self.active.any():
+            self.step()
+        return self.p0_score, self.p1_score
+
+    def encode_games(self):
+        """
+        Encode every finished game as a game record, see records.encode_game.
+
+        Returns
+        -------
+        records : list of bytes
+        """
+        if not self.record:
+            raise ValueError("Moves are only kept with VectorWorld(record=True)")
+        chess_board, p0_pos, p1_pos = self.initial_state
+        moves = np.stack(self.moves, axis=1) if self.moves else None
+        return [
+            encode_game(
+                chess_board[i],
+                p0_pos[i],
+                p1_pos[i],
+                self.max_step,
+                moves[i, : self.n_moves[i]] if moves is not None else [],
+                self.p0_score[i],
+                self.p1_score[i],
+            )
+            for i in np.flatnonzero(~self.active)
+        ]
+
+
+if __name__ == "__main__":
+    import argparse
+    from time import time
+    from records import GameRecordWriter
+
+    parser = argparse.ArgumentParser(
+        description="Play many random agent games in lockstep"
+    )
+    parser.add_argument("--n_games", type=int, default=1000)
+    parser.add_argument("--board_size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--record_path", type=str, default=None)
+    args = parser.parse_args()
+
+    start_time = time()
+    world = VectorWorld(
+        args.n_games, args.board_size, args.seed, record=args.record_path is not None
+    )
+    p0_score, p1_score = world.run()
+    elapsed = time() - start_time
+    print(
+        f"Player {PLAYER_1_NAME} win percentage: {np.mean(p0_score >= p1_score)}, "
+        f"Player {PLAYER_2_NAME} win percentage: {np.mean(p0_score <= p1_score)}"
+    )
+    print(f"{args.n_games} games in {elapsed:.2f} seconds")
+    if args.record_path is not None:
+        with GameRecordWriter(args.record_path) as writer:
+            for data in world.encode_games():
+                writer.append(data)
@@ -3,6 +3,9 @@ from copy import deepcopy
 import traceback
 from agents import *
 from ui import UIEngine
+from bitboard import BitBoard, popcount
+from connectivity import RegionTracker, reachable_positions
+from supervisor import SupervisedAgent
 from time import sleep, time
 import click
 import logging
@@ -16,6 +19,16 @@ logger = logging.getLogger(__name__)
 
 
 class World:
+    """
+    The game world: the chess board, the positions of the players and their agents.
+
+    The closed zones and the reachable positions of the player to move are cached
+    between turns. The caches are kept up to date by set_barrier and dropped
+    whenever chess_board is assigned a new board, so walls must only be changed
+    through set_barrier or by assigning a whole board, never by editing
+    chess_board in place.
+    """
+
     def __init__(
         self,
         player_1="random_agent",
@@ -26,6 +39,14 @@ class World:
         display_save=False,
         display_save_path=None,
         autoplay=False,
+        board_backend=BOARD_BACKEND_ARRAY,
+        readonly_board=False,
+        agent_move_time=None,
+        agent_game_time=None,
+        recorder=None,
+        initial_state=None,
+        profiler=None,
+        search_workers=None,
     ):
         """
         Initialize the game world
@@ -48,6 +69,30 @@ class World:
             The path to save the image
         autoplay : bool
             Whether the game is played in autoplay mode
+        board_backend : str
+            How the walls are stored, one of BOARD_BACKENDS. "array" keeps the
+            (board_size, board_size, 4) boolean array, "bitboard" uses a BitBoard.
+        readonly_board : bool
+            Whether agents get a read-only view of the chess board instead of a copy.
+            Agents that need to modify the board must copy it themselves.
+        agent_move_time : float
+            If not None, agents run in a supervised worker process and a step taking
+            longer than this many seconds is replaced by a Random Walk.
+        agent_game_time : float
+            If not None, agents run in a supervised worker process and once they have
+            used this many seconds in the game, their steps are replaced by Random Walks.
+        recorder : records.GameRecorder
+            If not None, the initial state and every move of the game are recorded.
+        initial_state : tuple
+            If not None, (chess_board, p0_pos, p1_pos) to start from instead of a
+            random board, optionally followed by the turn of the player to move and
+            the number of barriers already set, of a game resumed mid-way (both 0
+            by default). board_size is then taken from chess_board.
+        profiler : profiling.StepProfiler
+            If not None, times the phases of every step.
+        search_workers : int
+            If not None, the number of processes the agents searching in parallel
+            may use, see Agent.configure.
         """
         # Two players
         logger.info("Initialize the game world")
@@ -63,12 +108,15 @@ class World:
                 f"Agent '{player_2}' is not registered. {AGENT_NOT_FOUND_MSG}"
             )
 
-        p0_agent = AGENT_REGISTRY[player_1]
-        p1_agent = AGENT_REGISTRY[player_2]
+        supervised = agent_move_time is not None or agent_game_time is not None
         logger.info(f"Registering p0 agent : {player_1}")
-        self.p0 = p0_agent()
+        self.p0 = self.load_agent(
+            player_1, supervised, agent_move_time, agent_game_time, search_workers
+        )
         logger.info(f"Registering p1 agent : {player_2}")
-        self.p1 = p1_agent()
+        self.p1 = self.load_agent(
+            player_2, supervised, agent_move_time, agent_game_time, search_workers
+        )
 
         # check autoplay
         if autoplay:
@@ -77,6 +125,13 @@ class World:
                     f"Autoplay mode is not supported by one of the agents ({self.p0} -> {self.p0.autoplay}, {self.p1} -> {self.p1.autoplay}). Please set autoplay=True in the agent class."
                 )
 
+        if board_backend not in BOARD_BACKENDS:
+            raise ValueError(
+                f"Unknown board backend '{board_backend}'. Choose one of {BOARD_BACKENDS}."
+            )
+        self.board_backend = board_backend
+        self.readonly_board = readonly_board
+
         self.player_names = {PLAYER_1_ID: PLAYER_1_NAME, PLAYER_2_ID: PLAYER_2_NAME}
         self.dir_names = {
             DIRECTION_UP: DIRECTION_UP_NAME,
@@ -91,6 +146,8 @@ class World:
         # Opposite Directions
         self.opposites = {0: 2, 1: 3, 2: 0, 3: 1}
 
+        if initial_state is not None:
+            board_size = len(initial_state[0])
         if board_size is None:
             # Random chessboard size
             self.board_size = np.random.randint(MIN_BOARD_SIZE, MAX_BOARD_SIZE)
@@ -101,49 +158,89 @@ class World:
             self.board_size = board_size
             logger.info(f"Setting board size to {self.board_size}x{self.board_size}")
 
-        # Index in dim2 represents [Up, Right, Down, Left] respectively
-        # Record barriers and boarders for each block
-        self.chess_board = np.zeros((self.board_size, self.board_size, 4), dtype=bool)
+        if self.board_backend == BOARD_BACKEND_BITBOARD:
+            # Packed walls, borders are set by the BitBoard itself
+            self.chess_board = BitBoard(self.board_size)
+        else:
+            # Index in dim2 represents [Up, Right, Down, Left] respectively
+            # Record barriers and boarders for each block
+            self.chess_board = np.zeros(
+                (self.board_size, self.board_size, 4), dtype=bool
+            )
 
-        # Set borders
-        self.chess_board[0, :, 0] = True
-        self.chess_board[:, 0, 3] = True
-        self.chess_board[-1, :, 2] = True
-        self.chess_board[:, -1, 1] = True
+            # Set borders
+            self.chess_board[0, :, 0] = True
+            self.chess_board[:, 0, 3] = True
+            self.chess_board[-1, :, 2] = True
+            self.chess_board[:, -1, 1] = True
+
+        # Closed zones of the board, built on the first check_endgame
+        self.regions = None
+        # Number of barriers set so far, used to invalidate per-turn caches
+        self.barrier_count = 0
+        # Reachable positions of the player to move, see get_valid_positions
+        self.reachable_cache = None
 
         # Maximum Steps
         self.max_step = (self.board_size + 1) // 2
 
-        # Random barriers (symmetric)
-        for _ in range(self.max_step):
-            pos = np.random.randint(0, self.board_size, size=2)
-            r, c = pos
-            dir = np.random.randint(0, 4)
-            while self.chess_board[r, c, dir]:
+        # Whose turn to step
+        self.turn = 0
+        if initial_state is not None:
+            if len(initial_state) not in (3, 5):
+                raise ValueError(
+                    "initial_state must be (chess_board, p0_pos, p1_pos) or (chess_board, p0_pos, p1_pos, turn, barrier_count)"
+                )
+            chess_board, p0_pos, p1_pos = initial_state[:3]
+            if len(initial_state) == 5:
+                self.turn, self.barrier_count = initial_state[3:]
+            if isinstance(chess_board, BitBoard):
+                chess_board = chess_board.to_array()
+            if self.board_backend == BOARD_BACKEND_BITBOARD:
+                self.chess_board = BitBoard.from_array(chess_board)
+            else:
+                self.chess_board = np.array(chess_board, dtype=bool)
+            self.p0_pos = np.asarray(p0_pos)
+            self.p1_pos = np.asarray(p1_pos)
+        else:
+            # Random barriers (symmetric)
+            for _ in range(self.max_step):
                 pos = np.random.randint(0, self.board_size, size=2)
                 r, c = pos
                 dir = np.random.randint(0, 4)
-            anti_pos = self.board_size - 1 - pos
-            anti_dir = self.opposites[dir]
-            anti_r, anti_c = anti_pos
-            self.set_barrier(r, c, dir)
-            self.set_barrier(anti_r, anti_c, anti_dir)
-
-        # Random start position (symmetric but not overlap)
-        self.p0_pos = np.random.randint(0, self.board_size, size=2)
-        self.p1_pos = self.board_size - 1 - self.p0_pos
-        while np.array_equal(self.p0_pos, self.p1_pos):
+                while self.chess_board[r, c, dir]:
+                    pos = np.random.randint(0, self.board_size, size=2)
+                    r, c = pos
+                    dir = np.random.randint(0, 4)
+                anti_pos = self.board_size - 1 - pos
+                anti_dir = self.opposites[dir]
+                anti_r, anti_c = anti_pos
+                self.set_barrier(r, c, dir)
+                self.set_barrier(anti_r, anti_c, anti_dir)
+
+            # Random start position (symmetric but not overlap)
             self.p0_pos = np.random.randint(0, self.board_size, size=2)
             self.p1_pos = self.board_size - 1 - self.p0_pos
-        # Whose turn to step
-        self.turn = 0
+            while np.array_equal(self.p0_pos, self.p1_pos):
+                self.p0_pos = np.random.randint(0, self.board_size, size=2)
+                self.p1_pos = self.board_size - 1 - self.p0_pos
 
         # Check initialization
         self.initial_end, _, _ = self.check_endgame()
 
+        self.profiler = profiler
+        self.recorder = recorder
+        if self.recorder is not None:
+            self.recorder.begin_game(
+                self.chess_board, self.p0_pos, self.p1_pos, self.max_step
+            )
+
         # Time taken by each player
         self.p0_time = 0
         self.p1_time = 0
+        # Steps of each player cut off by its time budget
+        self.p0_timeouts = 0
+        self.p1_timeouts = 0
 
         # Cache to store and use the data
         self.results_cache = ()
@@ -160,6 +257,33 @@ class World:
             self.ui_engine = UIEngine(self.board_size, self)
             self.render()
 
+    @staticmethod
+    def load_agent(
+        agent_name, supervised=False, move_time=None, game_time=None, search_workers=None
+    ):
+        """
+        Instantiate a registered agent, in a supervised worker process if requested.
+        Human agents always run in the main process as they read from the terminal.
+
+        Returns
+        -------
+        agent : Agent or SupervisedAgent
+        """
+        agent_class = AGENT_REGISTRY[agent_name]
+        if supervised and not issubclass(agent_class, HumanAgent):
+            return SupervisedAgent(agent_name, move_time, game_time, search_workers)
+        agent = agent_class()
+        agent.configure(search_workers=search_workers, move_time=move_time)
+        return agent
+
+    def close(self):
+        """
+        Stop the worker processes of supervised agents and let the agents release
+        their resources.
+        """
+        for agent in (self.p0, self.p1):
+            agent.close()
+
     def get_current_player(self):
         """
         Get the positions of the current player
@@ -173,6 +297,15 @@ class World:
         else:
             return self.p1, self.p1_pos, self.p0_pos
 
+    def record_timeout(self):
+        """
+        Record that the current player went over its time budget.
+        """
+        if not self.turn:
+            self.p0_timeouts += 1
+        else:
+            self.p1_timeouts += 1
+
     def update_player_time(self, time_taken):
         """
         Update the time taken by the player
@@ -187,6 +320,35 @@ class World:
         else:
             self.p1_time += time_taken
 
+    def get_agent_board(self, agent):
+        """
+        Get a private copy of the chess board in the format the agent accepts,
+        or a read-only view of it if readonly_board is set.
+
+        Parameters
+        ----------
+        agent : Agent
+            The agent about to take a step
+
+        Returns
+        -------
+        chess_board : numpy.ndarray or BitBoard
+            A BitBoard if the world uses the bitboard backend and the agent supports it,
+            otherwise a numpy.ndarray of shape (board_size, board_size, 4)
+        """
+        if self.board_backend == BOARD_BACKEND_BITBOARD:
+            # A BitBoard copy is only a few ints, so it is copied even when read-only
+            if getattr(agent, "supports_bitboard", False):
+                return self.chess_board.copy()
+            chess_board = self.chess_board.to_array()
+            chess_board.flags.writeable = not self.readonly_board
+            return chess_board
+        if self.readonly_board:
+            chess_board = self.chess_board.view()
+            chess_board.flags.writeable = False
+            return chess_board
+        return deepcopy(self.chess_board)
+
     def step(self):
         """
         Take a step in the game world.
@@ -198,18 +360,32 @@ class World:
         results: tuple
             The results of the step containing (is_endgame, player_1_score, player_2_score)
         """
+        profiler = self.profiler
+        if profiler is not None:
+            lap = profiler.start()
         cur_player, cur_pos, adv_pos = self.get_current_player()
+        agent_name = self.player_2_name if self.turn else self.player_1_name
 
+        # Set while the agent's step runs, so a failed step is charged its time
+        start_time = None
         try:
+            chess_board = self.get_agent_board(cur_player)
+            if profiler is not None:
+                lap = profiler.lap("agent_board", lap)
+                profiler.start_agent(agent_name)
             # Run the agents step function
             start_time = time()
             next_pos, dir = cur_player.step(
-                deepcopy(self.chess_board),
+                chess_board,
                 tuple(cur_pos),
                 tuple(adv_pos),
                 self.max_step,
             )
             self.update_player_time(time() - start_time)
+            start_time = None
+            if profiler is not None:
+                profiler.stop_agent(agent_name)
+                lap = profiler.lap("agent_step", lap)
 
             next_pos = np.asarray(next_pos, dtype=cur_pos.dtype)
             if not self.check_boundary(next_pos):
@@ -226,26 +402,41 @@ class World:
                         cur_pos, next_pos, dir, self.max_step
                     )
                 )
+            if profiler is not None:
+                lap = profiler.lap("check_valid_step", lap)
         except BaseException as e:
+            if profiler is not None:
+                profiler.stop_agent(agent_name)
             ex_type = type(e).__name__
             if (
                 "SystemExit" in ex_type and isinstance(cur_player, HumanAgent)
             ) or "KeyboardInterrupt" in ex_type:
                 sys.exit(0)
-            print(
-                "An exception raised. The traceback is as follows:\n{}".format(
-                    traceback.format_exc()
+            if start_time is not None:
+                self.update_player_time(time() - start_time)
+            if isinstance(e, TimeoutError):
+                self.record_timeout()
+                logger.warning(f"{cur_player} ran out of time: {e}")
+            else:
+                print(
+                    "An exception raised. The traceback is as follows:\n{}".format(
+                        traceback.format_exc()
+                    )
                 )
-            )
             print("Execute Random Walk!")
             next_pos, dir = self.random_walk(tuple(cur_pos), tuple(adv_pos))
             next_pos = np.asarray(next_pos, dtype=cur_pos.dtype)
+            if profiler is not None:
+                # The failed step and the random walk replacing it
+                lap = profiler.lap("random_walk", lap)
 
         # Print out each step
         # print(self.turn, next_pos, dir)
         logger.info(
             f"Player {self.player_names[self.turn]} moves to {next_pos} facing {self.dir_names[dir]}"
         )
+        if profiler is not None:
+            lap = profiler.lap("logging", lap)
         if not self.turn:
             self.p0_pos = next_pos
         else:
@@ -253,12 +444,20 @@ class World:
         # Set the barrier to True
         r, c = next_pos
         self.set_barrier(r, c, dir)
+        if self.recorder is not None:
+            self.recorder.record_move(r, c, dir)
 
         # Change turn
         self.turn = 1 - self.turn
+        if profiler is not None:
+            lap = profiler.lap("set_barrier", lap)
 
         results = self.check_endgame()
         self.results_cache = results
+        if self.recorder is not None and results[0]:
+            self.recorder.end_game(results[1], results[2])
+        if profiler is not None:
+            lap = profiler.lap("check_endgame", lap)
 
         # Print out Chessboard for visualization
         if self.display_ui:
@@ -270,6 +469,8 @@ class World:
                     _ = click.getchar()
                 except:
                     _ = input()
+            if profiler is not None:
+                profiler.lap("render", lap)
         return results
 
     def check_valid_step(self, start_pos, end_pos, barrier_dir):
@@ -289,36 +490,69 @@ class World:
         r, c = end_pos
         if self.chess_board[r, c, barrier_dir]:
             return False
-        if np.array_equal(start_pos, end_pos):
-            return True
-
-        # Get position of the adversary
-        adv_pos = self.p0_pos if self.turn else self.p1_pos
-
-        # BFS
-        state_queue = [(start_pos, 0)]
-        visited = {tuple(start_pos)}
-        is_reached = False
-        while state_queue and not is_reached:
-            cur_pos, cur_step = state_queue.pop(0)
-            r, c = cur_pos
-            if cur_step == self.max_step:
-                break
-            for dir, move in enumerate(self.moves):
-                if self.chess_board[r, c, dir]:
-                    continue
-
-                next_pos = cur_pos + move
-                if np.array_equal(next_pos, adv_pos) or tuple(next_pos) in visited:
-                    continue
-                if np.array_equal(next_pos, end_pos):
-                    is_reached = True
-                    break
-
-                visited.add(tuple(next_pos))
-                state_queue.append((next_pos, cur_step + 1))
-
-        return is_reached
+        reachable = self.get_reachable(start_pos)
+        if self.board_backend == BOARD_BACKEND_BITBOARD:
+            return bool(reachable & self.chess_board.cell_mask(r, c))
+        return (int(r), int(c)) in reachable
+
+    def get_reachable(self, start_pos=None, adv_pos=None):
+        """
+        Get the positions the player can move to this turn (reachable within max steps
+        without walking through the adversary). The result is computed once per turn
+        and cached until a barrier is set, a player moves or the board is replaced, so
+        it cannot be modified.
+
+        Parameters
+        ----------
+        start_pos : tuple
+            The start position of the agent. Defaults to the position of the current player.
+        adv_pos : tuple
+            The position of the adversary. Defaults to the position of the other player.
+
+        Returns
+        -------
+        reachable : frozenset of tuple of int or int
+            The reachable positions, start_pos included. With the bitboard backend, the
+            BitBoard mask of these positions.
+        """
+        if start_pos is None:
+            start_pos = self.p1_pos if self.turn else self.p0_pos
+        if adv_pos is None:
+            adv_pos = self.p0_pos if self.turn else self.p1_pos
+        key = (
+            int(start_pos[0]),
+            int(start_pos[1]),
+            int(adv_pos[0]),
+            int(adv_pos[1]),
+            self.max_step,
+            self.barrier_count,
+        )
+        cache = self.reachable_cache
+        if cache is None or cache[0] != key:
+            if self.board_backend == BOARD_BACKEND_BITBOARD:
+                reachable = self.chess_board.reachable(key[:2], key[2:4], self.max_step)
+            else:
+                reachable = frozenset(
+                    reachable_positions(
+                        self.chess_board, start_pos, adv_pos, self.max_step
+                    )
+                )
+            self.reachable_cache = cache = (key, reachable)
+        return cache[1]
+
+    def get_valid_positions(self, start_pos=None, adv_pos=None):
+        """
+        List every position the player can move to this turn, see get_reachable.
+
+        Returns
+        -------
+        positions : frozenset of tuple of int
+            The reachable positions, start_pos included.
+        """
+        reachable = self.get_reachable(start_pos, adv_pos)
+        if self.board_backend == BOARD_BACKEND_BITBOARD:
+            return frozenset(self.chess_board.cells(reachable))
+        return reachable
 
     def check_endgame(self):
         """
@@ -333,41 +567,25 @@ class World:
         player_2_score : int
             The score of player 2.
         """
-        # Union-Find
-        father = dict()
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                father[(r, c)] = (r, c)
-
-        def find(pos):
-            if father[pos] != pos:
-                father[pos] = find(father[pos])
-            return father[pos]
-
-        def union(pos1, pos2):
-            father[pos1] = pos2
-
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                for dir, move in enumerate(
-                    self.moves[1:3]
-                ):  # Only check down and right
-                    if self.chess_board[r, c, dir + 1]:
-                        continue
-                    pos_a = find((r, c))
-                    pos_b = find((r + move[0], c + move[1]))
-                    if pos_a != pos_b:
-                        union(pos_a, pos_b)
-
-        for r in range(self.board_size):
-            for c in range(self.board_size):
-                find((r, c))
-        p0_r = find(tuple(self.p0_pos))
-        p1_r = find(tuple(self.p1_pos))
-        p0_score = list(father.values()).count(p0_r)
-        p1_score = list(father.values()).count(p1_r)
-        if p0_r == p1_r:
+        if self.board_backend == BOARD_BACKEND_BITBOARD:
+            p0_region = self.chess_board.region(self.p0_pos)
+            p0_score = popcount(p0_region)
+            if p0_region & self.chess_board.cell_mask(*self.p1_pos):
+                return False, p0_score, p0_score
+            p1_score = popcount(self.chess_board.region(self.p1_pos))
+            return self._report_endgame(p0_score, p1_score)
+
+        is_separated, p0_score, p1_score = self.get_regions().scores(
+            self.p0_pos, self.p1_pos
+        )
+        if not is_separated:
             return False, p0_score, p1_score
+        return self._report_endgame(p0_score, p1_score)
+
+    def _report_endgame(self, p0_score, p1_score):
+        """
+        Log the winner of a finished game and return the endgame results.
+        """
         player_win = None
         win_blocks = -1
         if p0_score > p1_score:
@@ -386,20 +604,57 @@ class World:
             logging.info("Game ends! It is a Tie!")
         return True, p0_score, p1_score
 
+    @property
+    def chess_board(self):
+        """
+        The walls of the board, a (board_size, board_size, 4) boolean array or a
+        BitBoard depending on the board backend.
+        """
+        return self._chess_board
+
+    @chess_board.setter
+    def chess_board(self, chess_board):
+        # A new board invalidates the closed zones and reachable positions
+        self._chess_board = chess_board
+        self.regions = None
+        self.reachable_cache = None
+
+    def get_regions(self):
+        """
+        Get the incremental tracker of the closed zones of the board.
+        It is built on first use after the chess board has been assigned.
+
+        Returns
+        -------
+        regions : RegionTracker
+        """
+        if self.regions is None:
+            self.regions = RegionTracker(self.chess_board)
+        return self.regions
+
     def check_boundary(self, pos):
         r, c = pos
         return 0 <= r < self.board_size and 0 <= c < self.board_size
 
     def set_barrier(self, r, c, dir):
-        # Set the barrier to True
-        self.chess_board[r, c, dir] = True
-        # Set the opposite barrier to True
-        move = self.moves[dir]
-        self.chess_board[r + move[0], c + move[1], self.opposites[dir]] = True
+        if self.board_backend == BOARD_BACKEND_BITBOARD:
+            # Both faces of the wall are a single bit
+            self.chess_board.set_barrier(r, c, dir)
+        else:
+            # Set the barrier to True
+            self.chess_board[r, c, dir] = True
+            # Set the opposite barrier to True
+            move = self.moves[dir]
+            self.chess_board[r + move[0], c + move[1], self.opposites[dir]] = True
+        self.barrier_count += 1
+        # Keep the closed zones up to date
+        if self.regions is not None:
+            self.regions.add_wall(r, c, dir)
 
     def random_walk(self, my_pos, adv_pos):
         """
-        Randomly walk to the next position in the board.
+        Randomly walk to the next position in the board, picked uniformly among the
+        positions reachable this turn so the fallback is always a valid step.
 
         Parameters
         ----------
@@ -408,28 +663,15 @@ class World:
         adv_pos : tuple
             The position of the adversary.
         """
-        ori_pos = deepcopy(my_pos)
-        steps = np.random.randint(0, self.max_step + 1)
-        # Random Walk
-        for _ in range(steps):
-            r, c = my_pos
-            dir = np.random.randint(0, 4)
-            m_r, m_c = self.moves[dir]
-            my_pos = (r + m_r, c + m_c)
-
-            # Special Case enclosed by Adversary
-            k = 0
-            while self.chess_board[r, c, dir] or my_pos == adv_pos:
-                k += 1
-                if k > 300:
-                    break
-                dir = np.random.randint(0, 4)
-                m_r, m_c = self.moves[dir]
-                my_pos = (r + m_r, c + m_c)
-
-            if k > 300:
-                my_pos = ori_pos
-                break
+        # Any reachable position with a free side
+        positions = sorted(
+            pos
+            for pos in self.get_valid_positions(my_pos, adv_pos)
+            if not all(self.chess_board[pos[0], pos[1], dir] for dir in range(4))
+        )
+        if not positions:
+            positions = [tuple(my_pos)]
+        my_pos = positions[np.random.randint(0, len(positions))]
 
         # Put Barrier
         dir = np.random.randint(0, 4)
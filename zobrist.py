@@ -0,0 +1,198 @@
+import numpy as np
+from constants import *
+
+# Moves (Up, Right, Down, Left)
+MOVES = np.array(((-1, 0), (0, 1), (1, 0), (0, -1)))
+OPPOSITES = np.array((2, 3, 0, 1))
+
+
+class ZobristKeys:
+    """
+    Random 64-bit keys for Zobrist hashing of game positions.
+
+    The hash of a position is the xor of the keys of its barrier faces, of the
+    position of each player and, when the second player is to move, of the side key.
+    Placing a barrier or moving a player xors the matching keys into the hash, so
+    the hash of a position does not depend on the order of the moves leading to it.
+
+    Parameters
+    ----------
+    board_size : int
+        The size of the board.
+    seed : int
+        Seed of the random keys. Hashes can only be compared between keys made
+        with the same seed.
+    """
+
+    def __init__(self, board_size, seed=0):
+        rng = np.random.default_rng(seed)
+        n = board_size
+        self.board_size = board_size
+        self.wall = rng.integers(
+            0, np.iinfo(np.uint64).max, size=(n, n, 4), dtype=np.uint64, endpoint=True
+        )
+        self.position = rng.integers(
+            0, np.iinfo(np.uint64).max, size=(2, n, n), dtype=np.uint64, endpoint=True
+        )
+        self.side = rng.integers(0, np.iinfo(np.uint64).max, dtype=np.uint64, endpoint=True)
+
+        # Key of a whole barrier: the keys of its two faces together. Border faces
+        # have no opposite face.
+        self.barrier = self.wall.copy()
+        self.barrier[1:, :, DIRECTION_UP] ^= self.wall[:-1, :, DIRECTION_DOWN]
+        self.barrier[:-1, :, DIRECTION_DOWN] ^= self.wall[1:, :, DIRECTION_UP]
+        self.barrier[:, 1:, DIRECTION_LEFT] ^= self.wall[:, :-1, DIRECTION_RIGHT]
+        self.barrier[:, :-1, DIRECTION_RIGHT] ^= self.wall[:, 1:, DIRECTION_LEFT]
+
+    def hash(self, chess_board, p0_pos, p1_pos, turn=0):
+        """
+        Compute the hash of a position from scratch.
+
+        Parameters
+        ----------
+        chess_board : numpy.ndarray of shape (board_size, board_size, 4)
+            The chess board.
+        p0_pos : tuple of int
+            The position of the first player.
+        p1_pos : tuple of int
+            The position of the second player.
+        turn : int
+            The player to move.
+
+        Returns
+        -------
+        key : numpy.uint64
+        """
+        key = np.bitwise_xor.reduce(self.wall[np.asarray(chess_board, dtype=bool)])
+        key ^= self.position[0, p0_pos[0], p0_pos[1]]
+        key ^= self.position[1, p1_pos[0], p1_pos[1]]
+        if turn:
+            key ^= self.side
+        return np.uint64(key)
+
+    def move(self, player, old_pos, r, c, dir):
+        """
+        Compute the hash change of a move, vectorized over r, c and dir.
+
+        The move of player from old_pos to (r, c), putting a barrier facing dir,
+        changes the hash of the position by xor with the returned key, which also
+        flips the side to move.
+
+        Returns
+        -------
+        key : numpy.uint64 or numpy.ndarray of numpy.uint64
+        """
+        return (
+            self.position[player, old_pos[0], old_pos[1]]
+            ^ self.position[player, r, c]
+            ^ self.barrier[r, c, dir]
+            ^ self.side
+        )
+
+
+class TranspositionTable:
+    """
+    Bounded table of search statistics indexed by position hash.
+
+    The table has a fixed number of slots and a position goes to the slot given by
+    the low bits of its hash. A position taking a slot held by another position
+    replaces it, so the table never grows and always keeps recent positions.
+
+    Parameters
+    ----------
+    size : int
+        The number of slots, rounded up to a power of two.
+    """
+
+    def __init__(self, size=1 << 16):
+        size = 1 << max(int(size) - 1, 1).bit_length()
+        self.mask = np.uint64(size - 1)
+        self.keys = np.zeros(size, dtype=np.uint64)
+        self.visits = np.zeros(size, dtype=np.int64)
+        self.value = np.zeros(size, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys):
+        """
+        Get the statistics of positions, vectorized over keys.
+
+        Returns
+        -------
+        visits : numpy.ndarray of int
+            The visit count of each position, 0 when it is not in the table.
+        value : numpy.ndarray of float
+            The total value of each position, 0 when it is not in the table.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        slots = (keys & self.mask).astype(np.intp)
+        hit = self.keys[slots] == keys
+        return (
+            np.where(hit, self.visits[slots], 0),
+            np.where(hit, self.value[slots], 0.0),
+        )
+
+    def update(self, key, value):
+        """
+        Add one visit with the given value to a position, replacing whatever
+        other position held its slot.
+        """
+        slot = int(key & self.mask)
+        if self.keys[slot] != key:
+            self.keys[slot] = key
+            self.visits[slot] = 0
+            self.value[slot] = 0.0
+        self.visits[slot] += 1
+        self.value[slot] += value
+
+
+# Kinds of value stored in an AlphaBetaTable
+BOUND_EXACT = 0
+BOUND_LOWER = 1
+BOUND_UPPER = 2
+
+
+class AlphaBetaTable:
+    """
+    Bounded table of alpha-beta search results indexed by position hash.
+
+    Every slot holds the depth a position was searched to, its value, whether the
+    value is exact or only a lower or upper bound, and the best move found. A
+    position replaces the one in its slot unless that one is the same position
+    searched deeper.
+
+    Parameters
+    ----------
+    size : int
+        The number of slots, rounded up to a power of two.
+    """
+
+    def __init__(self, size=1 << 16):
+        size = 1 << max(int(size) - 1, 1).bit_length()
+        self.mask = size - 1
+        self.entries = [None] * size
+
+    def __len__(self):
+        return len(self.entries)
+
+    def probe(self, key):
+        """
+        Get the (depth, value, bound, move) stored for a position, or None.
+        """
+        key = int(key)
+        entry = self.entries[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1:]
+
+    def store(self, key, depth, value, bound, move):
+        """
+        Store the result of searching a position to the given depth.
+        """
+        key = int(key)
+        slot = key & self.mask
+        entry = self.entries[slot]
+        if entry is not None and entry[0] == key and entry[1] > depth:
+            return
+        self.entries[slot] = (key, depth, value, bound, move)